@@ -2,6 +2,12 @@ import ast
 import copy
 
 from imperative_stitch.analyze_program.extract.extract import create_target
+from imperative_stitch.utils.ast_utils import (
+    render_subtree,
+    structural_differences,
+    structural_key,
+    structurally_equal,
+)
 
 
 def reconfigure_parameter(parameter, variables, vars_all):
@@ -41,7 +47,13 @@ def antiunify_extractions(extrs):
 
     Args:
         extrs (list[Extraction]): The extractions to antiunify.
+
+    Returns:
+        ast.FunctionDef: The function definition of the first extraction, which all the
+            others are now structurally equal to.
     """
+    if not extrs:
+        raise RuntimeError("no extractions to antiunify")
     all_metavariable_names = sorted(
         {name for extr in extrs for name in extr.metavariables.names}
     )
@@ -50,12 +62,40 @@ def antiunify_extractions(extrs):
 
     antiunify_returns(extrs)
 
-    codes = set(ast.unparse(extr.func_def) for extr in extrs)
-    if len(codes) != 1:
-        print("*" * 80)
-        for code in codes:
-            print(code)
+    representative = extrs[0].func_def
+    mismatched = [
+        extr.func_def
+        for extr in extrs[1:]
+        if not structurally_equal(representative, extr.func_def)
+    ]
+    if mismatched:
+        # structurally different trees can still produce the same code
+        code = ast.unparse(representative)
+        mismatched = [x for x in mismatched if ast.unparse(x) != code]
+    if mismatched:
+        print_mismatches(representative, mismatched)
         raise RuntimeError("not all results are the same")
+    return representative
+
+
+def print_mismatches(representative, mismatched):
+    """
+    Print the subtrees at which each distinct mismatched function definition differs
+        from the representative.
+    """
+    print("*" * 80)
+    print(ast.unparse(representative))
+    seen = set()
+    for func_def in mismatched:
+        key = structural_key(func_def)
+        if key in seen:
+            continue
+        seen.add(key)
+        print("*" * 80)
+        for path, expected, actual in structural_differences(representative, func_def):
+            print(".".join(str(x) for x in path))
+            print("    expected:", render_subtree(expected))
+            print("    actual:  ", render_subtree(actual))
 
 
 def antiunify_metavariable_across_extractions(extrs, metavariable_name):
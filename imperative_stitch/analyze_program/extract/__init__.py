@@ -1,3 +1,4 @@
+from .cached_extract import do_extract_cached
 from .errors import NotApplicable
 from .extract import do_extract, remove_unnecessary_returns
 from .extraction_site import ExtractionSite
@@ -0,0 +1,188 @@
+import ast
+import copy
+from dataclasses import dataclass
+
+from permacache import permacache, stable_hash
+
+from imperative_stitch.utils.incremental_scope import top_level_statement
+from imperative_stitch.utils.node_index import NodeIndex
+
+from .errors import NotApplicable
+from .extract import ExtractedCode, do_extract
+from .extraction_site import ExtractionSite
+
+# Bump this whenever a change to the extraction changes its results, so that
+# cached outcomes from older versions are not reused. Nothing checks that this was
+# done, which is why the cache is only used when explicitly requested.
+EXTRACT_CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SiteLocation:
+    """
+    The location of an extraction site within a list of statements, in terms of
+        preorder positions (as given by NodeIndex) within ast.Module(body=statements).
+
+    Fields:
+        node: The position of the node containing the site.
+        body_field: The field of that node containing the site.
+        start: The start of the site in that field.
+        end: The (exclusive) end of the site in that field.
+        metavariables: The name and position of each metavariable.
+    """
+
+    node: int
+    body_field: str
+    start: int
+    end: int
+    metavariables: tuple[tuple[str, int], ...]
+
+    def locate(self, module):
+        """
+        Returns the ExtractionSite at this location in the given module.
+        """
+        nodes = NodeIndex(module).nodes
+        return ExtractionSite(
+            nodes[self.node],
+            self.body_field,
+            self.start,
+            self.end,
+            [(name, nodes[position]) for name, position in self.metavariables],
+        )
+
+
+@dataclass
+class ExtractionOutcome:
+    """
+    The outcome of extracting a site, in a picklable form. Pickling preserves the
+        sharing of nodes between the fields, e.g., the metavariable calls are nodes
+        of func_def, and the metavariable parameters are nodes of call.
+
+    Fields:
+        func_def, returns, call, metavariables: As in ExtractedCode, or None if
+            the extraction failed.
+        error: The type of NotApplicable error raised, if the extraction failed.
+    """
+
+    func_def: ast.AST
+    returns: list[ast.AST]
+    call: list[ast.AST]
+    metavariables: object
+    error: type = None
+
+
+def isolate_site(tree, site):
+    """
+    Find the statements whose contents determine the outcome of extracting the site,
+        and the location of the site within them.
+
+    This is the top-level statement containing the site, since the scopes, control
+        flow, and SSA of the function containing the site do not depend on the other
+        top-level statements. If the site is itself at the top level, it is the whole
+        body of the module.
+
+    Returns
+    -------
+    statements: list[AST]
+        The statements containing the site.
+    location: SiteLocation
+        The location of the site within the statements.
+    """
+    assert site.sentinel is None, "cannot isolate a site with a sentinel"
+    if site.node is tree:
+        statements = tree.body
+    else:
+        statements = [top_level_statement(NodeIndex(tree), site.node)]
+    position = NodeIndex(ast.Module(body=statements, type_ignores=[])).position
+    location = SiteLocation(
+        node=position[site.node],
+        body_field=site.body_field,
+        start=site.start,
+        end=site.end,
+        metavariables=tuple(
+            (name, position[node]) for name, node in site.metavariables
+        ),
+    )
+    return statements, location
+
+
+@permacache(
+    "imperative_stitch/analyze_program/extract/cached_extract/extraction_outcome",
+    key_function=dict(
+        statements=lambda statements: stable_hash([ast.dump(x) for x in statements])
+    ),
+    multiprocess_safe=True,
+)
+def extraction_outcome(
+    statements, location, config, extract_name, version=EXTRACT_CACHE_VERSION
+):
+    """
+    Extract the site at the given location from a copy of the given statements.
+
+    This is cached, keyed on the structure of the statements (ignoring formatting),
+        the location of the site, the configuration, and the version of the extraction.
+
+    Arguments
+    ---------
+    statements: list[AST]
+        The statements containing the site, as returned by isolate_site. Not mutated.
+    location: SiteLocation
+        The location of the site within the statements.
+    config: ExtractConfiguration
+        The configuration for the extraction.
+    extract_name: str
+        The name of the extracted function.
+    version: int
+        The version of the extraction. Must match EXTRACT_CACHE_VERSION.
+
+    Returns
+    -------
+    ExtractionOutcome
+    """
+    assert version == EXTRACT_CACHE_VERSION, f"Cannot run extraction version {version}"
+    module = ast.Module(body=copy.deepcopy(statements), type_ignores=[])
+    site = location.locate(module)
+    try:
+        extr = do_extract(site, module, config=config, extract_name=extract_name)
+    except NotApplicable as e:
+        return ExtractionOutcome(None, None, None, None, error=type(e))
+    return ExtractionOutcome(extr.func_def, extr.returns, extr.call, extr.metavariables)
+
+
+def do_extract_cached(site, tree, *, config, extract_name):
+    """
+    Like do_extract, but the outcome is looked up in a persistent cache keyed on the
+        contents of the statements containing the site, so sites that have already
+        been decided are not analyzed again.
+
+    The cache is only invalidated by bumping EXTRACT_CACHE_VERSION, so this is opt-in
+        (e.g., run_extraction(..., use_cache=True)) for long runs over a fixed version
+        of the code.
+
+    Mutates the AST in place, replacing the site with the call to the extracted
+        function, unless a NotApplicable error is raised.
+
+    Returns
+    -------
+    ExtractedCode
+        The extracted code. Its nodes are fresh copies, so the statements of the
+            site are not mutated, and undo puts them back in place of the call.
+    """
+    statements, location = isolate_site(tree, site)
+    # the outcome may be shared with other callers, and the extraction is mutated
+    # afterwards (e.g., by antiunification), so we work on a copy
+    outcome = copy.deepcopy(
+        extraction_outcome(statements, location, config, extract_name)
+    )
+    if outcome.error is not None:
+        raise outcome.error()
+    body = site.containing_sequence
+    prev = body[site.start : site.end]
+    body[site.start : site.end] = outcome.call
+
+    def undo():
+        body[site.start : site.start + len(outcome.call)] = prev
+
+    return ExtractedCode(
+        outcome.func_def, outcome.returns, outcome.call, outcome.metavariables, undo
+    )
@@ -15,14 +15,23 @@ from imperative_stitch.analyze_program.extract.metavariable import (
     extract_metavariables,
 )
 from imperative_stitch.analyze_program.extract.pre_and_post_process import preprocess
+from imperative_stitch.utils.incremental_scope import (
+    reannotate_statement,
+    top_level_statement,
+)
 
 from ..ssa.annotator import run_ssa
+from ..structures.per_function_cfg import per_function_cfg_for
 from .generator import is_function_generator
 from .input_output_variables import compute_variables
 from .loop import replace_break_and_continue
 from .stable_variable_order import canonicalize_names_in, canonicalize_variable_order
 from .unused_return import remove_unnecessary_returns
 
+# If True, the exits computed in attempt_to_mutate from the control flow graph of the
+# containing function are checked against the control flow graph of the whole module.
+VALIDATE_FUNCTION_CFG = False
+
 
 @dataclass
 class ExtractedCode:
@@ -267,6 +276,8 @@ def compute_extract_asts(tree, site, *, config, extract_name, undos):
         A Metavariables object representing the metavariables.
     returns:
         A list of return statements in the function definition.
+    function_astn:
+        The function containing the extraction site.
     """
     undo_preprocess = preprocess(tree)
     scope_info = ast_scope.annotate(tree)
@@ -274,8 +285,10 @@ def compute_extract_asts(tree, site, *, config, extract_name, undos):
     undo_sentinel = site.inject_sentinel()
     undos += [undo_sentinel]
     pfcfg = site.locate_entry_point(tree)
-    start, _, _, annotations = run_ssa(scope_info, pfcfg)
-    extracted_nodes = {x for x in start if x.instruction.node in site.all_nodes}
+    site_nodes = site.all_nodes_from_index(pfcfg.node_index)
+    # same site nodes as in compute_variables, so the SSA variables agree
+    start, _, _, annotations = run_ssa(scope_info, pfcfg, site_nodes=site_nodes)
+    extracted_nodes = {x for x in start if x.instruction.node in site_nodes}
     _, exit_node, _ = pfcfg.extraction_entry_exit(extracted_nodes)
 
     global_variables = [
@@ -284,21 +297,34 @@ def compute_extract_asts(tree, site, *, config, extract_name, undos):
     variables = compute_variables(site, scope_info, pfcfg)
     variables.raise_if_needed()
 
-    metavariables = extract_metavariables(scope_info, site, annotations, variables)
+    metavariables = extract_metavariables(
+        scope_info, site, annotations, variables, pfcfg.node_index
+    )
+
+    node_index = pfcfg.node_index
+    statement = top_level_statement(node_index, pfcfg.function_astn)
+    stale_nodes = node_index.subtree(statement)
 
     undo_metavariables = metavariables.act(pfcfg.function_astn)
     undos += [undo_metavariables]
 
-    scope_info = ast_scope.annotate(tree)
-
-    pfcfg = site.locate_entry_point(tree)
+    # the metavariable replacements are local to the function, so we only need
+    # to re-index it and re-annotate its top-level statement rather than the whole module
+    node_index.refresh(pfcfg.function_astn)
+    scope_info = reannotate_statement(scope_info, tree, statement, stale_nodes)
+    pfcfg = site.locate_entry_point(tree, node_index)
 
+    # The guaranteed outputs come from the first pass, whose site still contained the
+    # metavariables. A pruned SSA would track different symbols now, so they might
+    # not be available at the pre-exits, and the SSA ids would not line up anyway.
+    # Only their symbols are used from here on.
     variables = compute_variables(
         site,
         scope_info,
         pfcfg,
         error_on_closed=True,
         guarantee_outputs_of=variables.output_vars_ssa,
+        prune=False,
     )
     variables.raise_if_needed()
 
@@ -348,7 +374,7 @@ def compute_extract_asts(tree, site, *, config, extract_name, undos):
     )
     undos.remove(undo_preprocess)
     undo_preprocess()
-    return func_def, call, exit_node, metavariables, returns
+    return func_def, call, exit_node, metavariables, returns, pfcfg.function_astn
 
 
 def do_extract(site, tree, *, config, extract_name):
@@ -392,12 +418,16 @@ def do_extract(site, tree, *, config, extract_name):
 
 
 def _do_extract(site, tree, *, config, extract_name, undos):
-    func_def, call, exit_node, metavariables, returns = compute_extract_asts(
-        tree, site, config=config, extract_name=extract_name, undos=undos
+    func_def, call, exit_node, metavariables, returns, function_astn = (
+        compute_extract_asts(
+            tree, site, config=config, extract_name=extract_name, undos=undos
+        )
     )
 
     for calls in [*call], [*call, ast.Break()], [*call, ast.Continue()]:
-        success, undo_mutate = attempt_to_mutate(site, tree, calls, exit_node)
+        success, undo_mutate = attempt_to_mutate(
+            site, tree, calls, exit_node, function_astn
+        )
         if success:
             undos += [undo_mutate]
             break
@@ -407,11 +437,12 @@ def _do_extract(site, tree, *, config, extract_name, undos):
     return func_def, call, metavariables, returns
 
 
-def attempt_to_mutate(site, tree, calls, exit_node):
+def attempt_to_mutate(site, tree, calls, exit_node, function_astn):
     """
     Attempt to mutate the AST to replace the extraction site with the given calls code.
 
     Checks that the exit of the extraction site is the same as the exit of the calls code.
+        Only the control flow graph of the function containing the site is recomputed.
 
     Arguments
     ---------
@@ -423,6 +454,8 @@ def attempt_to_mutate(site, tree, calls, exit_node):
         The code to replace the extraction site with.
     exit_node: ControlFlowNode
         The exit of the extraction site.
+    function_astn: AST
+        The function containing the extraction site.
 
     Returns
     -------
@@ -441,11 +474,44 @@ def attempt_to_mutate(site, tree, calls, exit_node):
 
     if exit_node is None:
         return True, undo
-    new_pfcfg = site.locate_entry_point(tree)
+    call_exits = compute_call_exits(per_function_cfg_for(function_astn), calls)
+    if VALIDATE_FUNCTION_CFG:
+        full_call_exits = compute_call_exits(site.locate_entry_point(tree), calls)
+        assert {exit_key(x) for x in call_exits} == {
+            exit_key(x) for x in full_call_exits
+        }, "control flow graph of the function does not match that of the module"
+    # This should not be necessary, it results from a bug in the control flow graph
+    if len(call_exits) > 1:
+        undo()
+        raise MultipleExits
+    [exit_cfn] = call_exits
+    if not same(exit_cfn, exit_node):
+        undo()
+        return False, None
+    return True, undo
+
+
+def compute_call_exits(pfcfg, calls):
+    """
+    Compute the non-exceptional exits of the last of the given calls that appears
+        in the control flow graph.
+
+    Arguments
+    ---------
+    pfcfg: PerFunctionCFG
+        The control flow graph of the function containing the calls.
+    calls: list[AST]
+        The calls code.
+
+    Returns
+    -------
+    call_exits: list[ControlFlowNode]
+        The exits of the calls code.
+    """
     for call in calls[::-1]:
         call_cfns = [
             cfn
-            for cfn in new_pfcfg.next_cfns_of
+            for cfn in pfcfg.next_cfns_of
             if cfn is not None and cfn.instruction.node == call
         ]
         if call_cfns:
@@ -453,18 +519,16 @@ def attempt_to_mutate(site, tree, calls, exit_node):
             break
     else:
         assert False, "should have found a call cfn"
-    call_exits = [
-        x for tag, x in new_pfcfg.next_cfns_of[call_cfn] if tag != "exception"
-    ]
-    # This should not be necessary, it results from a bug in the control flow graph
-    if len(call_exits) > 1:
-        undo()
-        raise MultipleExits
-    [exit_cfn] = call_exits
-    if not same(exit_cfn, exit_node):
-        undo()
-        return False, None
-    return True, undo
+    return [x for tag, x in pfcfg.next_cfns_of[call_cfn] if tag != "exception"]
+
+
+def exit_key(x):
+    """
+    A key for an exit that is the same across control flow graphs of the same code.
+    """
+    if isinstance(x, str):
+        return x
+    return id(x.instruction.node)
 
 
 def same(a, b):
@@ -5,6 +5,7 @@ from dataclasses import dataclass
 from python_graphs import control_flow
 
 from imperative_stitch.utils.ast_utils import ReplaceNodes
+from imperative_stitch.utils.node_index import NodeIndex
 
 
 @dataclass
@@ -36,18 +37,30 @@ class ExtractionSite:
         """
         return {node for stmt in self.statements() for node in ast.walk(stmt)}
 
-    def locate_entry_point(self, tree):
+    def all_nodes_from_index(self, node_index):
+        """
+        Like all_nodes, but computed as slices of the given NodeIndex, which must be
+            up to date with the statements in the extraction site.
+        """
+        return {node for stmt in self.statements() for node in node_index.subtree(stmt)}
+
+    def locate_entry_point(self, tree, node_index=None):
         """
         Locate the entry point of the extraction site in the tree.
+
+        If a NodeIndex for the tree is given, it is shared by the per-function CFGs,
+            otherwise one is computed.
         """
         from imperative_stitch.analyze_program.structures.per_function_cfg import (
             PerFunctionCFG,
         )
 
+        if node_index is None:
+            node_index = NodeIndex(tree)
         g = control_flow.get_control_flow_graph(tree)
         pfcfgs = []
         for entry_point in list(g.get_enter_blocks()):
-            pfcfg = PerFunctionCFG(entry_point)
+            pfcfg = PerFunctionCFG(entry_point, node_index)
             if self.node not in pfcfg.astn_order:
                 continue
             pfcfgs.append(pfcfg)
@@ -1,4 +1,3 @@
-import ast
 from collections import defaultdict
 from dataclasses import dataclass, field
 
@@ -80,7 +79,7 @@ class Variables:
 
 
 def compute_variables(
-    site, scope_info, pfcfg, error_on_closed=False, guarantee_outputs_of=()
+    site, scope_info, pfcfg, error_on_closed=False, guarantee_outputs_of=(), prune=None
 ):
     """
     Compute a Variables object for a site. Ignores metavariables.
@@ -91,19 +90,25 @@ def compute_variables(
         - pfcfg: the program flow control graph
         - error_on_closed: whether to error if a closed variable is passed directly
         - guarantee_outputs_of: a list of variables that must be outputted, with SSA ids
+        - prune: whether to run a pruned SSA. Defaults to USE_PRUNED_SSA.
 
     Returns:
         A Variables object
     """
-    start, end, ssa_to_origin, node_to_ssa = run_ssa(scope_info, pfcfg)
-    extracted_nodes = {x for x in start if x.instruction.node in site.all_nodes}
+    site_nodes = site.all_nodes_from_index(pfcfg.node_index)
+    start, end, ssa_to_origin, node_to_ssa = run_ssa(
+        scope_info, pfcfg, prune=prune, site_nodes=site_nodes
+    )
+    extracted_nodes = {x for x in start if x.instruction.node in site_nodes}
     entry_node, exit_node, pre_exits = pfcfg.extraction_entry_exit(extracted_nodes)
     ultimate_origins = compute_ultimate_origins(ssa_to_origin)
 
     if exit_node is None or exit_node == "<return>":
         output_variables = []
     else:
-        output_variables = compute_output_variables(site, ssa_to_origin, node_to_ssa)
+        output_variables = compute_output_variables(
+            site_nodes, ssa_to_origin, node_to_ssa
+        )
     output_variables += guarantee_outputs_of
     output_symbols = sorted({x for x, _ in output_variables})
     output_variable_at_exit = {
@@ -111,18 +116,18 @@ def compute_variables(
     }
 
     input_variables = compute_input_variables(
-        site, ssa_to_origin, node_to_ssa, output_variable_at_exit
+        site_nodes, ssa_to_origin, node_to_ssa, output_variable_at_exit
     )
     # renormalize the input variables to be the ones that are actually passed in
     # in case the ones used are the result of a phi node
     input_variables = sorted({start[entry_node][x] for x, _ in input_variables})
 
     parent_variables = variables_from_parent(
-        site, node_to_ssa, scope_info, pfcfg.function_astn
+        site_nodes, node_to_ssa, scope_info, pfcfg.astn_order
     )
 
     extracted_variables = [
-        ssa_id for node in site.all_nodes for ssa_id in node_to_ssa.get(node, ())
+        ssa_id for node in site_nodes for ssa_id in node_to_ssa.get(node, ())
     ]
 
     closed_variables = sorted(
@@ -141,7 +146,7 @@ def compute_variables(
 
     closed_in_parent_variables = sorted(
         ssa_id
-        for node in set(node_to_ssa) - set(site.all_nodes)
+        for node in set(node_to_ssa) - site_nodes
         for ssa_id in node_to_ssa.get(node, ())
         if isinstance(ssa_to_origin[ssa_id], Gamma)
     )
@@ -269,21 +274,21 @@ def traces_an_origin_to_node_set(
     )
 
 
-def variables_from_parent(site, annotations, scope_info, function_astn):
+def variables_from_parent(site_nodes, annotations, scope_info, function_nodes):
     """
     Variables that are defined in the parent function of the extraction site.
 
     Args:
-        - site: the extraction site
+        - site_nodes: the nodes in the extraction site
         - annotations: a mapping from a node to the set of variables defined in the node
         - scope_info: a mapping from nodes to scopes
+        - function_nodes: a container of the nodes in the function containing the site
 
     Returns:
         A list of variables that are defined in the parent function of the extraction site.
     """
-    function_nodes = set(ast.walk(function_astn))
     result = set()
-    for node in site.all_nodes:
+    for node in site_nodes:
         if node in annotations:
             continue
         if node not in scope_info:
@@ -372,12 +377,12 @@ def get_variable_journeys(ssa_to_origin, node_to_ssa, *, node_predicate, handle_
     return node_journeys
 
 
-def compute_output_variables(site, ssa_to_origin, node_to_ssa):
+def compute_output_variables(site_nodes, ssa_to_origin, node_to_ssa):
     """
     Like compute_input_variables, but for output variables.
 
     Args:
-        - site: the extraction site
+        - site_nodes: the nodes in the extraction site
         - ssa_to_origin: a mapping from SSA ids to origins
         - node_to_ssa: a mapping from nodes to SSA ids
 
@@ -387,7 +392,7 @@ def compute_output_variables(site, ssa_to_origin, node_to_ssa):
     node_journeys = get_variable_journeys(
         ssa_to_origin,
         node_to_ssa,
-        node_predicate=lambda x: x in site.all_nodes,
+        node_predicate=lambda x: x in site_nodes,
         handle_gamma=True,
     )
 
@@ -400,12 +405,12 @@ def compute_output_variables(site, ssa_to_origin, node_to_ssa):
     return sorted(result)
 
 
-def compute_input_variables(site, ssa_to_origin, node_to_ssa, out):
+def compute_input_variables(site_nodes, ssa_to_origin, node_to_ssa, out):
     """
     Computes the input variables for a site.
 
     Args:
-        - site: the extraction site
+        - site_nodes: the nodes in the extraction site
         - ssa_to_origin: a mapping from SSA ids to origins
         - node_to_ssa: a mapping from nodes to SSA ids
         - out: the SSA ids representing the variables that need to be outputted
@@ -413,7 +418,7 @@ def compute_input_variables(site, ssa_to_origin, node_to_ssa, out):
     node_journeys = get_variable_journeys(
         ssa_to_origin,
         node_to_ssa,
-        node_predicate=lambda x: x in site.all_nodes,
+        node_predicate=lambda x: x in site_nodes,
         handle_gamma=False,
     )
     for x in out:
@@ -6,7 +6,9 @@ from ast_scope.scope import ClassScope, ErrorScope, FunctionScope, GlobalScope
 from imperative_stitch.utils.ast_utils import ReplaceNodes, ast_nodes_in_order
 
 
-def variables_needed_to_extract(scope_info, extract_node, node_to_ssa, variables):
+def variables_needed_to_extract(
+    scope_info, extract_node, node_to_ssa, variables, node_index=None
+):
     """
     Compute the variables needed to be passed in to extract the given node.
         These are the variables that are used in the extract_node, but are not
@@ -19,11 +21,12 @@ def variables_needed_to_extract(scope_info, extract_node, node_to_ssa, variables
         extract_node (ast.AST): The node to extract.
         node_to_ssa (dict): A dictionary mapping AST nodes to their ssas.
         variables (Variables): The input, closed, and output variables of the site
+        node_index (NodeIndex): An index containing the extract_node, if available.
 
     Returns:
         list[str]: A list of variable names that are needed to extract the given node.
     """
-    node_list = ast_nodes_in_order(extract_node)
+    node_list = ast_nodes_in_order(extract_node, node_index)
     nodes = set(node_list)
     name_to_scope = {}
     for node in node_list:
@@ -53,6 +56,7 @@ def extract_as_function(
     node_to_ssa,
     metavariable_name,
     variables,
+    node_index=None,
 ):
     """
     Extract the given metavariable node as a function.
@@ -63,13 +67,14 @@ def extract_as_function(
         node_to_ssa (dict): A dictionary mapping AST nodes to their ssas.
         metavariable_name (str): The name of the metavariable.
         variables (Variables): The input, closed, and output variables of the site
+        node_index (NodeIndex): An index containing the metavariable node, if available.
 
     Returns:
         ast.Lambda: The parameter to be passed in.
         ast.Call: The call to the metavariable that replaces the metavariable_node.
     """
     variables = variables_needed_to_extract(
-        scope_info, metavariable_node, node_to_ssa, variables
+        scope_info, metavariable_node, node_to_ssa, variables, node_index
     )
     args = ast.arguments(
         args=[ast.arg(v) for v in variables],
@@ -89,7 +94,7 @@ def extract_as_function(
     return parameter, call
 
 
-def extract_metavariables(scope_info, site, node_to_ssa, variables):
+def extract_metavariables(scope_info, site, node_to_ssa, variables, node_index=None):
     """
     Extract all metavariables in the given site.
 
@@ -98,6 +103,7 @@ def extract_metavariables(scope_info, site, node_to_ssa, variables):
         site (ExtractionSite): The site to extract metavariables from.
         node_to_ssa (dict): A dictionary mapping AST nodes to their ssas.
         variables (Variables): The input, closed, and output variables of the site
+        node_index (NodeIndex): An index containing the site, if available.
 
     Returns:
         MetaVariables: The extracted metavariables.
@@ -116,6 +122,7 @@ def extract_metavariables(scope_info, site, node_to_ssa, variables):
             node_to_ssa,
             metavariable_name,
             variables,
+            node_index,
         )
         texts[metavariable_name] = ast.unparse(metavariable_node)
         parameters[metavariable_name] = parameter
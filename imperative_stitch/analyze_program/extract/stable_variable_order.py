@@ -4,15 +4,19 @@ import ast_scope
 import neurosym as ns
 
 from imperative_stitch.utils.ast_utils import ast_nodes_in_order
+from imperative_stitch.utils.node_index import NodeIndex
 
 
 def get_name_and_scope_each(func_def, metavariables, *, do_not_change_internal_args):
-    args = set(ast_nodes_in_order(func_def.args))
+    node_index = NodeIndex(func_def)
+    args = set(ast_nodes_in_order(func_def.args, node_index))
     metavariable_call_nodes = {
-        x for call in metavariables.all_calls for x in ast_nodes_in_order(call)
+        x
+        for call in metavariables.all_calls
+        for x in ast_nodes_in_order(call, node_index)
     }
     annotation = ast_scope.annotate(func_def)
-    nodes = [x for x in ast_nodes_in_order(func_def) if x in annotation]
+    nodes = [x for x in node_index.nodes if x in annotation]
     node_to_name_and_scope = {}
     name_and_scope_ordering = {}
     name_and_scope_is_arg = set()
@@ -1,2 +1,8 @@
 from .annotator import run_ssa
+from .batch import (
+    FunctionSSAFailure,
+    FunctionSSAResult,
+    run_ssa_on_function_source,
+    run_ssa_on_module,
+)
 from .render import rename_to_ssa, render_phi_map
@@ -3,8 +3,12 @@ from collections import defaultdict
 
 import neurosym as ns
 
-from ..structures.per_function_cfg import PerFunctionCFG, eventually_accessible_cfns
-from .compute_node_to_containing import compute_enclosed_variables
+from ..structures.per_function_cfg import PerFunctionCFG
+from .compute_node_to_containing import (
+    compute_enclosed_variables,
+    function_scope_for,
+    module_scope_summary,
+)
 from .ivm import (
     Argument,
     DefinedIn,
@@ -13,8 +17,13 @@ from .ivm import (
     SSAVariableIntermediateMapping,
     Uninitialized,
 )
+from .liveness import compute_liveness
 from .renamer import name_vars
 
+# If True, run_ssa only tracks the symbols that are live at each control flow node,
+# unless told otherwise.
+USE_PRUNED_SSA = False
+
 
 class FunctionSSAAnnotator:
     """
@@ -24,13 +33,22 @@ class FunctionSSAAnnotator:
         _mapping: The mapping from SSA variables to their original symbols and parents.
         _start: A mapping from name to variable at the inlet to that node
         _end: A mapping from name to variable at the outlet of that node
+        _tracked_start: If pruned, a mapping from control flow node to the symbols
+            tracked at its inlet. None if every symbol is tracked everywhere.
+        _tracked_end: As _tracked_start, but for the outlet.
     """
 
-    def __init__(self, scope_info, per_function_cfg: PerFunctionCFG):
+    def __init__(
+        self,
+        scope_info,
+        per_function_cfg: PerFunctionCFG,
+        prune=False,
+        site_nodes=(),
+    ):
         self.scope_info = scope_info
         self.graph = per_function_cfg
 
-        function_scope = scope_info.function_scope_for(self.graph.function_astn)
+        function_scope = function_scope_for(scope_info, self.graph.function_astn)
         if function_scope is None:
             self.function_symbols = []
             self.function_arguments = []
@@ -59,6 +77,43 @@ class FunctionSSAAnnotator:
                 ),
             )
 
+        self._tracked_start = self._tracked_end = None
+        if prune:
+            self._compute_tracked_symbols(site_nodes)
+
+    def _compute_tracked_symbols(self, site_nodes):
+        """
+        Restrict the symbols tracked at each node to the ones that are live there, along
+            with the ones written at the node (which need annotations), the ones
+            referenced in a nested scope (whose values are needed at every node), and
+            the ones used in the given site (whose values are needed at its boundaries).
+        """
+        symbols = set(self.function_symbols)
+
+        def defs_of(cfn):
+            return {name for _, name in self.get_writes_for(cfn)} | {
+                x.id for x in self.get_dels_for(cfn)
+            }
+
+        def uses_of(cfn):
+            return {x.id for x in self.get_reads_for(cfn) + self.get_dels_for(cfn)}
+
+        live_in, live_out = compute_liveness(self.graph, uses_of, defs_of)
+        enclosed = module_scope_summary(self.scope_info).enclosed_variables(
+            self.graph.function_astn, self.graph.node_index
+        )
+        always = {node.id for node, _ in enclosed if isinstance(node, ast.Name)}
+        always |= {node.id for node in site_nodes if isinstance(node, ast.Name)}
+        for cfn in live_in:
+            if cfn.instruction.node in site_nodes:
+                always |= uses_of(cfn) | defs_of(cfn)
+        self._tracked_start = {
+            cfn: (live_in[cfn] | always) & symbols for cfn in live_in
+        }
+        self._tracked_end = {
+            cfn: (live_out[cfn] | defs_of(cfn) | always) & symbols for cfn in live_out
+        }
+
     def run(self):
         """
         Run the SSA annotator.
@@ -129,7 +184,7 @@ class FunctionSSAAnnotator:
         Add a gamma parent to the IVM and return the handle for the given node.
         """
         cfn = self.graph.astn_to_cfn[node]
-        cfns = eventually_accessible_cfns(self.graph.next_cfns_of, {cfn})
+        cfns = self.graph.eventually_accessible_cfns({cfn})
         cfns = [x for x in cfns if x in self._start]
         cfns = self.graph.sort_by_cfn_key(cfns)
         closed = [
@@ -189,7 +244,7 @@ class FunctionSSAAnnotator:
         # recompute since a parent was updated
         old_start = self._start.get(cfn, {})
         self._start[cfn] = {}
-        for sym in self.function_symbols:
+        for sym in self.tracked_symbols(self._tracked_start, cfn):
             parent_vars = set()
             for parent_end in self.prev_ends(cfn):
                 if sym in parent_end:
@@ -206,6 +261,14 @@ class FunctionSSAAnnotator:
             return True
         return False
 
+    def tracked_symbols(self, tracked, cfn):
+        """
+        Returns the symbols to track at the given node, in order.
+        """
+        if tracked is None or cfn not in tracked:
+            return self.function_symbols
+        return [sym for sym in self.function_symbols if sym in tracked[cfn]]
+
     def prev_ends(self, cfn):
         """
         Returns the end variables for each of the parents of `cfn`.
@@ -229,11 +292,36 @@ class FunctionSSAAnnotator:
             )
         for x in self.get_dels_for(cfn):
             end_variables[x.id] = self._mapping.fresh_uninitialized(x.id)
+        if self._tracked_end is not None and cfn in self._tracked_end:
+            end_variables = {
+                sym: var
+                for sym, var in end_variables.items()
+                if sym in self._tracked_end[cfn]
+            }
         return end_variables
 
 
-def run_ssa(scope_info, per_function_cfg: PerFunctionCFG):
-    annot = FunctionSSAAnnotator(scope_info, per_function_cfg)
+def run_ssa(scope_info, per_function_cfg: PerFunctionCFG, prune=None, site_nodes=()):
+    """
+    Run SSA on the given function.
+
+    Args:
+        scope_info: The scope information for the module containing the function.
+        per_function_cfg: The control flow graph of the function.
+        prune: Whether to only track the symbols live at each node, in which case the
+            start and end mappings are sparse. Defaults to USE_PRUNED_SSA.
+        site_nodes: If pruning, the nodes of an extraction site. The symbols they use are
+            tracked at every node, so their values are available at the site's boundaries.
+            The SSA variables are the same for any two runs given the same site.
+
+    Returns:
+        As in FunctionSSAAnnotator.run.
+    """
+    if prune is None:
+        prune = USE_PRUNED_SSA
+    annot = FunctionSSAAnnotator(
+        scope_info, per_function_cfg, prune=prune, site_nodes=site_nodes
+    )
     return annot.run()
 
 
@@ -1,70 +1,93 @@
 import ast
+import weakref
 from dataclasses import dataclass
 
 
-class ParentOfVisitor(ast.NodeVisitor):
-    def __init__(self):
-        self.parent_of = {}
-
-    def visit(self, node):
-        if not hasattr(node, "_fields"):
-            return
-        for f in node._fields:
-            res = getattr(node, f)
-            if isinstance(res, list):
-                for x in res:
-                    self.parent_of[x] = node
-            else:
-                self.parent_of[res] = node
-        super().generic_visit(node)
-
-
 @dataclass(eq=True)
 class BannedComponentError(Exception):
     component_type: str
     at_fault: ast.AST
 
 
-class BannedComponentVisitor(ast.NodeVisitor):
-    def __init__(self, parent_of):
-        self.parent_of = parent_of
-
-    def visit_ClassDef(self, node):
-        raise BannedComponentError("classes", "us")
-
-    def visit_Nonlocal(self, node):
-        raise BannedComponentError("nonlocal", "us")
-
-    def visit_NamedExpr(self, node):
-        raise BannedComponentError("walrus operator", "us")
-
-    def visit_AsyncFor(self, node):
-        raise BannedComponentError("async for", "us")
-
-    def visit_AsyncWith(self, node):
-        raise BannedComponentError("async with", "us")
-
-    def visit_AsyncFunctionDef(self, node):
-        raise BannedComponentError("async functions", "us")
-
-    def visit_Await(self, node):
-        raise BannedComponentError("await", "us")
-
-    def visit_Global(self, node):
-        raise BannedComponentError("global", "us")
-
-    def visit_Yield(self, node):
-        self.check_not_coroutine(node)
-
-    def visit_YieldFrom(self, node):
-        self.check_not_coroutine(node)
-
-    def check_not_coroutine(self, node):
-        if not isinstance(self.parent_of[node], (ast.Expr, ast.Lambda)):
-            raise BannedComponentError("coroutine", "us")
-
-
-def check_banned_components(node):
-    parents = ParentOfVisitor()
-    parents.visit(node)
-    BannedComponentVisitor(parents.parent_of).visit(node)
+# Constructs we do not handle wherever they appear, and the component type of each.
+BANNED_NODE_TYPES = {
+    ast.ClassDef: "classes",
+    ast.Nonlocal: "nonlocal",
+    ast.NamedExpr: "walrus operator",
+    ast.AsyncFor: "async for",
+    ast.AsyncWith: "async with",
+    ast.AsyncFunctionDef: "async functions",
+    ast.Await: "await",
+    ast.Global: "global",
+}
+
+# A yield is only handled when its value is discarded, i.e., when it is its own
+# statement or the body of a lambda. Otherwise it is a coroutine.
+YIELD_NODE_TYPES = (ast.Yield, ast.YieldFrom)
+YIELD_PARENT_TYPES = (ast.Expr, ast.Lambda)
+
+# Map from each checked node to (weakref to the NodeIndex, index version, result).
+_checked = weakref.WeakKeyDictionary()
+
+
+def find_banned_component(node):
+    """
+    Find the first component we do not handle in the given tree, in the order an
+        ast.NodeVisitor would visit them.
+
+    The parent of each node is kept on the traversal stack, so it is only looked at
+        for yields. As with the visitor, the values of yields are not checked.
+
+    Returns:
+        A (component_type, at_fault) pair, or None if there is no banned component.
+    """
+    stack = [(node, None)]
+    while stack:
+        node, parent = stack.pop()
+        component_type = BANNED_NODE_TYPES.get(type(node))
+        if component_type is not None:
+            return component_type, "us"
+        if isinstance(node, YIELD_NODE_TYPES):
+            if not isinstance(parent, YIELD_PARENT_TYPES):
+                return "coroutine", "us"
+            # like the visitor this replaces, do not look inside yields
+            continue
+        children = []
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                children += [
+                    (item, node) for item in value if isinstance(item, ast.AST)
+                ]
+            elif isinstance(value, ast.AST) and not isinstance(value, ast.expr_context):
+                # expression contexts are leaves that can never be banned
+                children.append((value, node))
+        children.reverse()
+        stack += children
+    return None
+
+
+def check_banned_components(node, node_index=None):
+    """
+    Raise a BannedComponentError if the given node contains a component we do not handle.
+
+    If a NodeIndex containing `node` is given, the result is cached on `node` until the
+        index is refreshed, so that building several control flow graphs for the same
+        function only scans it once. As with the index itself, the subtree must not be
+        mutated without refreshing the index.
+    """
+    if node_index is None or node not in node_index:
+        result = find_banned_component(node)
+    else:
+        cached = _checked.get(node)
+        if (
+            cached is not None
+            and cached[0]() is node_index
+            and cached[1] == node_index.version
+        ):
+            result = cached[2]
+        else:
+            result = find_banned_component(node)
+            _checked[node] = weakref.ref(node_index), node_index.version, result
+    if result is not None:
+        raise BannedComponentError(*result)
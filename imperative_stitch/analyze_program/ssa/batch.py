@@ -0,0 +1,136 @@
+import ast
+from dataclasses import dataclass
+
+import ast_scope
+from permacache import permacache, stable_hash
+from python_graphs import control_flow
+from tqdm.contrib.concurrent import process_map
+
+from imperative_stitch.utils.node_index import NodeIndex
+
+from ..structures.per_function_cfg import PerFunctionCFG
+from .annotator import run_ssa
+from .banned_component import BannedComponentError
+from .render import rename_to_ssa, render_phi_map
+
+# Bump this whenever a change to the SSA analysis changes its results, so that
+# cached results from older versions are not reused.
+SSA_ANALYSIS_VERSION = 1
+
+
+@dataclass(frozen=True)
+class FunctionSSAResult:
+    """
+    The result of running SSA on a single function, in a picklable form.
+
+    Fields:
+        source: The source code of the function that was analyzed.
+        ssa_source: The source code of the function with each variable renamed to its SSA variable.
+        phi_map: The rendered phi and gamma nodes, as produced by render_phi_map.
+        annotations: A mapping from the preorder position of each annotated node within
+            the function (as given by NodeIndex) to its SSA variables.
+    """
+
+    source: str
+    ssa_source: str
+    phi_map: dict[str, str]
+    annotations: dict[int, list[tuple[str, int]]]
+
+
+@dataclass(frozen=True)
+class FunctionSSAFailure:
+    """
+    A function that could not be analyzed because it contains a banned component.
+
+    Fields:
+        source: The source code of the function.
+        component_type: The type of the banned component, as in BannedComponentError.
+        at_fault: Who is at fault for the component being banned.
+    """
+
+    source: str
+    component_type: str
+    at_fault: str
+
+
+def function_sources(module):
+    """
+    Returns the source code of each function in the given module, in the order
+        they are enumerated by the control flow graph.
+    """
+    g = control_flow.get_control_flow_graph(module)
+    return [ast.unparse(entry_point.node) for entry_point in g.get_enter_blocks()]
+
+
+@permacache(
+    "imperative_stitch/analyze_program/ssa/batch/run_ssa_on_function_source",
+    key_function=dict(source=stable_hash),
+    multiprocess_safe=True,
+)
+def run_ssa_on_function_source(source, version=SSA_ANALYSIS_VERSION):
+    """
+    Run SSA on the function with the given source code, in isolation from its
+        enclosing code. Since global and nonlocal declarations are banned, the
+        symbols of a function depend only on its own source, so the result is the
+        same as running SSA on it in place.
+
+    This is cached, keyed on the source code and the version of the analysis.
+
+    Args:
+        source: The source code of a single function.
+        version: The version of the analysis. Must match SSA_ANALYSIS_VERSION.
+
+    Returns:
+        FunctionSSAResult or FunctionSSAFailure.
+    """
+    assert version == SSA_ANALYSIS_VERSION, f"Cannot run SSA version {version}"
+    tree = ast.parse(source)
+    scope_info = ast_scope.annotate(tree)
+    g = control_flow.get_control_flow_graph(tree)
+    node_index = NodeIndex(tree)
+    [function_astn] = tree.body
+    [entry_point] = [x for x in g.get_enter_blocks() if x.node is function_astn]
+    try:
+        pfcfg = PerFunctionCFG(entry_point, node_index)
+        _, _, phi_map, annotations = run_ssa(scope_info, pfcfg, prune=False)
+    except BannedComponentError as e:
+        return FunctionSSAFailure(source, e.component_type, e.at_fault)
+    return FunctionSSAResult(
+        source=source,
+        ssa_source=ast.unparse(rename_to_ssa(annotations, function_astn)),
+        phi_map=render_phi_map(phi_map),
+        annotations={
+            node_index.position[node] - node_index.position[function_astn]: variables
+            for node, variables in annotations.items()
+        },
+    )
+
+
+def _run_ssa_on_function_source_worker(source):
+    # the permacache wrapper is not picklable, so we need a plain function
+    return run_ssa_on_function_source(source)
+
+
+def run_ssa_on_module(module, *, parallel=True, max_workers=None):
+    """
+    Run SSA on every function in the given module.
+
+    Args:
+        module: The ast.Module to analyze.
+        parallel: Whether to analyze the functions in a process pool.
+        max_workers: The maximum number of processes to use, if parallel.
+
+    Returns:
+        A list of FunctionSSAResult or FunctionSSAFailure, one for each function
+            in the order given by function_sources.
+    """
+    sources = function_sources(module)
+    if not parallel:
+        return [run_ssa_on_function_source(source) for source in sources]
+    return process_map(
+        _run_ssa_on_function_source_worker,
+        sources,
+        max_workers=max_workers,
+        chunksize=max(1, len(sources) // 64),
+        disable=True,
+    )
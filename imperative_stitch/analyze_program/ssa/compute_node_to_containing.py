@@ -1,64 +1,10 @@
 import ast
+import weakref
+from collections import defaultdict
 
-from ast_scope.group_similar_constructs import GroupSimilarConstructsVisitor
 from ast_scope.scope import FunctionScope
 
-
-class NodeToContainingFunction(GroupSimilarConstructsVisitor):
-    """
-    Computes the containing functions of each node in the AST.
-
-    Includes function definitions, lambdas, and comprehensions.
-    """
-
-    def __init__(self):
-        self.current_fn = []
-        self.node_to_containing = {}
-
-    def generic_visit(self, node):
-        if node is None:
-            return
-        if isinstance(node, list):
-            for x in node:
-                self.visit(x)
-            return
-        super().generic_visit(node)
-        self.node_to_containing[node] = self.current_fn
-
-    def visit_defaults_of(self, args):
-        self.visit(args.defaults + args.kw_defaults)
-
-    def visit_function_def(self, func_node, is_async):
-        self.visit_defaults_of(func_node.args)
-        self.visit(func_node.decorator_list)
-        self.visit_scope(func_node, func_node.body)
-
-    def visit_comprehension_generic(self, targets, comprehensions, node):
-        self.visit(self.get_generators(node))
-        return self.visit_scope(node, [node.elt, self.get_ifs(node)])
-
-    # The argument name changed from `comp_node` to `node` in later versions of Python.
-    # pylint: disable=arguments-renamed
-    def visit_DictComp(self, node):
-        self.visit(self.get_generators(node))
-        return self.visit_scope(node, [node.key, node.value, self.get_ifs(node)])
-
-    def visit_Lambda(self, node):
-        self.visit_defaults_of(node.args)
-        return self.visit_scope(node, node.body)
-
-    def visit_scope(self, func_node, content):
-        self.current_fn = self.current_fn + [func_node]
-        self.visit(content)
-        self.current_fn = self.current_fn[:-1]
-
-    @staticmethod
-    def get_ifs(node):
-        return [comp.ifs for comp in node.generators]
-
-    @staticmethod
-    def get_generators(node):
-        return [comp.iter for comp in node.generators]
+from imperative_stitch.utils.node_index import NodeIndex
 
 
 def compute_node_to_containing(tree):
@@ -72,9 +18,13 @@ def compute_node_to_containing(tree):
     :return: A dictionary mapping each node in the AST to the list of containing functions.
         The last element of the list is the function that directly contains the node.
     """
-    to_containing = NodeToContainingFunction()
-    to_containing.visit(tree)
-    return to_containing.node_to_containing
+    node_index = NodeIndex(tree)
+    result = {}
+    for node in node_index.nodes:
+        stack = node_index.containing_stack(node)
+        if stack is not None:
+            result[node] = stack
+    return result
 
 
 node_to_is_executed_immediately = {
@@ -95,6 +45,81 @@ def executed_immediately(stack):
     return all(node_to_is_executed_immediately[type(x)] for x in stack)
 
 
+class ModuleScopeSummary:
+    """
+    Per-function scope information for a module, computed in a single pass over the
+        scope annotations and shared by every function analyzed with the same scope_info.
+
+    Fields:
+        function_scopes: dict[AST, FunctionScope] The scope of each function node.
+        scoped_nodes: dict[AST, list[AST]] The nodes whose scope is each function, in
+            the order of the scope annotations.
+        _enclosed: dict[AST, tuple] For each function, the index (and its version) the
+            enclosed variables were computed with, and the enclosed variables.
+    """
+
+    def __init__(self, scope_info):
+        self.function_scopes = {}
+        self.scoped_nodes = defaultdict(list)
+        for node in scope_info:
+            scope = scope_info[node]
+            if not isinstance(scope, FunctionScope):
+                continue
+            self.function_scopes.setdefault(scope.function_node, scope)
+            self.scoped_nodes[scope.function_node].append(node)
+        self._enclosed = {}
+
+    def enclosed_variables(self, function_astn, node_index):
+        """
+        Compute the nodes scoped to the given function that appear within a nested
+            function, lambda, or comprehension, classified by whether they are executed
+            immediately. Cached per function.
+
+        :param function_astn: The function to compute the enclosed variables of.
+        :param node_index: A NodeIndex containing the function.
+
+        :return: A list of (node, executed_immediately) pairs, in scope annotation order.
+        """
+        cached = self._enclosed.get(function_astn)
+        if cached is not None and cached[0] is node_index:
+            if cached[1] == node_index.version:
+                return cached[2]
+        result = []
+        for node in self.scoped_nodes.get(function_astn, ()):
+            if node == function_astn:
+                continue
+            containing = node_index.containing_stack(node, function_astn)
+            if containing is None:
+                continue
+            first, *stack = containing
+            assert first == function_astn
+            if not stack:
+                continue
+            result.append((node, executed_immediately(stack)))
+        self._enclosed[function_astn] = node_index, node_index.version, result
+        return result
+
+
+_module_scope_summaries = weakref.WeakKeyDictionary()
+
+
+def module_scope_summary(scope_info):
+    """
+    Get the ModuleScopeSummary for the given scope information, computing it if this is
+        the first time it has been requested.
+    """
+    if scope_info not in _module_scope_summaries:
+        _module_scope_summaries[scope_info] = ModuleScopeSummary(scope_info)
+    return _module_scope_summaries[scope_info]
+
+
+def function_scope_for(scope_info, function_astn):
+    """
+    Like scope_info.function_scope_for, but using the cached module summary.
+    """
+    return module_scope_summary(scope_info).function_scopes.get(function_astn)
+
+
 def compute_enclosed_variables(scope_info, pcfg, already_annotated):
     """
     Compute all enclosed variables for the given function.
@@ -107,27 +132,16 @@ def compute_enclosed_variables(scope_info, pcfg, already_annotated):
         - immediately_executed is the list of variables that are enclosed and executed immediately.
         - closed is the list of variables that are enclosed and placed in a closure.
     """
-    node_to_containing = compute_node_to_containing(pcfg.function_astn)
-
-    closed_variables = [
-        x
-        for x in scope_info
-        if x != pcfg.function_astn
-        if x not in already_annotated
-        and isinstance(scope_info[x], FunctionScope)
-        and scope_info[x].function_node == pcfg.function_astn
-    ]
+    enclosed = module_scope_summary(scope_info).enclosed_variables(
+        pcfg.function_astn, pcfg.node_index
+    )
 
     immediately_executed, closed = [], []
 
-    for node in closed_variables:
-        if node not in node_to_containing:
-            continue
-        first, *stack = node_to_containing[node]
-        assert first == pcfg.function_astn
-        if not stack:
+    for node, is_immediate in enclosed:
+        if node in already_annotated:
             continue
-        if executed_immediately(stack):
+        if is_immediate:
             immediately_executed.append(node)
         else:
             closed.append(node)
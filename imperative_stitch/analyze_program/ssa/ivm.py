@@ -4,6 +4,8 @@ from dataclasses import dataclass
 
 
 class Origin(ABC):
+    __slots__ = ()
+
     def replaceable_without_propagating(self, other):
         """
         Whether this origin can be replaced by another origin without propagating
@@ -38,8 +40,33 @@ class Origin(ABC):
         return None
 
 
-@dataclass(eq=True, frozen=True)
-class Uninitialized(Origin):
+_INTERNED = {}
+
+
+class InternedOrigin(Origin):
+    """
+    An origin without fields. Interned, so that there is only one instance of each
+        subclass, and comparisons are by identity.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls):
+        instance = _INTERNED.get(cls)
+        if instance is None:
+            instance = _INTERNED[cls] = super().__new__(cls)
+        return instance
+
+    def __reduce__(self):
+        return type(self), ()
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class Uninitialized(InternedOrigin):
+    __slots__ = ()
+
     def initial(self):
         return True
 
@@ -47,8 +74,9 @@ class Uninitialized(Origin):
         return False
 
 
-@dataclass(eq=True, frozen=True)
-class Argument(Origin):
+class Argument(InternedOrigin):
+    __slots__ = ()
+
     def initial(self):
         return True
 
@@ -58,8 +86,12 @@ class Argument(Origin):
 
 @dataclass(eq=True, frozen=True)
 class DefinedIn(Origin):
+    __slots__ = ("site",)
     site: AST
 
+    def __reduce__(self):
+        return DefinedIn, (self.site,)
+
     def initial(self):
         return False
 
@@ -69,13 +101,40 @@ class DefinedIn(Origin):
 
 @dataclass(eq=True, frozen=True)
 class Phi(Origin):
+    """
+    A join of several variables at a node. The parents are sorted and deduplicated,
+        so equality is a direct comparison of the parent tuples, and the hash is cached.
+    """
+
+    __slots__ = ("node", "parents", "_hash")
     node: AST
     parents: tuple
 
+    def __hash__(self):
+        # computed on first use, since most phis are never hashed
+        try:
+            return self._hash
+        except AttributeError:
+            result = hash((self.node, self.parents))
+            object.__setattr__(self, "_hash", result)
+            return result
+
+    def __eq__(self, other):
+        return (
+            other.__class__ is Phi
+            and self.parents == other.parents
+            and self.node == other.node
+        )
+
+    def __reduce__(self):
+        return Phi, (self.node, self.parents)
+
     def replaceable_without_propagating(self, other):
         return isinstance(other, Phi)
 
     def remap(self, renaming_map):
+        if not any(x in renaming_map for x in self.parents):
+            return self
         return Phi(
             self.node, tuple(sorted({renaming_map.get(x, x) for x in self.parents}))
         )
@@ -99,9 +158,13 @@ class Phi(Origin):
 
 @dataclass(eq=True, frozen=True)
 class Gamma(Origin):
+    __slots__ = ("node", "closed")
     node: AST
     closed: tuple
 
+    def __reduce__(self):
+        return Gamma, (self.node, self.closed)
+
     def replaceable_without_propagating(self, other):
         raise NotImplementedError
 
@@ -133,9 +196,11 @@ class SSAVariableIntermediateMapping:
     def __init__(self):
         self.original_symbol_of = {}
         self.parents_of = {}
+        self._next_variable = 0
 
     def fresh_variable(self, original_symbol, parents):
-        var = 1 + max(self.original_symbol_of) if self.original_symbol_of else 0
+        var = self._next_variable
+        self._next_variable += 1
         self.original_symbol_of[var] = original_symbol
         self.parents_of[var] = parents
         return var
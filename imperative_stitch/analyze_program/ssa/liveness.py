@@ -0,0 +1,44 @@
+from collections import deque
+
+
+def compute_liveness(graph, uses_of, defs_of):
+    """
+    Compute the symbols live at the inlet and outlet of each control flow node, following
+        both normal and exceptional edges.
+
+    Args:
+        graph: The PerFunctionCFG to analyze.
+        uses_of: A function from control flow node to the set of symbols it reads.
+        defs_of: A function from control flow node to the set of symbols it overwrites.
+
+    Returns:
+        live_in: A mapping from control flow node to the symbols live at its inlet.
+        live_out: A mapping from control flow node to the symbols live at its outlet.
+    """
+    cfns = graph.sort_by_cfn_key(list(graph.prev_cfns_of))
+    uses = {cfn: frozenset(uses_of(cfn)) for cfn in cfns}
+    defs = {cfn: frozenset(defs_of(cfn)) for cfn in cfns}
+    live_in = {cfn: uses[cfn] for cfn in cfns}
+    live_out = {cfn: frozenset() for cfn in cfns}
+    # process in reverse order, since liveness flows backwards
+    queue = deque(cfns[::-1])
+    queued = set(queue)
+    while queue:
+        cfn = queue.popleft()
+        queued.remove(cfn)
+        out = frozenset(
+            sym
+            for _, next_cfn in graph.next_cfns_of.get(cfn, ())
+            if next_cfn in live_in
+            for sym in live_in[next_cfn]
+        )
+        live_out[cfn] = out
+        new_in = uses[cfn] | (out - defs[cfn])
+        if new_in == live_in[cfn]:
+            continue
+        live_in[cfn] = new_in
+        for _, prev_cfn in graph.prev_cfns_of[cfn]:
+            if prev_cfn in live_in and prev_cfn not in queued:
+                queue.append(prev_cfn)
+                queued.add(prev_cfn)
+    return live_in, live_out
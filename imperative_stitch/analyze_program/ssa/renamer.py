@@ -1,19 +1,8 @@
-import ast
-
-
-class StreamOfChildren(ast.NodeVisitor):
-    def __init__(self):
-        self.stream = []
-
-    def visit(self, node):
-        self.stream.append(node)
-        super().visit(node)
+from imperative_stitch.utils.node_index import NodeIndex
 
 
 def get_node_order(astn):
-    stream = StreamOfChildren()
-    stream.visit(astn)
-    return {node: i for i, node in enumerate(stream.stream)}
+    return NodeIndex(astn).position
 
 
 def name_vars(original_symbol_of, var_order):
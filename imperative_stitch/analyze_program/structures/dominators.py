@@ -0,0 +1,110 @@
+_UNSET = object()
+
+
+class DominatorTree:
+    """
+    The dominator tree of a graph, computed with the iterative algorithm of Cooper,
+        Harvey, and Kennedy ("A Simple, Fast Dominance Algorithm").
+
+    Only nodes reachable from the root are in the tree. Node a dominates node b if every
+        path from the root to b passes through a; every node dominates itself.
+
+    Fields:
+        root: The root of the graph.
+        idom: A mapping from each node other than the root to its immediate dominator.
+        children: A mapping from each node to its children in the tree.
+        _interval: A mapping from each node to the preorder position at which it is
+            entered and exited in a traversal of the tree, used for O(1) queries.
+    """
+
+    def __init__(self, root, successors_of):
+        """
+        Args:
+            root: The root of the graph.
+            successors_of: A function from node to an iterable of its successors.
+        """
+        self.root = root
+        order = reverse_postorder(root, successors_of)
+        position = {node: i for i, node in enumerate(order)}
+        predecessors = {node: [] for node in order}
+        for node in order:
+            for succ in successors_of(node):
+                predecessors[succ].append(node)
+        idom = {root: root}
+        changed = True
+        while changed:
+            changed = False
+            for node in order[1:]:
+                new_idom = _UNSET
+                for pred in predecessors[node]:
+                    if pred not in idom:
+                        continue
+                    if new_idom is _UNSET:
+                        new_idom = pred
+                    else:
+                        new_idom = _intersect(idom, position, pred, new_idom)
+                if idom.get(node, _UNSET) != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+        del idom[root]
+        self.idom = idom
+        self.children = {node: [] for node in order}
+        for node in order[1:]:
+            self.children[idom[node]].append(node)
+        self._interval = {}
+        counter = 0
+        stack = [(root, False)]
+        while stack:
+            node, exiting = stack.pop()
+            if exiting:
+                self._interval[node] = (self._interval[node], counter)
+                continue
+            self._interval[node] = counter
+            counter += 1
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(self.children[node]))
+
+    def __contains__(self, node):
+        return node in self._interval
+
+    def dominates(self, a, b):
+        """
+        Returns True if a dominates b. False if either is not in the tree.
+        """
+        if a not in self._interval or b not in self._interval:
+            return False
+        a_start, a_end = self._interval[a]
+        b_start, b_end = self._interval[b]
+        return a_start <= b_start and b_end <= a_end
+
+
+def _intersect(idom, position, a, b):
+    """
+    Find the nearest common dominator of a and b, given the current idom.
+    """
+    while a != b:
+        while position[a] > position[b]:
+            a = idom[a]
+        while position[b] > position[a]:
+            b = idom[b]
+    return a
+
+
+def reverse_postorder(root, successors_of):
+    """
+    Returns the nodes reachable from root, in reverse postorder of a depth first search.
+    """
+    postorder = []
+    seen = {root}
+    stack = [(root, iter(successors_of(root)))]
+    while stack:
+        node, successors = stack[-1]
+        for succ in successors:
+            if succ not in seen:
+                seen.add(succ)
+                stack.append((succ, iter(successors_of(succ))))
+                break
+        else:
+            stack.pop()
+            postorder.append(node)
+    return postorder[::-1]
@@ -1,9 +1,15 @@
 import ast
 from collections import defaultdict
 
+from python_graphs import control_flow
 from python_graphs.control_flow import BasicBlock
 from python_graphs.instruction import Instruction
 
+from imperative_stitch.utils.ast_utils import ast_nodes_in_order
+from imperative_stitch.utils.node_index import NodeIndex
+
+from .dominators import DominatorTree
+
 
 class PerFunctionCFG:
     """
@@ -13,6 +19,8 @@ class PerFunctionCFG:
         function_astn: The AST node for the function.
         entry_point: The entry point of the function (a BasicBlock).
         first_cfn: The first control flow node of the function.
+        node_index: A NodeIndex containing the function, possibly shared with
+            other functions in the same module.
         astn_order: A mapping from AST node to its preorder index in the AST
             Useful for determinism.
         prev_cfns_of: dict[cfn, set[(tag, cfn)]
@@ -21,28 +29,36 @@ class PerFunctionCFG:
         next_cfns_of: dict[cfn, set[(tag, cfn)]
             A mapping from control flow node to its successors.
             Includes exceptions.
+        dominator_tree: The dominator tree, rooted at None (the function's entry),
+            built on first use.
+        post_dominator_tree: The post-dominator tree, rooted at "<return>", built on
+            first use. Nodes that cannot reach a return are not in it.
     """
 
-    def __init__(self, entry_point: BasicBlock):
+    def __init__(self, entry_point: BasicBlock, node_index: NodeIndex = None):
         from ..ssa.banned_component import check_banned_components
-        from ..ssa.renamer import get_node_order
 
         self.entry_point = entry_point
         self.function_astn = entry_point.node
-        check_banned_components(self.function_astn)
+        if node_index is None or self.function_astn not in node_index:
+            node_index = NodeIndex(self.function_astn)
+        self.node_index = node_index
+        check_banned_components(self.function_astn, self.node_index)
         self.entry_point = entry_point
         [first_block] = entry_point.next
         if first_block.control_flow_nodes:
             self.first_cfn = first_block.control_flow_nodes[0]
         else:
             self.first_cfn = NoControlFlowNode()
-        self.astn_order = get_node_order(self.function_astn)
+        self.astn_order = self.node_index.order_within(self.function_astn)
         self.prev_cfns_of, self.next_cfns_of = compute_full_graph(self.first_cfn)
         self.astn_to_cfn = {
             astn: cfn
             for cfn in self.prev_cfns_of.keys()
-            for astn in get_node_order(cfn.instruction.node)
+            for astn in ast_nodes_in_order(cfn.instruction.node, self.node_index)
         }
+        self._dominator_tree = None
+        self._post_dominator_tree = None
 
     def refresh(self):
         """
@@ -105,6 +121,57 @@ class PerFunctionCFG:
         }
         return entry_nodes, exit_nodes, pre_exits
 
+    def successors_and_predecessors(self):
+        """
+        Returns mappings from each node to its successors and to its predecessors, including
+            the None -> first_cfn and cfn -> "<return>" edges, regardless of tag.
+        """
+        successors, predecessors = defaultdict(set), defaultdict(set)
+        for cfn, prevs in self.prev_cfns_of.items():
+            for _, prev in prevs:
+                successors[prev].add(cfn)
+                predecessors[cfn].add(prev)
+        for cfn, nexts in self.next_cfns_of.items():
+            for _, next_cfn in nexts:
+                successors[cfn].add(next_cfn)
+                predecessors[next_cfn].add(cfn)
+        return successors, predecessors
+
+    @property
+    def dominator_tree(self):
+        if self._dominator_tree is None:
+            successors, _ = self.successors_and_predecessors()
+            self._dominator_tree = DominatorTree(None, successors.__getitem__)
+        return self._dominator_tree
+
+    @property
+    def post_dominator_tree(self):
+        if self._post_dominator_tree is None:
+            _, predecessors = self.successors_and_predecessors()
+            self._post_dominator_tree = DominatorTree(
+                "<return>", predecessors.__getitem__
+            )
+        return self._post_dominator_tree
+
+    def dominates(self, a, b):
+        """
+        Returns True if every path from the entry of the function to b passes through a.
+        """
+        return self.dominator_tree.dominates(a, b)
+
+    def post_dominates(self, a, b):
+        """
+        Returns True if every path from b to a return of the function passes through a.
+        """
+        return self.post_dominator_tree.dominates(a, b)
+
+    def eventually_accessible_cfns(self, cfns):
+        """
+        Returns the control flow nodes that are eventually reachable from the given ones,
+            including themselves.
+        """
+        return eventually_accessible_cfns(self.next_cfns_of, cfns)
+
     def extraction_entry_exit(self, nodes):
         """
         Compute the entry and exit of an extraction site, along with a list of pre-exits.
@@ -137,6 +204,21 @@ class PerFunctionCFG:
         return entry, exit_node, pre_exits
 
 
+def per_function_cfg_for(function_astn, node_index=None):
+    """
+    Compute the PerFunctionCFG for the given function definition, building the control flow
+        graph of just that function rather than of the whole module containing it. This
+        gives the same graph, since a function's control flow does not depend on the code
+        around it.
+    """
+    assert isinstance(function_astn, ast.FunctionDef), function_astn
+    g = control_flow.get_control_flow_graph(
+        ast.Module(body=[function_astn], type_ignores=[])
+    )
+    [entry_point] = [x for x in g.get_enter_blocks() if x.node is function_astn]
+    return PerFunctionCFG(entry_point, node_index)
+
+
 class NoControlFlowNode:
     """
     Represents a control flow node that does not exist.
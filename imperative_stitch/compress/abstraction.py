@@ -227,10 +227,15 @@ class Abstraction:
         )
         return self.substitute_body(arguments, pragmas=pragmas)
 
-    def variables_in_order(self, node_ordering, previous_abstractions=()) -> List[str]:
+    def variables_in_order(
+        self, node_ordering, previous_abstractions=(), *, dfa=None
+    ) -> List[str]:
         """
         Return a list of all the metavariables, symbol variables, and choice variables in
             the order they appear in the body.
+
+        The body is annotated with the given dfa, which defaults to
+            export_dfa(abstrs=previous_abstractions).
         """
         result = []
         seen = set()
@@ -251,23 +256,27 @@ class Abstraction:
             for i in ordering:
                 traverse(node.children[i])
 
-        body = ns.to_type_annotated_ns_s_exp(
-            self.body, export_dfa(abstrs=previous_abstractions), self.dfa_root
-        )
+        if dfa is None:
+            dfa = export_dfa(abstrs=previous_abstractions)
+        body = ns.to_type_annotated_ns_s_exp(self.body, dfa, self.dfa_root)
         traverse(body)
         return result
 
-    def arguments_traversal_order(self, node_ordering, previous_abstractions=()):
+    def arguments_traversal_order(
+        self, node_ordering, previous_abstractions=(), *, dfa=None
+    ):
         """
         Return a list of indices that can be used to traverse the arguments in the order
-            they appear in the body.
+            they appear in the body. See variables_in_order for the meaning of dfa.
         """
         arguments = []
         arguments += [f"#{i}" for i in range(self.arity)]
         arguments += [f"%{i + 1}" for i in range(self.sym_arity)]
         arguments += [f"?{i}" for i in range(self.choice_arity)]
         arguments = {x: i for i, x in enumerate(arguments)}
-        vars_in_order = self.variables_in_order(node_ordering, previous_abstractions)
+        vars_in_order = self.variables_in_order(
+            node_ordering, previous_abstractions, dfa=dfa
+        )
         return [arguments[x] for x in vars_in_order]
 
     @property
@@ -5,13 +5,15 @@ from no_toplevel_code import unwrap_ast, wrap_code
 from imperative_stitch.analyze_program.antiunify.extract_at_multiple_sites import (
     antiunify_extractions,
 )
+from imperative_stitch.analyze_program.extract.cached_extract import do_extract_cached
+from imperative_stitch.analyze_program.extract.errors import NotApplicable
 from imperative_stitch.analyze_program.extract.extract import do_extract
 from imperative_stitch.analyze_program.extract.extract_configuration import (
     ExtractConfiguration,
 )
 from imperative_stitch.compress.abstraction import Abstraction
 from imperative_stitch.compress.manipulate_abstraction import (
-    abstraction_calls_to_bodies,
+    abstraction_calls_to_bodies_recursively,
     collect_abstraction_calls,
     replace_abstraction_calls,
 )
@@ -20,28 +22,32 @@ from imperative_stitch.parser import converter
 from imperative_stitch.utils.wrap import add_sentinel, split_by_sentinel_ast
 
 
-def add_pragmas_around_single_abstraction_call(parsed, abstr):
+def add_pragmas_around_single_abstraction_call(parsed, abstr, handle=None):
     """
-    Add pragmas around a single abstraction call, selected as
+    Add pragmas around a single abstraction call, by default selected as
     the first abstraction call in the parsed code.
 
     Args:
         parsed: PythonAST
         abstr: dict[str, Abstraction]
+        handle: the handle of the abstraction call to add pragmas around, or None
+            to use the first abstraction call
 
     Returns:
-        str, python code with pragmas added around the first abstraction call
+        str, python code with pragmas added around the abstraction call, and all
+            other abstraction calls replaced with their bodies
     """
     ac = collect_abstraction_calls(parsed)
-    key = next(iter(ac))
+    key = next(iter(ac)) if handle is None else handle
     call = ac[key]
-    ac[key] = abstr[call.tag].substitute_body(call.args, pragmas=True)
-    parsed = replace_abstraction_calls(parsed, ac)
-    parsed = abstraction_calls_to_bodies(parsed, abstr)
+    parsed = replace_abstraction_calls(
+        parsed, {key: abstr[call.tag].substitute_body(call.args, pragmas=True)}
+    )
+    parsed = abstraction_calls_to_bodies_recursively(parsed, abstr)
     return parsed.to_python()
 
 
-def convert_output(abstractions, rewritten):
+def convert_output(abstractions, rewritten, *, use_cache=False):
     """
     Convert the output of `run_julia_stitch` to actual python code
         using properly extracted python function abstractions.
@@ -49,6 +55,7 @@ def convert_output(abstractions, rewritten):
     Args:
         abstractions: list[dict]
         rewritten: list[str]
+        use_cache: bool, whether to look up extraction outcomes in the persistent cache
 
     Returns:
         (abstraction: str, extracted: list[str])
@@ -59,34 +66,81 @@ def convert_output(abstractions, rewritten):
         NotApplicable: various errors related to the semantics not allowing for extraction
     """
     [abstr_dict] = abstractions
-    abstr = dict(fn_1=Abstraction.of(name="fn_1", **abstr_dict))
+    result = convert_output_batch([abstr_dict], rewritten, use_cache=use_cache)["fn_1"]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
-    elements = {}
-    unchanged = {}
 
-    for i, code in enumerate(rewritten):
-        parsed = converter.s_exp_to_python_ast(code)
-        if not collect_abstraction_calls(parsed):
-            unchanged[i] = parsed.to_python()
-            continue
-
-        elements[i] = add_pragmas_around_single_abstraction_call(parsed, abstr)
+def convert_output_batch(abstractions, rewritten, *, use_cache=False):
+    """
+    Like `convert_output`, but for a whole library of abstractions. Each program is parsed
+        and its abstraction calls collected once. Each abstraction is then extracted from
+        the programs that call it, with all other abstraction calls replaced by their
+        bodies, so each such program is rewritten once per abstraction it calls.
 
-    if not elements:
-        raise ValueError("No abstraction calls found")
+    Args:
+        abstractions: list[dict], the abstractions, which are named fn_1, fn_2, ...
+        rewritten: list[str]
+        use_cache: bool, whether to look up extraction outcomes in the persistent cache
 
-    abstraction, extracted = run_extraction(elements)
-    extracted.update(unchanged)
-    extracted = [extracted[i] for i in range(len(rewritten))]
-    return abstraction, extracted
+    Returns:
+        dict[str, (abstraction: str, extracted: list[str]) or Exception]
+            for each abstraction name, either the result of converting the output for
+            that abstraction (as in `convert_output`) or the NotApplicable or ValueError
+            that prevented it.
+    """
+    abstr = {
+        f"fn_{i + 1}": Abstraction.of(name=f"fn_{i + 1}", **abstr_dict)
+        for i, abstr_dict in enumerate(abstractions)
+    }
+
+    parsed_each = [converter.s_exp_to_python_ast(code) for code in rewritten]
+    # for each abstraction, the handle of the first call to it in each program
+    first_call_handles = {name: {} for name in abstr}
+    for i, parsed in enumerate(parsed_each):
+        for handle, call in collect_abstraction_calls(parsed).items():
+            first_call_handles[call.tag].setdefault(i, handle)
+
+    inlined = {}
+
+    def inlined_program(i):
+        if i not in inlined:
+            inlined[i] = abstraction_calls_to_bodies_recursively(
+                parsed_each[i], abstr
+            ).to_python()
+        return inlined[i]
+
+    results = {}
+    for name in abstr:
+        try:
+            elements = {
+                i: add_pragmas_around_single_abstraction_call(
+                    parsed_each[i], abstr, handle
+                )
+                for i, handle in first_call_handles[name].items()
+            }
+            if not elements:
+                raise ValueError("No abstraction calls found")
+            abstraction, extracted = run_extraction(elements, use_cache=use_cache)
+        except (NotApplicable, ValueError) as e:
+            results[name] = e
+            continue
+        for i in range(len(rewritten)):
+            if i not in extracted:
+                extracted[i] = inlined_program(i)
+        results[name] = abstraction, [extracted[i] for i in range(len(rewritten))]
+    return results
 
 
-def run_extraction(elements):
+def run_extraction(elements, *, use_cache=False):
     """
     Run extraction on the given elements.
 
     Args:
         elements: dict[int, str]
+        use_cache: bool, whether to look up the outcome of extracting each site in the
+            persistent cache (see do_extract_cached) rather than always running it.
 
     Returns:
         (abstraction: str, extracted: dict[int, str])
@@ -97,12 +151,9 @@ def run_extraction(elements):
     all_codes = "\n".join(add_sentinel(wrap_code(elements[k])) for k in keys)
     config = ExtractConfiguration(True)
     tree, sites = parse_extract_pragma(all_codes)
-    extrs = [
-        do_extract(site, tree, config=config, extract_name="__f0") for site in sites
-    ]
-    antiunify_extractions(extrs)
-    post_extracteds = {ast.unparse(extr.func_def) for extr in extrs}
-    [abstraction] = post_extracteds
+    extract = do_extract_cached if use_cache else do_extract
+    extrs = [extract(site, tree, config=config, extract_name="__f0") for site in sites]
+    abstraction = ast.unparse(antiunify_extractions(extrs))
     rewritten = split_by_sentinel_ast(tree)
     rewritten = [unwrap_ast(x) for x in rewritten]
     rewritten = {k: ast.unparse(v) for k, v in zip(keys, rewritten)}
@@ -1,4 +1,6 @@
 import ast
+import json
+import multiprocessing
 from collections import defaultdict
 
 import numpy as np
@@ -40,3 +42,138 @@ def compute_statistics_each(errors_each):
         {k: v / len(errors_each) for k, v in causes_issue.items()}.items(),
         key=lambda x: -x[1],
     )
+
+
+def function_definitions(tree):
+    """
+    Yields the function definitions that get an entry block in the control flow graph
+        of the given tree, i.e., every FunctionDef reachable through statement bodies.
+        Lambdas are expressions and never get an entry block, and the bodies of async
+        functions are not analyzed.
+    """
+    fringe = [tree]
+    while fringe:
+        node = fringe.pop()
+        if isinstance(node, ast.FunctionDef):
+            yield node
+        if isinstance(node, ast.AsyncFunctionDef):
+            continue
+        for field in ("cases", "finalbody", "handlers", "orelse", "body"):
+            children = getattr(node, field, None)
+            if isinstance(children, list):
+                fringe.extend(reversed(children))
+
+
+def all_errors_single_pass(code):
+    """
+    Like all_errors, but without building the control flow graph: the code is parsed
+        once and the functions are found and checked on that tree directly.
+    """
+    tree = ast.parse(code)
+    errors = set()
+    for function_astn in function_definitions(tree):
+        try:
+            check_banned_components(function_astn)
+        except BannedComponentError as e:
+            errors.add(e.component_type)
+    return sorted(errors)
+
+
+class ComponentBanStatistics:
+    """
+    Running totals from which compute_statistics_each can be computed, so that a corpus
+        can be processed one file at a time and partial results merged across processes.
+
+    Fields:
+        num_files: The number of files that were analyzed.
+        num_good: The number of files without any banned components.
+        num_skipped: The number of files that could not be parsed, and were not analyzed.
+        causes_issue: A mapping from each component type to the number of files it is
+            banned in, in order of first appearance.
+    """
+
+    def __init__(self):
+        self.num_files = 0
+        self.num_good = 0
+        self.num_skipped = 0
+        self.causes_issue = defaultdict(int)
+
+    def add(self, errors):
+        """
+        Add the errors (as returned by all_errors) of a single file.
+        """
+        self.num_files += 1
+        self.num_good += not errors
+        for x in errors:
+            self.causes_issue[x] += 1
+
+    def add_code(self, code):
+        """
+        Add the given source file, skipping it if it cannot be parsed.
+        """
+        try:
+            errors = all_errors_single_pass(code)
+        except (SyntaxError, ValueError, RecursionError):
+            self.num_skipped += 1
+            return
+        self.add(errors)
+
+    def merge(self, other):
+        """
+        Add the totals of another ComponentBanStatistics to this one.
+        """
+        self.num_files += other.num_files
+        self.num_good += other.num_good
+        self.num_skipped += other.num_skipped
+        for x, count in other.causes_issue.items():
+            self.causes_issue[x] += count
+
+    def statistics(self):
+        """
+        Returns the same result as compute_statistics_each on the errors of every added file.
+        """
+        return self.num_good / self.num_files, sorted(
+            {k: v / self.num_files for k, v in self.causes_issue.items()}.items(),
+            key=lambda x: -x[1],
+        )
+
+
+def statistics_for_corpus_file(path):
+    """
+    Compute the ComponentBanStatistics of a single corpus file, a json file mapping
+        paths to source code (e.g., one of data/all_repos_contents/*.json).
+    """
+    with open(path) as f:
+        contents = json.load(f)
+    result = ComponentBanStatistics()
+    for code in contents.values():
+        result.add_code(code)
+    return result
+
+
+def scan_corpus(paths, *, parallel=True, max_workers=None):
+    """
+    Compute the ComponentBanStatistics of an entire corpus. Only one corpus file per
+        process is held in memory at a time, and results are merged as they arrive,
+        so memory use does not grow with the size of the corpus.
+
+    Args:
+        paths: An iterable of corpus files, as taken by statistics_for_corpus_file.
+        parallel: Whether to analyze the corpus files in a process pool.
+        max_workers: The maximum number of processes to use, if parallel.
+
+    Returns:
+        The merged ComponentBanStatistics. Its statistics() are the same as
+            compute_statistics_each over all_errors of each parseable file.
+    """
+    result = ComponentBanStatistics()
+    if not parallel:
+        for path in paths:
+            result.merge(statistics_for_corpus_file(path))
+        return result
+    with multiprocessing.Pool(max_workers) as pool:
+        # imap rather than imap_unordered, so that ties in the statistics are
+        # broken in the same order as a sequential scan
+        for partial in pool.imap(statistics_for_corpus_file, paths):
+            result.merge(partial)
+    return result
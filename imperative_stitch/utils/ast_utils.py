@@ -10,7 +10,15 @@ class AstNodesInOrder(ast.NodeVisitor):
         super().visit(node)
 
 
-def ast_nodes_in_order(node):
+def ast_nodes_in_order(node, node_index=None):
+    """
+    Returns the nodes in the subtree rooted at `node`, in preorder.
+
+    If a NodeIndex containing `node` is given, this is a slice of that index, so the
+        index must have been refreshed after any mutation of the subtree.
+    """
+    if node_index is not None and node in node_index:
+        return node_index.subtree(node)
     visitor = AstNodesInOrder()
     visitor.visit(node)
     return visitor.nodes
@@ -25,3 +33,80 @@ class ReplaceNodes(ast.NodeTransformer):
         if node in self.node_map:
             return self.node_map[node]
         return super().visit(node)
+
+
+def _leaf_key(value):
+    # the type is included so that, e.g., 1 and 1.0 or 0.0 and -0.0 are distinct,
+    # as they would be when unparsed
+    return type(value), repr(value)
+
+
+def structural_key(node):
+    """
+    Returns a hashable key for the given AST (or list of ASTs) that depends only on its
+        structure and not on location information. Two ASTs have the same key if and only
+        if they are structurally_equal.
+    """
+    if isinstance(node, ast.AST):
+        return (type(node),) + tuple(
+            structural_key(getattr(node, field, None)) for field in node._fields
+        )
+    if isinstance(node, list):
+        return (list,) + tuple(structural_key(x) for x in node)
+    return _leaf_key(node)
+
+
+def structural_hash(node):
+    """
+    Hash of the given AST that ignores location information.
+    """
+    return hash(structural_key(node))
+
+
+def structurally_equal(a, b):
+    """
+    Whether the two ASTs (or lists of ASTs) are the same, ignoring location information.
+    """
+    if isinstance(a, ast.AST):
+        if type(a) is not type(b):
+            return False
+        return all(
+            structurally_equal(getattr(a, field, None), getattr(b, field, None))
+            for field in a._fields
+        )
+    if isinstance(a, list):
+        if not isinstance(b, list) or len(a) != len(b):
+            return False
+        return all(structurally_equal(x, y) for x, y in zip(a, b))
+    if isinstance(b, (ast.AST, list)):
+        return False
+    return _leaf_key(a) == _leaf_key(b)
+
+
+def structural_differences(a, b, path=()):
+    """
+    Yields (path, a_subtree, b_subtree) for each maximal pair of corresponding subtrees
+        that differ between a and b, ignoring location information. The path is a tuple
+        of field names and list indices leading to the subtrees.
+    """
+    if isinstance(a, ast.AST) and type(a) is type(b):
+        for field in a._fields:
+            yield from structural_differences(
+                getattr(a, field, None), getattr(b, field, None), path + (field,)
+            )
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            yield from structural_differences(x, y, path + (i,))
+    elif not structurally_equal(a, b):
+        yield path, a, b
+
+
+def render_subtree(node):
+    """
+    Render the given AST, list of ASTs, or leaf value for diagnostics.
+    """
+    if isinstance(node, ast.AST):
+        return ast.unparse(node)
+    if isinstance(node, list):
+        return "[" + ", ".join(render_subtree(x) for x in node) + "]"
+    return repr(node)
@@ -0,0 +1,214 @@
+from collections import defaultdict
+
+import neurosym as ns
+import numpy as np
+
+from imperative_stitch.utils.def_use_mask_extension.canonicalize_de_bruijn import (
+    uncanonicalize_de_bruijn_batched,
+)
+from imperative_stitch.utils.fork_map import fork_map
+
+
+def sample_programs(
+    fam,
+    dist,
+    num_programs,
+    rng,
+    *,
+    depth_limit=float("inf"),
+    batch_size=100,
+    parallel=False,
+    max_workers=None,
+    uncanonicalize=False,
+    dfa=None,
+    abstrs=(),
+):
+    """
+    Sample num_programs programs from the distribution, as fam.sample(dist, rng) would.
+
+    The programs are sampled in batches. Within a batch, the programs are sampled in
+        lockstep: each step, every unfinished program chooses its next node, and the
+        choices that share a context are drawn together, with one vectorized lookup
+        of the weights under the stacked masks. Each program still has its own mask,
+        since the handler stacks of different programs are independent.
+
+    Args:
+        fam: The TreeProgramDistributionFamily.
+        dist: The distribution to sample from.
+        num_programs: The number of programs to sample.
+        rng: A np.random.RandomState, used to seed each batch.
+        depth_limit: The maximum depth of the programs. Programs that exceed it are
+            resampled.
+        batch_size: The number of programs sampled in lockstep in each batch.
+        parallel: Whether to sample the batches (and uncanonicalize the programs) in
+            forked processes.
+        max_workers: The maximum number of processes to use if parallel.
+        uncanonicalize: Whether to uncanonicalize the de Bruijn variables in the
+            programs. If so, dfa and abstrs are the DFA and abstractions of the DSL.
+
+    Returns:
+        A list of type-annotated s-expressions. The sampled programs do not depend on
+            parallel or max_workers.
+    """
+    tree_dist = fam.tree_distribution(dist)
+    batches = [
+        (seed, min(batch_size, num_programs - start))
+        for seed, start in zip(
+            rng.randint(2**32, size=-(-num_programs // batch_size), dtype=np.int64),
+            range(0, num_programs, batch_size),
+        )
+    ]
+    state = tree_dist, depth_limit
+    if parallel:
+        results = fork_map(_sample_batch, state, batches, max_workers=max_workers)
+    else:
+        results = [_sample_batch(state, batch) for batch in batches]
+    programs = [program for result in results for program in result]
+    if uncanonicalize:
+        assert dfa is not None, "Uncanonicalizing requires the dfa"
+        programs = uncanonicalize_de_bruijn_batched(
+            dfa, programs, abstrs, parallel=parallel, max_workers=max_workers
+        )
+    return programs
+
+
+def _sample_batch(state, batch):
+    tree_dist, depth_limit = state
+    seed, count = batch
+    rng = np.random.RandomState(seed)
+    samplers = [_ProgramSampler(tree_dist, depth_limit) for _ in range(count)]
+    active = samplers
+    # cached results of the cacheable masks, shared by all the samplers in the batch
+    mask_cache = {}
+    while active:
+        # map from context to the samplers choosing a child in it, and their positions
+        choices = defaultdict(list)
+        for sampler in active:
+            choice = sampler.next_choice()
+            if choice is not None:
+                key, position = choice
+                choices[key].append((sampler, position))
+        for key, group in choices.items():
+            possibilities, weights = tree_dist.sampling_dict_arrays[key]
+            masks = np.array(
+                [
+                    _compute_mask(
+                        sampler.mask, key, position, possibilities, mask_cache
+                    )
+                    for sampler, position in group
+                ]
+            )
+            chosen = _draw(rng, key, possibilities, weights, masks)
+            for (sampler, position), symbol in zip(group, chosen):
+                sampler.choose(position, symbol)
+        active = [sampler for sampler in active if sampler.result is None]
+    return [sampler.result for sampler in samplers]
+
+
+def _compute_mask(mask, key, position, possibilities, mask_cache):
+    """
+    Compute mask.compute_mask(position, possibilities) as a boolean array.
+
+    The results of the masks in a conjunction that can be cached (e.g., the type mask) are
+        looked up by their cache key, as in enumeration, so they are computed once per
+        distinct key across the batch rather than once per sampler.
+    """
+    if isinstance(mask, ns.ConjunctionPreorderMask):
+        masks = mask.masks
+    else:
+        masks = [mask]
+    result = np.ones(len(possibilities), dtype=bool)
+    for mask_idx, submask in enumerate(masks):
+        if submask.can_cache:
+            cache_key = mask_idx, submask.cache_key(key), key
+            if cache_key not in mask_cache:
+                mask_cache[cache_key] = np.array(
+                    submask.compute_mask(position, possibilities), dtype=bool
+                )
+            result &= mask_cache[cache_key]
+        else:
+            [valid] = np.where(result)
+            result[valid] &= np.array(
+                submask.compute_mask(position, possibilities[valid]), dtype=bool
+            )
+    return result
+
+
+def _draw(rng, key, possibilities, weights, masks):
+    """
+    Draw one of the possibilities for each row of masks, with probability proportional
+        to the weights of the possibilities that row allows.
+    """
+    masked = masks * weights
+    if not masks.any(axis=1).all():
+        raise ValueError(f"No valid productions for {key}")
+    cumulative = np.cumsum(masked, axis=1)
+    draws = rng.random_sample(len(masks)) * cumulative[:, -1]
+    indices = (cumulative <= draws[:, None]).sum(axis=1)
+    # rounding can push a draw past the end, so clamp to the last allowed possibility
+    last_allowed = masked.shape[1] - 1 - np.argmax(masked[:, ::-1] > 0, axis=1)
+    return possibilities[np.minimum(indices, last_allowed)]
+
+
+class _ProgramSampler:
+    """
+    The state of sampling a single program. The stack holds a frame for each node
+        whose children are still being sampled, of the form
+        [symbol, position in parent, ancestors, children, order, children sampled].
+    """
+
+    def __init__(self, tree_dist, depth_limit):
+        self.tree_dist = tree_dist
+        self.depth_limit = depth_limit
+        self.result = None
+        self.restart()
+
+    def restart(self):
+        self.mask = self.tree_dist.mask_constructor(self.tree_dist)
+        self.mask.on_entry(0, 0)
+        self.stack = []
+        self.push(0, None, ())
+
+    def push(self, symbol, position, ancestors):
+        arity = self.tree_dist.symbols[symbol][1]
+        order = self.tree_dist.ordering.order(symbol, arity)
+        self.stack.append([symbol, position, ancestors, [None] * arity, order, 0])
+
+    def next_choice(self):
+        """
+        Finish any nodes whose children have all been sampled, and return the context
+            and position of the next child to sample, or None if the program is done.
+        """
+        while self.result is None:
+            frame = self.stack[-1]
+            symbol, _, ancestors, _, order, num_sampled = frame
+            if num_sampled < len(order):
+                position = order[num_sampled]
+                key = (ancestors + ((symbol, position),))[-self.tree_dist.limit :]
+                return key, position
+            self.finish()
+        return None
+
+    def finish(self):
+        symbol, position, _, children, _, _ = self.stack.pop()
+        node = ns.SExpression(self.tree_dist.symbols[symbol][0], tuple(children))
+        if not self.stack:
+            [self.result] = node.children
+            return
+        self.stack[-1][3][position] = node
+        self.mask.on_exit(position, symbol)
+
+    def choose(self, position, symbol):
+        """
+        Enter the given symbol as the next child, which is at the given position.
+        """
+        frame = self.stack[-1]
+        ancestors = (frame[2] + ((frame[0], position),))[-self.tree_dist.limit :]
+        frame[5] += 1
+        self.mask.on_entry(position, symbol)
+        self.push(symbol, position, ancestors)
+        if len(self.stack) - 1 > self.depth_limit:
+            self.restart()
+        elif self.tree_dist.symbols[symbol][1] == 0:
+            # leaves have no choices to make, so finish them immediately
+            self.finish()
@@ -0,0 +1,106 @@
+import os
+import pickle
+
+import neurosym as ns
+
+from imperative_stitch.utils.fork_map import fork_imap
+
+
+def merge_counts(first, second):
+    """
+    Merge two BigramProgramCounts for the same DSL, producing the counts that would
+        have been computed for the union of the two sets of programs.
+    """
+    return ns.BigramProgramCounts(
+        numerators=_sum_nested_counts(first.numerators, second.numerators),
+        denominators=_sum_nested_counts(first.denominators, second.denominators),
+    )
+
+
+def _sum_nested_counts(first, second):
+    result = {context: dict(counts) for context, counts in first.items()}
+    for context, counts in second.items():
+        target = result.setdefault(context, {})
+        for key, count in counts.items():
+            target[key] = target.get(key, 0) + count
+    return result
+
+
+def count_programs_sharded(
+    fam,
+    data,
+    *,
+    shard_size=1000,
+    parallel=False,
+    max_workers=None,
+    checkpoint_path=None,
+):
+    """
+    Like fam.count_programs(data), but counts the programs in shards, which are then
+        merged by summation. This allows the shards to be counted in parallel, and the
+        partial counts to be saved, so that an interrupted run can be resumed.
+
+    Args:
+        fam: The BigramProgramDistributionFamily to count the programs under.
+        data: A list of lists of programs, as for fam.count_programs.
+        shard_size: The number of programs in each shard.
+        parallel: Whether to count the shards in forked processes.
+        max_workers: The maximum number of processes to use if parallel.
+        checkpoint_path: If given, the merged counts are saved here after each shard.
+            If the file already exists, the shards it covers are not recounted. It
+            must have been saved for data with the same number of programs in each
+            list, and the same shard size.
+
+    Returns:
+        A BigramProgramCountsBatch, equal to fam.count_programs(data).
+    """
+    shards = [
+        (batch_idx, start)
+        for batch_idx, programs in enumerate(data)
+        for start in range(0, len(programs), shard_size)
+    ]
+    layout = shard_size, [len(programs) for programs in data]
+    counts = [ns.BigramProgramCounts(numerators={}, denominators={}) for _ in data]
+    num_done = 0
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "rb") as f:
+            checkpoint = pickle.load(f)
+        assert (
+            checkpoint["layout"] == layout
+        ), f"Checkpoint {checkpoint_path} was saved for a different corpus layout"
+        counts, num_done = checkpoint["counts"], checkpoint["num_done"]
+
+    remaining = shards[num_done:]
+    state = fam, data, shard_size
+    if parallel:
+        # compute the skeleton once, before forking, rather than once per worker
+        fam.tree_distribution_skeleton  # pylint: disable=pointless-statement
+        results = fork_imap(_count_shard, state, remaining, max_workers=max_workers)
+    else:
+        results = (_count_shard(state, shard) for shard in remaining)
+    # iterate over the results rather than the shards, so the pool is shut down
+    for i, shard_counts in enumerate(results):
+        batch_idx, _ = remaining[i]
+        counts[batch_idx] = merge_counts(counts[batch_idx], shard_counts)
+        num_done += 1
+        if checkpoint_path is not None:
+            _save_checkpoint(
+                checkpoint_path,
+                dict(layout=layout, counts=counts, num_done=num_done),
+            )
+    return ns.BigramProgramCountsBatch(fam, counts)
+
+
+def _count_shard(state, shard):
+    fam, data, shard_size = state
+    batch_idx, start = shard
+    [counts] = fam.count_programs([data[batch_idx][start : start + shard_size]]).counts
+    return counts
+
+
+def _save_checkpoint(path, checkpoint):
+    # write to a temporary file first, so an interruption never leaves a partial file
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(checkpoint, f)
+    os.replace(temporary_path, path)
@@ -1,11 +1,57 @@
 import re
-from typing import List
+from dataclasses import dataclass
+from typing import Dict, List
 
 import neurosym as ns
 
+from imperative_stitch.utils.tree_dist_cache import cache_by_tree_distribution
+
 VARIABLE_REGEX = re.compile(r"var-.*")
 
 
+@dataclass
+class AbstractionHandlerSetup:
+    """
+    The parts of an AbstractionHandler that only depend on the abstraction symbol, the
+        tree distribution, and the dfa, so they can be shared by every handler for that
+        symbol.
+
+    Fields:
+        abstraction: The abstraction.
+        dfa: The dfa the body is annotated with. Kept so that it outlives the cache
+            entry keyed by its id.
+        traversal_order_stack: The order the arguments are traversed in, reversed.
+            Each handler pops from its own copy.
+        body: The body of the abstraction, annotated with types.
+    """
+
+    abstraction: object
+    dfa: Dict
+    traversal_order_stack: List[int]
+    body: ns.SExpression
+
+    @classmethod
+    def compute(cls, tree_dist, dfa, head_symbol, abstraction):
+        ordering = tree_dist.ordering.compute_order(
+            tree_dist.symbol_to_index[head_symbol]
+        )
+        assert ordering is not None, f"No ordering found for {head_symbol}"
+        body = ns.to_type_annotated_ns_s_exp(
+            abstraction.body, dfa, abstraction.dfa_root
+        )
+        return cls(abstraction, dfa, ordering[::-1], body)
+
+
+@cache_by_tree_distribution
+def abstraction_handler_setups(tree_dist):
+    """
+    The AbstractionHandlerSetups computed so far for the given tree distribution,
+        keyed by (head symbol, id(dfa)).
+    """
+    del tree_dist
+    return {}
+
+
 class AbstractionHandler(ns.python_def_use_mask.Handler):
     """
     Handler for an abstraction node. This effectively runs through
@@ -28,6 +74,8 @@ class AbstractionHandler(ns.python_def_use_mask.Handler):
         absorb the body of the abstraction. This is necessary because the handler
         could be something like a target handler.
 
+    The parts that do not depend on the position in the program are computed once,
+        and passed in as an AbstractionHandlerSetup.
     """
 
     def __init__(
@@ -35,26 +83,17 @@ class AbstractionHandler(ns.python_def_use_mask.Handler):
         mask,
         defined_production_idxs,
         config,
-        head_symbol,
-        abstraction,
+        setup: AbstractionHandlerSetup,
         position,
         handler_fn=ns.python_def_use_mask.default_handler,
     ):
         super().__init__(mask, defined_production_idxs, config)
-        ordering = self.mask.tree_dist.ordering.compute_order(
-            self.mask.name_to_id(head_symbol)
-        )
-        assert ordering is not None, f"No ordering found for {head_symbol}"
-        self._traversal_order_stack = ordering[::-1]
-
-        body = ns.to_type_annotated_ns_s_exp(
-            abstraction.body, config.dfa, abstraction.dfa_root
-        )
+        self._traversal_order_stack = list(setup.traversal_order_stack)
 
         self.traverser = AbstractionBodyTraverser(
             mask,
             config,
-            body,
+            setup.body,
             lambda mask_copy, sym: handler_fn(
                 position, sym, mask_copy, self.defined_production_idxs, self.config
             ),
@@ -307,13 +346,20 @@ class AbstractionHandlerPuller(ns.python_def_use_mask.HandlerPuller):
     def pull_handler(
         self, position, symbol, mask, defined_production_idxs, config, handler_fn
     ):
-        abstraction = self.abstractions["~".join(symbol.split("~")[:-1])]
+        setups = abstraction_handler_setups(mask.tree_dist)
+        key = symbol, id(config.dfa)
+        setup = setups.get(key)
+        if setup is None:
+            abstraction = self.abstractions["~".join(symbol.split("~")[:-1])]
+            setup = AbstractionHandlerSetup.compute(
+                mask.tree_dist, config.dfa, symbol, abstraction
+            )
+            setups[key] = setup
         return AbstractionHandler(
             mask,
             defined_production_idxs,
             config,
-            symbol,
-            abstraction,
+            setup,
             position,
             handler_fn,
         )
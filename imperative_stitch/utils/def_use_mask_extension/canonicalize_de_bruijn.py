@@ -5,6 +5,7 @@ from dataclasses import dataclass
 from typing import List
 
 import neurosym as ns
+import numpy as np
 
 from imperative_stitch.compress.manipulate_abstraction import (
     abstraction_calls_to_bodies,
@@ -15,6 +16,8 @@ from imperative_stitch.utils.def_use_mask_extension.ordering import (
     PythonWithAbstractionsNodeOrdering,
 )
 from imperative_stitch.utils.dsl_with_abstraction import add_abstractions
+from imperative_stitch.utils.fork_map import fork_map
+from imperative_stitch.utils.tree_dist_cache import cache_by_tree_distribution
 from imperative_stitch.utils.types import SEPARATOR, get_dfa_state
 
 dbv_type = "DBV"
@@ -90,6 +93,140 @@ def get_idx(s_exp_de_bruijn):
     return int(after)
 
 
+class DeBruijnCanonicalizer:
+    """
+    Converts programs to their de bruijn representation, keeping the DSL subset and the
+        tree distribution skeletons between calls, so that a stream of programs can be
+        canonicalized without rebuilding them every time. The subset grows when a program
+        with unseen symbols is canonicalized, and only then are the skeletons rebuilt.
+        Rebuilding costs about as much as canonicalizing a batch from scratch, so when
+        the programs come from a known DSL (e.g., they were sampled from it), add the
+        programs it was fit on with add_programs first.
+
+    Fields:
+        dfa: The DFA of the DSL.
+        abstrs: The abstractions that may appear in the programs.
+        max_explicit_dbvar_index: The largest de bruijn index that gets its own symbol.
+        subset: The PythonDSLSubset of every program seen so far and the abstraction bodies.
+        abstr_s_exps: The type-annotated s-expressions of the abstraction bodies.
+    """
+
+    def __init__(self, dfa, abstrs, max_explicit_dbvar_index):
+        check_have_all_abstrs(dfa, abstrs)
+        self.dfa = dfa
+        self.abstrs = abstrs
+        self.max_explicit_dbvar_index = max_explicit_dbvar_index
+        self.subset = ns.PythonDSLSubset()
+        self.abstr_s_exps = add_abstractions(self.subset, dfa, *abstrs)
+        self._subset_size = subset_size(self.subset)
+        self._skeletons = {}
+
+    def tree_distribution_skeleton(self, root):
+        """
+        Get the tree distribution skeleton for the given root state over the current
+            subset, building it if it is not cached.
+        """
+        if root not in self._skeletons:
+            dsl = ns.create_python_dsl(self.dfa, self.subset, root)
+            self._skeletons[root] = ns.BigramProgramDistributionFamily(
+                dsl,
+                additional_preorder_masks=[
+                    lambda dist, dsl: def_use_mask(
+                        dist, dsl, dfa=self.dfa, abstrs=self.abstrs
+                    )
+                ],
+                include_type_preorder_mask=False,
+                node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(
+                    dist, self.abstrs
+                ),
+            ).tree_distribution_skeleton
+        return self._skeletons[root]
+
+    def add_programs(self, programs, root_states):
+        """
+        Add the programs to the subset, invalidating the skeletons if it grew.
+
+        Returns:
+            The type-annotated s-expressions of the programs.
+        """
+        s_exps = self.subset.add_programs(self.dfa, *programs, root=list(root_states))
+        size = subset_size(self.subset)
+        if size != self._subset_size:
+            self._subset_size = size
+            self._skeletons = {}
+        return s_exps
+
+    def canonicalize_batched(
+        self,
+        programs,
+        root_states,
+        include_abstr_exprs=False,
+        *,
+        parallel=False,
+        max_workers=None,
+    ):
+        """
+        Convert the programs to a de bruijn representation.
+
+        Args:
+            programs: The programs to convert.
+            root_states: The root state of each program.
+            include_abstr_exprs: Whether to also return the converted abstraction
+                bodies, after the programs.
+            parallel: Whether to convert the programs in a pool of forked processes.
+                The results are the same, and in the same order.
+            max_workers: The maximum number of processes to use, if parallel.
+        """
+        s_exps = self.add_programs(programs, root_states)
+        root_states = list(root_states)
+        if include_abstr_exprs:
+            s_exps += self.abstr_s_exps
+            root_states += [abstr.dfa_root for abstr in self.abstrs]
+        # build every skeleton up front, so that forked workers inherit them
+        tree_dists = {
+            root: self.tree_distribution_skeleton(root)
+            for root in sorted(set(root_states))
+        }
+        if not parallel:
+            return [
+                canonicalize_de_bruijn_from_tree_dist(
+                    tree_dists[root], s_exp, self.max_explicit_dbvar_index
+                )
+                for s_exp, root in zip(s_exps, root_states)
+            ]
+        return fork_map(
+            _canonicalize_worker,
+            (tree_dists, s_exps, root_states, self.max_explicit_dbvar_index),
+            range(len(s_exps)),
+            max_workers=max_workers,
+            chunksize=max(1, len(s_exps) // 64),
+        )
+
+    def canonicalize(self, program, root_state):
+        """
+        Like canonicalize_batched, but for a single program.
+        """
+        [result] = self.canonicalize_batched([program], [root_state])
+        return result
+
+
+def _canonicalize_worker(state, i):
+    tree_dists, s_exps, root_states, max_explicit_dbvar_index = state
+    return canonicalize_de_bruijn_from_tree_dist(
+        tree_dists[root_states[i]], s_exps[i], max_explicit_dbvar_index
+    )
+
+
+def subset_size(subset):
+    """
+    The number of sequence lengths and leaves in the given subset. Since a subset
+        only ever grows, this changes exactly when the subset does.
+    """
+    return sum(len(v) for v in subset.lengths_by_sequence_type.values()) + sum(
+        len(v) for v in subset.leaves.values()
+    )
+
+
 def canonicalize_de_bruijn_batched(
     programs,
     root_states,
@@ -97,41 +234,27 @@ def canonicalize_de_bruijn_batched(
     abstrs,
     max_explicit_dbvar_index,
     include_abstr_exprs=False,
+    *,
+    parallel=False,
+    max_workers=None,
 ):
     """
     Convert the programs to a de bruijn representation. Creates a tree distribution
-        and then calls the canonicalize_de_bruijn_from_tree_dist function.
-    """
-
-    check_have_all_abstrs(dfa, abstrs)
+        and then calls the canonicalize_de_bruijn_from_tree_dist function, optionally
+        in a pool of forked processes (see DeBruijnCanonicalizer.canonicalize_batched).
 
-    subset = ns.PythonDSLSubset()
-    s_exps = subset.add_programs(dfa, *programs, root=root_states)
-    abstr_s_exps = add_abstractions(subset, dfa, *abstrs)
-    if include_abstr_exprs:
-        s_exps += abstr_s_exps
-        root_states = list(root_states) + [abstr.dfa_root for abstr in abstrs]
-
-    dsl_by_root = {
-        root: ns.create_python_dsl(dfa, subset, root) for root in set(root_states)
-    }
-    fam = {
-        root: ns.BigramProgramDistributionFamily(
-            dsl,
-            additional_preorder_masks=[
-                lambda dist, dsl: def_use_mask(dist, dsl, dfa=dfa, abstrs=abstrs)
-            ],
-            include_type_preorder_mask=False,
-            node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(dist, abstrs),
-        ).tree_distribution_skeleton
-        for root, dsl in dsl_by_root.items()
-    }
-    return [
-        canonicalize_de_bruijn_from_tree_dist(
-            fam[root], s_exp, max_explicit_dbvar_index
-        )
-        for s_exp, root in zip(s_exps, root_states)
-    ]
+    To canonicalize many batches with the same DFA and abstractions, use a
+        DeBruijnCanonicalizer instead, which does not rebuild the tree distribution.
+    """
+    return DeBruijnCanonicalizer(
+        dfa, abstrs, max_explicit_dbvar_index
+    ).canonicalize_batched(
+        programs,
+        root_states,
+        include_abstr_exprs,
+        parallel=parallel,
+        max_workers=max_workers,
+    )
 
 
 def canonicalize_de_bruijn(program, root_state, dfa, abstrs, max_explicit_dbvar_index):
@@ -200,11 +323,36 @@ def uncanonicalize_de_bruijn(dfa, s_exp_de_bruijn, abstrs):
     Uncanonicalize the de bruijn representation, replacing variables
         with names __0, __1, etc.
     """
-    if isinstance(s_exp_de_bruijn, str):
-        s_exp_de_bruijn = ns.parse_s_expression(s_exp_de_bruijn)
-    else:
-        assert isinstance(s_exp_de_bruijn, ns.SExpression)
-        s_exp_de_bruijn = copy.deepcopy(s_exp_de_bruijn)
+    [result] = uncanonicalize_de_bruijn_batched(dfa, [s_exp_de_bruijn], abstrs)
+    return result
+
+
+def uncanonicalize_de_bruijn_batched(
+    dfa, s_exps_de_bruijn, abstrs, *, parallel=False, max_workers=None
+):
+    """
+    Like uncanonicalize_de_bruijn, but for many programs. The abstraction bodies are
+        inlined once, and a single DSL is built over all the programs and abstraction
+        bodies, with one tree distribution skeleton per root state.
+
+    Args:
+        dfa: The DFA of the DSL.
+        s_exps_de_bruijn: The programs to uncanonicalize, as s-expressions or strings.
+        abstrs: The abstractions that may appear in the programs.
+        parallel: Whether to uncanonicalize the programs in a pool of forked processes.
+        max_workers: The maximum number of processes to use, if parallel.
+
+    Returns:
+        The uncanonicalized programs, in the same order.
+    """
+    s_exps = []
+    for s_exp_de_bruijn in s_exps_de_bruijn:
+        if isinstance(s_exp_de_bruijn, str):
+            s_exp_de_bruijn = ns.parse_s_expression(s_exp_de_bruijn)
+        else:
+            assert isinstance(s_exp_de_bruijn, ns.SExpression)
+            s_exp_de_bruijn = copy.deepcopy(s_exp_de_bruijn)
+        s_exps.append(s_exp_de_bruijn)
 
     abstrs_dict = {abstr.name: abstr for abstr in abstrs}
     abstr_bodies = [
@@ -213,11 +361,40 @@ def uncanonicalize_de_bruijn(dfa, s_exp_de_bruijn, abstrs):
         )
         for abstr in abstrs
     ]
+    subset = ns.PythonDSLSubset.from_s_exps(s_exps + abstr_bodies)
+    roots = [get_dfa_state(s_exp.symbol) for s_exp in s_exps]
+    tree_dists = {
+        root: uncanonicalization_tree_distribution_skeleton(dfa, subset, root, abstrs)
+        for root in sorted(set(roots))
+    }
+    if not parallel:
+        return [
+            uncanonicalize_de_bruijn_from_tree_dist(tree_dists[root], s_exp)
+            for s_exp, root in zip(s_exps, roots)
+        ]
+    return fork_map(
+        _uncanonicalize_worker,
+        (tree_dists, s_exps, roots),
+        range(len(s_exps)),
+        max_workers=max_workers,
+        chunksize=max(1, len(s_exps) // 64),
+    )
 
+
+def _uncanonicalize_worker(state, i):
+    tree_dists, s_exps, roots = state
+    return uncanonicalize_de_bruijn_from_tree_dist(tree_dists[roots[i]], s_exps[i])
+
+
+def uncanonicalization_tree_distribution_skeleton(dfa, subset, root, abstrs):
+    """
+    Create the tree distribution skeleton used to uncanonicalize programs with the
+        given root state, whose symbols are all in the given subset.
+    """
     dsl = ns.create_python_dsl(
         dfa,
-        ns.PythonDSLSubset.from_s_exps([s_exp_de_bruijn] + abstr_bodies),
-        get_dfa_state(s_exp_de_bruijn.symbol),
+        subset,
+        root,
         add_additional_productions=add_dbvar_additional_productions,
     )
     fam = ns.BigramProgramDistributionFamily(
@@ -228,8 +405,13 @@ def uncanonicalize_de_bruijn(dfa, s_exp_de_bruijn, abstrs):
         include_type_preorder_mask=False,
         node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(dist, abstrs),
     )
-    tree_dist = fam.tree_distribution_skeleton
+    return fam.tree_distribution_skeleton
+
 
+def uncanonicalize_de_bruijn_from_tree_dist(tree_dist, s_exp_de_bruijn):
+    """
+    Uncanonicalize the de bruijn representation, given the tree distribution.
+    """
     count_vars = 0
 
     def replace_de_bruijn(node, mask, typ):
@@ -308,11 +490,102 @@ class DeBruijnMaskState:
         )
 
 
+class DeBruijnSymbolTable:
+    """
+    Tables over the symbols of a tree distribution, used by the de bruijn handlers so
+        that computing a mask is an indexing operation rather than a pass over the symbols.
+
+    Fields:
+        dbvar_index: For each symbol, the index of the dbvar it is, or -1 if it is not
+            an explicit dbvar.
+        is_successor: For each symbol, whether it is the dbvar successor.
+        is_wrapper: For each symbol, whether it is a dbvar wrapper.
+        max_explicit_dbvar_index: The de bruijn limit of the tree distribution.
+    """
+
+    def __init__(self, tree_dist: ns.TreeDistribution):
+        self.dbvar_index = np.full(len(tree_dist.symbols), -1)
+        self.is_successor = np.zeros(len(tree_dist.symbols), dtype=bool)
+        self.is_wrapper = [
+            is_dbvar_wrapper_symbol(symbol) for symbol, _ in tree_dist.symbols
+        ]
+        for i, (symbol, _) in enumerate(tree_dist.symbols):
+            mat = dbvar_symbol_regex.match(symbol)
+            if not mat:
+                continue
+            if mat.group("which") == "successor":
+                self.is_successor[i] = True
+            else:
+                self.dbvar_index[i] = int(mat.group("which"))
+        self.max_explicit_dbvar_index = compute_de_bruijn_limit(tree_dist)
+        # masks over all symbols, keyed by the handler kind and the parts of the state
+        # that affect them
+        self._masks = {}
+
+    def wrapper_mask(self, state: DeBruijnMaskState) -> np.ndarray:
+        """
+        The symbols that can be the child of a dbvar wrapper in the given state. We are
+            not inside a successor, so we count upwards from the first usable index,
+            using a successor once we pass the limit.
+        """
+        limit = state.max_explicit_dbvar_index
+        # every count past the limit has the same mask
+        num_available = min(state.num_available_symbols, limit + 1)
+        key = "wrapper", state.is_defn, num_available, limit
+        mask = self._masks.get(key)
+        if mask is None:
+            start_at = 0 if state.is_defn else 1
+            mask = (self.dbvar_index >= start_at) & (
+                self.dbvar_index <= min(num_available, limit)
+            )
+            if num_available > limit:
+                mask |= self.is_successor
+            mask.flags.writeable = False
+            self._masks[key] = mask
+        return mask
+
+    def successor_mask(self, state: DeBruijnMaskState) -> np.ndarray:
+        """
+        The symbols that can be the child of a dbvar successor in the given state. We
+            are inside a successor, so the de bruijn limit is valid, as is another
+            successor if there are enough symbols left.
+        """
+        limit = state.max_explicit_dbvar_index
+        has_successor = state.num_available_symbols > limit
+        key = "successor", has_successor, limit
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self.dbvar_index == limit
+            if has_successor:
+                mask |= self.is_successor
+            mask.flags.writeable = False
+            self._masks[key] = mask
+        return mask
+
+
+@cache_by_tree_distribution
+def de_bruijn_symbol_table(tree_dist: ns.TreeDistribution) -> DeBruijnSymbolTable:
+    """
+    Get the DeBruijnSymbolTable for the given tree distribution, computing it the first
+        time it is needed.
+    """
+    return DeBruijnSymbolTable(tree_dist)
+
+
 class DeBruijnHandler(ns.python_def_use_mask.Handler):
-    def __init__(self, mask, defined_production_idxs, config, state, dbvar_components):
+    def __init__(
+        self,
+        mask,
+        defined_production_idxs,
+        config,
+        state,
+        dbvar_components,
+        symbol_table,
+    ):
         super().__init__(mask, defined_production_idxs, config)
         self.state = state
         self.dbvar_components = dbvar_components
+        self.symbol_table = symbol_table
 
     def is_defining(self, position: int) -> bool:
         raise NotImplementedError
@@ -330,27 +603,24 @@ class DeBruijnHandler(ns.python_def_use_mask.Handler):
         Compute the mask for the given symbols.
         """
         del position, idx_to_name, special_case_predicates
-        mask = self.compute_dict_mask()
-        mask = [mask.get(self.mask.tree_dist.symbols[sym][0], False) for sym in symbols]
-        return mask
+        return self.compute_symbol_mask()[symbols]
 
     @abstractmethod
-    def compute_dict_mask(self):
-        pass
+    def compute_symbol_mask(self) -> np.ndarray:
+        """
+        Compute the mask over all the symbols of the tree distribution.
+        """
 
     def on_child_enter(
         self, position: int, symbol: int
     ) -> ns.python_def_use_mask.Handler:
         state = self.state
-        if self.mask.tree_dist.symbols[symbol][0] == dbvar_successor_symbol:
+        if self.symbol_table.is_successor[symbol]:
             state = state.one_less_symbol()
             self.dbvar_components.append(1)
             typ = DeBruijnVarSuccessorHandler
         else:
-            index = int(
-                self.mask.tree_dist.symbols[symbol][0].split("-")[-1].split("~")[0]
-            )
-            self.dbvar_components.append(index)
+            self.dbvar_components.append(int(self.symbol_table.dbvar_index[symbol]))
             typ = DeBruijnVarHandler
 
         handler = typ(
@@ -359,12 +629,13 @@ class DeBruijnHandler(ns.python_def_use_mask.Handler):
             self.config,
             state,
             self.dbvar_components,
+            self.symbol_table,
         )
         return handler, self.dbvar_components.pop
 
 
 class DeBruijnVarHandler(DeBruijnHandler):
-    def compute_dict_mask(self):
+    def compute_symbol_mask(self):
         raise NotImplementedError
 
     def on_child_exit(
@@ -374,13 +645,8 @@ class DeBruijnVarHandler(DeBruijnHandler):
 
 
 class DeBruijnVarSuccessorHandler(DeBruijnHandler):
-    def compute_dict_mask(self):
-        mask = {}
-        # We are inside a successor, so the de bruijn limit is valid, as is successor
-        mask[dbvar_symbol(self.state.max_explicit_dbvar_index)] = True
-        if self.state.num_available_symbols > self.state.max_explicit_dbvar_index:
-            mask[dbvar_successor_symbol] = True
-        return mask
+    def compute_symbol_mask(self):
+        return self.symbol_table.successor_mask(self.state)
 
     def on_child_exit(
         self, position: int, symbol: int, child: ns.python_def_use_mask.Handler
@@ -394,7 +660,7 @@ class DBVarWrapperHandler(DeBruijnHandler, ns.python_def_use_mask.TargetHandler)
         mask,
         defined_production_idxs,
         config,
-        max_explicit_dbvar_index: int,
+        symbol_table: DeBruijnSymbolTable,
         num_available_symbols: int,
         is_defn: bool,
     ):
@@ -406,21 +672,16 @@ class DBVarWrapperHandler(DeBruijnHandler, ns.python_def_use_mask.TargetHandler)
             mask,
             defined_production_idxs,
             config,
-            DeBruijnMaskState(max_explicit_dbvar_index, is_defn, num_available_symbols),
+            DeBruijnMaskState(
+                symbol_table.max_explicit_dbvar_index, is_defn, num_available_symbols
+            ),
             [],
+            symbol_table,
         )
         self.num_available_symbols = num_available_symbols
 
-    def compute_dict_mask(self):
-        mask = {}
-        # We are not inside a successor, so we need to iterate upwards
-        start_at = 0 if self.state.is_defn else 1
-        for i in range(start_at, self.state.num_available_symbols + 1):
-            if i > self.state.max_explicit_dbvar_index:
-                mask[dbvar_successor_symbol] = True
-                break
-            mask[dbvar_symbol(i)] = True
-        return mask
+    def compute_symbol_mask(self):
+        return self.symbol_table.wrapper_mask(self.state)
 
     def on_child_exit(
         self, position: int, symbol: int, child: ns.python_def_use_mask.Handler
@@ -434,7 +695,15 @@ class DBVarWrapperHandler(DeBruijnHandler, ns.python_def_use_mask.TargetHandler)
         return lambda: None
 
 
-def dsl_subset_from_dbprograms(*programs, roots, dfa, abstrs, max_explicit_dbvar_index):
+def dsl_subset_from_dbprograms(
+    *programs,
+    roots,
+    dfa,
+    abstrs,
+    max_explicit_dbvar_index,
+    parallel=False,
+    max_workers=None,
+):
     assert len(programs) == len(roots), "The number of programs and roots must match."
 
     programs_all = canonicalize_de_bruijn_batched(
@@ -444,6 +713,8 @@ def dsl_subset_from_dbprograms(*programs, roots, dfa, abstrs, max_explicit_dbvar
         abstrs,
         max_explicit_dbvar_index,
         include_abstr_exprs=True,
+        parallel=parallel,
+        max_workers=max_workers,
     )
     subset = ns.PythonDSLSubset.from_s_exps(programs_all)
     return programs_all[: len(programs)], subset
@@ -462,9 +733,7 @@ class DBVarSymbolPredicate(ns.python_def_use_mask.SpecialCaseSymbolPredicate):
 
     def __init__(self, tree_dist: ns.TreeDistribution):
         super().__init__(tree_dist)
-        self.dbvars = [
-            is_dbvar_wrapper_symbol(symbol) for symbol, _ in tree_dist.symbols
-        ]
+        self.dbvars = de_bruijn_symbol_table(tree_dist).is_wrapper
 
     def applies(self, symbol: int) -> bool:
         return self.dbvars[symbol]
@@ -484,7 +753,7 @@ class DBVarHandlerPuller(ns.python_def_use_mask.HandlerPuller):
             mask,
             defined_production_idxs,
             config,
-            compute_de_bruijn_limit(mask.tree_dist),
+            de_bruijn_symbol_table(mask.tree_dist),
             len(mask.currently_defined_indices()),
             mask.handlers[-1].is_defining(position),
         )
@@ -1,18 +1,134 @@
 from typing import Tuple
 
+import neurosym as ns
+
 from imperative_stitch.compress.abstraction import Abstraction
 from imperative_stitch.compress.manipulate_abstraction import (
     abstraction_calls_to_bodies,
 )
+from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
 
 
-def add_abstractions(subset, dfa, *abstrs: Tuple[Abstraction, ...]):
+def add_abstractions(
+    subset,
+    dfa,
+    *abstrs: Tuple[Abstraction, ...],
+    previous_abstractions: Tuple[Abstraction, ...] = ()
+):
     """
-    Add the bodies of the abstractions to the subset.
+    Add the bodies of the abstractions to the subset. Calls to the previous abstractions
+        in the bodies are expanded, but the previous abstractions' own bodies are not
+        added, as they are assumed to already be in the subset.
     """
-    abstrs_dict = {a.name: a for a in abstrs}
+    abstrs_dict = {a.name: a for a in (*previous_abstractions, *abstrs)}
     return subset.add_programs(
         dfa,
         *[abstraction_calls_to_bodies(a.body, abstrs_dict) for a in abstrs],
-        root=[a.dfa_root for a in abstrs]
+        root=[a.dfa_root for a in abstrs],
     )
+
+
+class IncrementalPythonDSL:
+    """
+    A python DSL for a corpus and a library of abstractions that both grow over time,
+        e.g., across compression iterations.
+
+    The dfa, the subset, and the node ordering dictionary are extended in place as
+        abstractions and programs are added, rather than recomputed from scratch. The
+        DSL itself is immutable once created, so it is recreated from these when it is
+        next needed, which is cheap in comparison.
+
+    Fields:
+        root: The root state of the DSL.
+        abstrs: The abstractions added so far, in order.
+        dfa: The dfa, equal to export_dfa(abstrs=abstrs).
+        subset: The subset of the DSL used by the programs and abstraction bodies.
+        ordering: The node ordering dictionary, equal to
+            python_node_ordering_with_abstractions(abstrs).
+    """
+
+    def __init__(self, root="M", add_additional_productions=lambda dslf: None):
+        self.root = root
+        self.add_additional_productions = add_additional_productions
+        self.abstrs = []
+        self.dfa = export_dfa()
+        self.subset = ns.PythonDSLSubset()
+        self.ordering = ns.python_def_use_mask.python_ordering_dictionary()
+        self._dsl = None
+
+    def add_abstractions(self, *abstrs):
+        """
+        Add the abstractions to the library. Their bodies can use the abstractions
+            already in the library, or the ones before them in abstrs.
+
+        Returns:
+            The type-annotated bodies of the abstractions.
+        """
+        for abstr in abstrs:
+            assert abstr.name not in self.dfa[abstr.dfa_root], abstr.name
+            # the ordering of an abstraction is computed with the abstractions before it
+            ann_name = abstr.name + "~" + ns.python_ast_tools.clean_type(abstr.dfa_root)
+            self.ordering[ann_name] = abstr.arguments_traversal_order(
+                self.ordering, dfa=self.dfa
+            )
+            self.dfa[abstr.dfa_root][abstr.name] = (
+                abstr.dfa_metavars + abstr.dfa_symvars + abstr.dfa_choicevars
+            )
+        bodies = add_abstractions(
+            self.subset, self.dfa, *abstrs, previous_abstractions=self.abstrs
+        )
+        self.abstrs += abstrs
+        self._dsl = None
+        return bodies
+
+    def add_programs(self, *programs, root=None):
+        """
+        Add the programs to the corpus. They can use any abstraction in the library.
+
+        Returns:
+            The type-annotated programs.
+        """
+        s_exps = self.subset.add_programs(
+            self.dfa, *programs, root=self.root if root is None else root
+        )
+        self._dsl = None
+        return s_exps
+
+    @property
+    def dsl(self):
+        if self._dsl is None:
+            self._dsl = ns.create_python_dsl(
+                self.dfa,
+                self.subset,
+                self.root,
+                add_additional_productions=self.add_additional_productions,
+            )
+        return self._dsl
+
+    def node_ordering(self, dist):
+        """
+        The node ordering for a distribution over this DSL. Equivalent to
+            PythonWithAbstractionsNodeOrdering(dist, abstrs).
+        """
+        return ns.DictionaryNodeOrdering(dist, self.ordering, tolerate_missing=True)
+
+    def family(self, **kwargs):
+        """
+        Create a BigramProgramDistributionFamily over the current DSL, with the def-use
+            mask and node ordering for the current library.
+
+        Args:
+            **kwargs: Passed to BigramProgramDistributionFamily.
+        """
+        # the dfa is only ever extended, so it can be shared, but the masks should not
+        # see abstractions added after this family is created
+        dfa, abstrs = self.dfa, list(self.abstrs)
+        return ns.BigramProgramDistributionFamily(
+            self.dsl,
+            additional_preorder_masks=[
+                lambda dist, dsl: def_use_mask(dist, dsl, dfa=dfa, abstrs=abstrs)
+            ],
+            node_ordering=self.node_ordering,
+            **kwargs,
+        )
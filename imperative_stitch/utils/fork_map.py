@@ -0,0 +1,51 @@
+import multiprocessing
+
+# The (function, state) pair of the fork_map currently running, if any. Worker
+# processes inherit it when they are forked, so it is never pickled.
+_forked = None
+
+
+def fork_map(fn, state, items, *, max_workers=None, chunksize=1):
+    """
+    Compute [fn(state, item) for item in items] in a pool of forked processes.
+
+    The state is inherited by the workers when they are forked rather than sent to them,
+        so it is transferred once, and can contain objects that cannot be pickled
+        (e.g., tree distributions, whose masks are closures). The items and results
+        must be picklable.
+
+    Args:
+        fn: A function of (state, item).
+        state: The state shared by every call.
+        items: An iterable of items, consumed as the workers need them.
+        max_workers: The maximum number of processes to use.
+        chunksize: The number of items sent to a worker at a time.
+
+    Returns:
+        The list of results, in the order of the items.
+    """
+    return list(
+        fork_imap(fn, state, items, max_workers=max_workers, chunksize=chunksize)
+    )
+
+
+def fork_imap(fn, state, items, *, max_workers=None, chunksize=1):
+    """
+    Like fork_map, but yields the results in order as they become available, so the
+        caller can act on each one (e.g., save progress) before the rest are done.
+
+    The pool is shut down when the generator is exhausted or closed.
+    """
+    global _forked  # pylint: disable=global-statement
+    assert _forked is None, "fork_map is not reentrant"
+    _forked = fn, state
+    try:
+        with multiprocessing.get_context("fork").Pool(max_workers) as pool:
+            yield from pool.imap(_call_forked, items, chunksize=chunksize)
+    finally:
+        _forked = None
+
+
+def _call_forked(item):
+    fn, state = _forked
+    return fn(state, item)
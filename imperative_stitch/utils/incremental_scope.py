@@ -0,0 +1,68 @@
+import ast
+
+import ast_scope
+from ast_scope.annotate import ScopeInfo
+from ast_scope.scope import ScopeWithParent
+
+
+def top_level_statement(node_index, node):
+    """
+    Returns the statement in the body of the indexed module that contains the given node.
+    """
+    assert isinstance(node_index.root, ast.Module), node_index.root
+    while node_index.depth(node) > 1:
+        node = node_index.parent(node)
+    return node
+
+
+def reannotate_statement(scope_info, tree, statement, stale_nodes):
+    """
+    Update the scope information of a module after one of its top-level statements has
+        been mutated in place, by annotating only that statement.
+
+    This produces the same result as ast_scope.annotate(tree), since the scope of each node
+        in a top-level statement does not depend on the other top-level statements, and
+        ast_scope annotates each top-level statement as a contiguous block. The global and
+        error scopes of the original scope_info are reused, so identity checks against
+        them still work.
+
+    Args:
+        scope_info: The scope information for the tree before the mutation.
+        tree: The module, after the mutation.
+        statement: The top-level statement that was mutated.
+        stale_nodes: All the nodes in the statement before the mutation.
+
+    Returns:
+        The updated scope information. The original scope_info is not modified.
+    """
+    assert any(x is statement for x in tree.body), "not a top-level statement"
+    new_info = ast_scope.annotate(ast.Module(body=[statement], type_ignores=[]))
+    # pylint: disable=protected-access
+    replacements = {
+        id(new_info.global_scope): scope_info.global_scope,
+        id(new_info._error_scope): scope_info._error_scope,
+    }
+    new_entries = {}
+    for node in new_info:
+        scope = new_info[node]
+        scope = replacements.get(id(scope), scope)
+        if isinstance(scope, ScopeWithParent):
+            scope.parent = replacements.get(id(scope.parent), scope.parent)
+        new_entries[node] = scope
+
+    stale_nodes = set(stale_nodes)
+    node_to_scope = {}
+    inserted = False
+    for node in scope_info:
+        if node in stale_nodes:
+            if not inserted:
+                node_to_scope.update(new_entries)
+                inserted = True
+            continue
+        node_to_scope[node] = scope_info[node]
+    if not inserted:
+        # nothing in the statement was annotated, so we don't know where its block goes
+        return ast_scope.annotate(tree)
+    return ScopeInfo(
+        tree, scope_info.global_scope, scope_info._error_scope, node_to_scope
+    )
@@ -0,0 +1,93 @@
+import itertools
+
+import neurosym as ns
+import numpy as np
+
+from imperative_stitch.utils.fork_map import fork_map
+
+
+def score_programs(
+    fam,
+    dist,
+    programs,
+    *,
+    dfa=None,
+    root="M",
+    parallel=False,
+    max_workers=None,
+    chunk_size=100,
+):
+    """
+    Compute fam.compute_likelihood(dist, program) for each of the programs.
+
+    The tree distribution is computed once for all the programs, before any chunks are
+        forked, and the programs are annotated and scored in chunks, which can run in
+        parallel.
+
+    Args:
+        fam: The TreeProgramDistributionFamily.
+        dist: The distribution to score the programs under.
+        programs: The programs, as type-annotated s-expressions, or as PythonASTs if
+            dfa is given.
+        dfa: If given, the dfa to annotate the programs with.
+        root: The root state to annotate the programs with, or a list of root states,
+            one per program.
+        parallel: Whether to annotate and score the chunks in forked processes.
+        max_workers: The maximum number of processes to use if parallel.
+        chunk_size: The number of programs in each chunk.
+
+    Returns:
+        A numpy array of log-likelihoods, one per program.
+    """
+    programs = list(programs)
+    roots = [root] * len(programs) if isinstance(root, str) else list(root)
+    assert len(roots) == len(programs), "The number of programs and roots must match."
+    # cached on dist, so every chunk reuses it
+    fam.tree_distribution(dist)
+    state = fam, dist, dfa, programs, roots
+    chunks = [
+        (start, min(start + chunk_size, len(programs)))
+        for start in range(0, len(programs), chunk_size)
+    ]
+    if parallel:
+        results = fork_map(_score_chunk, state, chunks, max_workers=max_workers)
+    else:
+        results = [_score_chunk(state, chunk) for chunk in chunks]
+    return np.concatenate([np.zeros(0), *results])
+
+
+def score_programs_per_node(fam, dist, programs, *, dfa=None, root="M"):
+    """
+    Like fam.compute_likelihood_per_node(dist, program) for each of the programs, but
+        the results are streamed, so that an entire corpus can be evaluated without
+        holding every program or result in memory at once.
+
+    Args:
+        fam, dist, dfa: As in score_programs.
+        programs: An iterable of programs, as in score_programs. It is consumed
+            lazily.
+        root: The root state to annotate the programs with, or an iterable of root
+            states, one per program.
+
+    Yields:
+        (program index, node, log-likelihood of the node) tuples, in preorder within
+            each program.
+    """
+    roots = itertools.repeat(root) if isinstance(root, str) else root
+    for program_idx, (program, program_root) in enumerate(zip(programs, roots)):
+        if dfa is not None:
+            program = ns.to_type_annotated_ns_s_exp(program, dfa, program_root)
+        for node, likelihood in fam.compute_likelihood_per_node(dist, program):
+            yield program_idx, node, likelihood
+
+
+def _score_chunk(state, chunk):
+    fam, dist, dfa, programs, roots = state
+    start, end = chunk
+    result = np.zeros(end - start)
+    for i in range(start, end):
+        program = programs[i]
+        if dfa is not None:
+            program = ns.to_type_annotated_ns_s_exp(program, dfa, roots[i])
+        result[i - start] = fam.compute_likelihood(dist, program)
+    return result
@@ -0,0 +1,305 @@
+import ast
+from collections.abc import Mapping
+
+SCOPE_NODE_TYPES = (
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.Lambda,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+)
+
+# Nodes that are never themselves visited when computing containing functions,
+# but some of whose children are (defaults of arguments, iters and ifs of
+# comprehensions).
+PASS_THROUGH_NODE_TYPES = (ast.arguments, ast.comprehension)
+
+# Fields of each construct that are evaluated inside the construct's own scope.
+INNER_SCOPE_FIELDS = {
+    ast.FunctionDef: {"body"},
+    ast.AsyncFunctionDef: {"body"},
+    ast.Lambda: {"body"},
+    ast.ListComp: {"elt"},
+    ast.SetComp: {"elt"},
+    ast.GeneratorExp: {"elt"},
+    ast.DictComp: {"key", "value"},
+}
+
+# Fields of each construct that are visited at all when computing containing
+# functions. Anything else (e.g., argument names, annotations, comprehension
+# targets) is skipped.
+VISITED_FIELDS = {
+    ast.FunctionDef: {"body", "decorator_list", "args"},
+    ast.AsyncFunctionDef: {"body", "decorator_list", "args"},
+    ast.Lambda: {"body", "args"},
+    ast.ListComp: {"elt", "generators"},
+    ast.SetComp: {"elt", "generators"},
+    ast.GeneratorExp: {"elt", "generators"},
+    ast.DictComp: {"key", "value", "generators"},
+    ast.arguments: {"defaults", "kw_defaults"},
+    ast.comprehension: {"iter", "ifs"},
+}
+
+
+def child_nodes(node):
+    """
+    Yields (field, child) pairs for each AST child of the given node, in the
+        order an ast.NodeVisitor would visit them.
+    """
+    for field, value in ast.iter_fields(node):
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, ast.AST):
+                    yield field, item
+        elif isinstance(value, ast.AST):
+            yield field, value
+
+
+class NodeIndex:
+    """
+    A flattened preorder index of an AST. Replaces walking the tree with a visitor
+        each time we want the nodes in order, the parent of a node, or the functions
+        containing a node.
+
+    The index is a snapshot of the tree: code that mutates an indexed tree in place must
+        call refresh() on the mutated subtree before the index is used again.
+
+    Fields:
+        root: The root of the indexed tree.
+        nodes: list[AST] The nodes in preorder, as an ast.NodeVisitor would visit them.
+            Nodes that appear multiple times in the tree (e.g., the shared ast.Load
+            instance) appear multiple times in this list.
+        parents: list[int] The position of the parent of each node, -1 for the root.
+        depths: list[int] The depth of each node, 0 for the root.
+        ends: list[int] The (exclusive) end of the subtree of each node, so that
+            nodes[i:ends[i]] is the subtree rooted at nodes[i].
+        containing: list[int] The position of the innermost function, lambda, or
+            comprehension whose scope contains each node, or -1 if there is none.
+        position: dict[AST, int] A mapping from each node to its (last) position.
+        version: int The number of times the index has been refreshed, so that
+            information derived from the index can be invalidated.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        (
+            self.nodes,
+            self.parents,
+            self.depths,
+            self.ends,
+            self.containing,
+            self._visited_edge,
+        ) = _index_subtree(root, 0, -1, 0, -1, True)
+        self.position = {node: i for i, node in enumerate(self.nodes)}
+        self.version = 0
+
+    def __contains__(self, node):
+        return node in self.position
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def subtree(self, node):
+        """
+        Returns the nodes in the subtree rooted at `node`, in preorder.
+        """
+        start = self.position[node]
+        return self.nodes[start : self.ends[start]]
+
+    def subtree_range(self, node):
+        """
+        Returns the range of positions of the subtree rooted at `node`.
+        """
+        start = self.position[node]
+        return range(start, self.ends[start])
+
+    def is_within(self, node, ancestor):
+        """
+        Whether `node` is in the subtree rooted at `ancestor` (inclusive).
+        """
+        position = self.position.get(node)
+        if position is None:
+            return False
+        start = self.position[ancestor]
+        return start <= position < self.ends[start]
+
+    def parent(self, node):
+        """
+        Returns the parent of the given node, or None if it is the root.
+        """
+        parent = self.parents[self.position[node]]
+        return None if parent == -1 else self.nodes[parent]
+
+    def depth(self, node):
+        return self.depths[self.position[node]]
+
+    def innermost_containing(self, node):
+        """
+        Returns the innermost function, lambda, or comprehension whose scope
+            contains the given node, or None if there is none.
+        """
+        containing = self.containing[self.position[node]]
+        return None if containing == -1 else self.nodes[containing]
+
+    def containing_stack(self, node, root=None):
+        """
+        Returns the list of functions, lambdas and comprehensions containing the given node,
+            outermost first, restricted to those within the subtree rooted at `root`.
+
+        Mirrors a traversal from `root` that enters function bodies, lambda bodies, and
+            comprehension elements/conditions in the scope of the construct, visits
+            decorators, defaults, and comprehension iterators in the enclosing scope,
+            and skips everything else about these constructs (including the constructs
+            themselves). Returns None for nodes that such a traversal would not record.
+        """
+        if root is None:
+            root = self.root
+        root_position = self.position[root]
+        position = self.position.get(node)
+        if position is None:
+            return None
+        if not root_position <= position < self.ends[root_position]:
+            return None
+        if isinstance(node, SCOPE_NODE_TYPES + PASS_THROUGH_NODE_TYPES):
+            return None
+        current = position
+        while current != root_position:
+            if not self._visited_edge[current]:
+                return None
+            current = self.parents[current]
+        stack = []
+        current = self.containing[position]
+        while current >= root_position:
+            stack.append(self.nodes[current])
+            current = self.containing[current]
+        return stack[::-1]
+
+    def order_within(self, node):
+        """
+        Returns a mapping from each node in the subtree rooted at `node` to a position
+            that orders it in preorder.
+        """
+        return SubtreeOrder(self, self.position[node])
+
+    def refresh(self, node):
+        """
+        Re-index the subtree rooted at `node` after it has been mutated in place.
+            The node itself must still be at the same place in the tree.
+        """
+        start = self.position[node]
+        old_end = self.ends[start]
+        new = _index_subtree(
+            node,
+            start,
+            self.parents[start],
+            self.depths[start],
+            self.containing[start],
+            self._visited_edge[start],
+        )
+        delta = len(new[0]) - (old_end - start)
+
+        def shift(values):
+            if not delta:
+                return values
+            return [x + delta if x >= old_end else x for x in values]
+
+        self.nodes[start:old_end] = new[0]
+        self.parents = (
+            shift(self.parents[:start]) + new[1] + shift(self.parents[old_end:])
+        )
+        self.depths[start:old_end] = new[2]
+        self.ends = shift(self.ends[:start]) + new[3] + shift(self.ends[old_end:])
+        self.containing = (
+            shift(self.containing[:start]) + new[4] + shift(self.containing[old_end:])
+        )
+        self._visited_edge[start:old_end] = new[5]
+        self.position = {node: i for i, node in enumerate(self.nodes)}
+        self.version += 1
+
+
+class SubtreeOrder(Mapping):
+    """
+    A read-only mapping from each node in a subtree of a NodeIndex to its position.
+    """
+
+    def __init__(self, index, start):
+        self._index = index
+        self._start = start
+
+    def _position(self, node):
+        position = self._index.position.get(node)
+        if position is None:
+            return None
+        if not self._start <= position < self._index.ends[self._start]:
+            return None
+        return position
+
+    def get(self, key, default=None):
+        position = self._position(key)
+        return default if position is None else position
+
+    def __getitem__(self, node):
+        position = self._position(node)
+        if position is None:
+            raise KeyError(node)
+        return position
+
+    def __contains__(self, node):
+        return self._position(node) is not None
+
+    def __iter__(self):
+        return iter(
+            {node: None for node in self._index.subtree(self._index.nodes[self._start])}
+        )
+
+    def __len__(self):
+        return self._index.ends[self._start] - self._start
+
+
+def _index_subtree(root, base, parent, depth, containing, visited_edge):
+    """
+    Index the subtree rooted at `root`, as if it were placed at position `base`, with
+        the given parent, depth, containing scope and visited edge flag.
+
+    Returns the lists (nodes, parents, depths, ends, containing, visited_edge) for
+        the subtree.
+    """
+    nodes, parents, depths, containings, visited_edges = [], [], [], [], []
+    fringe = [(root, parent, depth, containing, visited_edge)]
+    while fringe:
+        node, parent, depth, containing, visited_edge = fringe.pop()
+        position = base + len(nodes)
+        nodes.append(node)
+        parents.append(parent)
+        depths.append(depth)
+        containings.append(containing)
+        visited_edges.append(visited_edge)
+        node_type = type(node)
+        inner_fields = INNER_SCOPE_FIELDS.get(node_type, ())
+        visited_fields = VISITED_FIELDS.get(node_type)
+        children = []
+        for field, child in child_nodes(node):
+            child_containing = containing
+            if field in inner_fields:
+                child_containing = position
+            elif node_type is ast.comprehension and field == "ifs":
+                # conditions are evaluated in the scope of the comprehension, which
+                # is the parent of the ast.comprehension node
+                child_containing = parent
+            children.append(
+                (
+                    child,
+                    position,
+                    depth + 1,
+                    child_containing,
+                    visited_fields is None or field in visited_fields,
+                )
+            )
+        fringe.extend(children[::-1])
+    sizes = [1] * len(nodes)
+    for i in range(len(nodes) - 1, 0, -1):
+        sizes[parents[i] - base] += sizes[i]
+    ends = [base + i + size for i, size in enumerate(sizes)]
+    return nodes, parents, depths, ends, containings, visited_edges
@@ -0,0 +1,28 @@
+import functools
+import weakref
+
+
+def cache_by_tree_distribution(fn):
+    """
+    Cache fn(tree_dist) for each tree distribution, for as long as it is alive.
+
+    Tree distributions are not hashable, so they are keyed by identity, with a weak
+        reference to check that the identity has not been reused.
+    """
+    # Map from id(tree_dist) to (weakref to the tree distribution, fn(tree_dist)).
+    results = {}
+
+    @functools.wraps(fn)
+    def cached(tree_dist):
+        key = id(tree_dist)
+        entry = results.get(key)
+        if entry is not None and entry[0]() is tree_dist:
+            return entry[1]
+        result = fn(tree_dist)
+        results[key] = (
+            weakref.ref(tree_dist, lambda _: results.pop(key, None)),
+            result,
+        )
+        return result
+
+    return cached
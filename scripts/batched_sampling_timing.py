@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+
+from imperative_stitch.utils.batched_sampling import sample_programs
+from tests.dsl_tests.batched_sampling_test import fit_de_bruijn_distribution
+
+num_programs = 2000
+dfa, abstrs, fam, dist = fit_de_bruijn_distribution()
+
+start = time.time()
+rng = np.random.RandomState(0)
+for _ in range(num_programs):
+    fam.sample(dist, rng)
+print(
+    f"fam.sample one at a time: {num_programs / (time.time() - start):.0f} programs/s"
+)
+for batch_size in [1, 10, 100]:
+    for parallel in [False, True]:
+        start = time.time()
+        sample_programs(
+            fam,
+            dist,
+            num_programs,
+            np.random.RandomState(0),
+            batch_size=batch_size,
+            parallel=parallel,
+        )
+        print(
+            f"sample_programs, batch_size={batch_size}, parallel={parallel}: "
+            f"{num_programs / (time.time() - start):.0f} programs/s"
+        )
+start = time.time()
+sample_programs(
+    fam,
+    dist,
+    num_programs,
+    np.random.RandomState(0),
+    uncanonicalize=True,
+    dfa=dfa,
+    abstrs=abstrs,
+)
+print(
+    "sample_programs, uncanonicalized: "
+    f"{num_programs / (time.time() - start):.0f} programs/s"
+)
@@ -0,0 +1,27 @@
+import time
+
+import neurosym as ns
+
+from imperative_stitch.utils.bigram_counts import count_programs_sharded
+from tests.dsl_tests.utils import fit_to
+
+codes = [
+    "\n".join(
+        [f"v0 = {seed}"]
+        + [f"v{i} = v{i - 1} + v{max(i - seed % 5 - 1, 0)}" for i in range(1, 30)]
+    )
+    for seed in range(200)
+]
+dfa, _, fam, _ = fit_to(codes)
+programs = [
+    ns.to_type_annotated_ns_s_exp(ns.python_to_python_ast(code), dfa, "M")
+    for code in codes
+]
+
+start = time.time()
+fam.count_programs([programs])
+print(f"count_programs: {time.time() - start:.2f}s")
+for parallel in [False, True]:
+    start = time.time()
+    count_programs_sharded(fam, [programs], shard_size=20, parallel=parallel)
+    print(f"sharded, parallel={parallel}: {time.time() - start:.2f}s")
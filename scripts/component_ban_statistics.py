@@ -0,0 +1,14 @@
+import glob
+import time
+
+from imperative_stitch.statistics.component_bans import scan_corpus
+
+start = time.time()
+result = scan_corpus(sorted(glob.glob("data/all_repos_contents/*.json")))
+good, causes_issue = result.statistics()
+print(
+    f"{result.num_files} files ({result.num_skipped} skipped) in {time.time() - start:.2f}s"
+)
+print(f"good: {good:.2%}")
+for component, frac in causes_issue:
+    print(f"{component}: {frac:.2%}")
@@ -1,5 +1,6 @@
 import time
 from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.canonicalize_de_bruijn import canonicalize_de_bruijn_batched
 from tests.dsl_tests.canonicalize_de_bruijn_test import LikelihoodDeBruijnTest, parse_and_check
 from tests.utils import small_set_runnable_code_examples
 
@@ -20,3 +21,11 @@ LikelihoodDeBruijnTest().fit_dsl(
 )
 end = time.time()
 print(end-start)
+
+for parallel in [False, True]:
+    start = time.time()
+    canonicalize_de_bruijn_batched(
+        programs, ["M"] * len(programs), export_dfa(), (), 2, parallel=parallel
+    )
+    end = time.time()
+    print(f"parallel={parallel}: {end - start:.2f}s")
@@ -0,0 +1,115 @@
+import time
+
+import neurosym as ns
+
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.compress.manipulate_abstraction import (
+    abstraction_calls_to_bodies,
+)
+from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.abstraction_handler import (
+    VARIABLE_REGEX,
+)
+from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
+from imperative_stitch.utils.def_use_mask_extension.ordering import (
+    PythonWithAbstractionsNodeOrdering,
+)
+from tests.dsl_tests.utils import fit_de_bruijn_dsl, fit_to
+from tests.utils import cwq, parse_with_hijacking
+
+abstrs = [
+    Abstraction.of(
+        "fn_1",
+        "(/seq (Assign (list (Name %2 Store)) (Name %1 Load) None) (Assign (list (Name %2 Store)) #0 None))",
+        "seqS",
+        dfa_symvars=["Name"] * 2,
+        dfa_metavars=["E"],
+    ),
+    Abstraction.of(
+        "fn_2",
+        "(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Name %1 Load)) None)",
+        "S",
+        dfa_symvars=["Name"] * 2,
+    ),
+]
+
+block = """
+a = 2
+"~(/splice (fn_1 (Name &a:0 Load) &b:0 &a:0))"
+"~(fn_2 &c:0 &b:0)"
+c = a + b
+"~(fn_2 &a:0 &c:0)"
+"""
+
+with_abstractions = parse_with_hijacking(cwq("c = 1\n" + block * 20))
+without_abstractions = abstraction_calls_to_bodies(
+    with_abstractions, {x.name: x for x in abstrs}
+)
+
+
+def explore_alternatives(s_exp, mask, position, alts):
+    """
+    Enter and undo every alternative, as enumeration and sampling do.
+    """
+    for alt in alts:
+        if not VARIABLE_REGEX.match(mask.id_to_name(alt)):
+            mask.on_entry(position, alt)()
+    return s_exp
+
+
+def time_mask(program, abstrs, explore, repeats=10):
+    dfa, _, fam, _ = fit_to(
+        [program], parser=lambda x: x, abstrs=abstrs, include_type_preorder_mask=False
+    )
+    s_exp = ns.to_type_annotated_ns_s_exp(program, dfa, "M")
+    return time_collect(s_exp, fam.tree_distribution_skeleton, explore, repeats)
+
+
+def time_de_bruijn_mask(code, max_explicit_dbvar_index, explore, repeats=10):
+    dfa = export_dfa()
+    [s_exp], dsl = fit_de_bruijn_dsl(
+        ns.python_to_python_ast(code),
+        max_explicit_dbvar_index=max_explicit_dbvar_index,
+        abstrs=(),
+        dfa=dfa,
+    )
+    fam = ns.BigramProgramDistributionFamily(
+        dsl,
+        additional_preorder_masks=[
+            lambda dist, dsl: def_use_mask(dist, dsl, dfa=dfa, abstrs=())
+        ],
+        include_type_preorder_mask=False,
+        node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(dist, ()),
+    )
+    return time_collect(s_exp, fam.tree_distribution_skeleton, explore, repeats)
+
+
+def time_collect(s_exp, tree_dist, explore, repeats):
+    start = time.time()
+    for _ in range(repeats):
+        count = len(
+            list(
+                ns.collect_preorder_symbols(
+                    s_exp,
+                    tree_dist,
+                    replace_node_midstream=explore_alternatives if explore else None,
+                )
+            )
+        )
+    return count * repeats / (time.time() - start)
+
+
+for explore in [False, True]:
+    print(f"exploring alternatives: {explore}")
+    rate = time_mask(without_abstractions, (), explore)
+    print(f"    without abstractions: {rate:.0f} nodes/s")
+    rate = time_mask(with_abstractions, abstrs, explore)
+    print(f"    with abstractions: {rate:.0f} nodes/s")
+
+chain = "\n".join(
+    ["v0 = 1"] + [f"v{i} = v{i - 1} + v{max(i - 5, 0)}" for i in range(1, 60)]
+)
+for explore in [False, True]:
+    print(f"de bruijn, exploring alternatives: {explore}")
+    rate = time_de_bruijn_mask(chain, 3, explore)
+    print(f"    {rate:.0f} nodes/s")
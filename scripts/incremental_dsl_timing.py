@@ -0,0 +1,53 @@
+import time
+
+import neurosym as ns
+
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
+from imperative_stitch.utils.def_use_mask_extension.ordering import (
+    PythonWithAbstractionsNodeOrdering,
+)
+from imperative_stitch.utils.dsl_with_abstraction import (
+    IncrementalPythonDSL,
+    add_abstractions,
+)
+
+abstrs = [
+    Abstraction.of(
+        f"fn_{i}",
+        f"(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Constant i{i} None)) None)",
+        "S",
+        dfa_symvars=["Name"] * 2,
+    )
+    for i in range(1, 202)
+]
+programs = [ns.python_to_python_ast(f"x = {i}; y = x + {i}") for i in range(50)]
+
+
+def from_scratch(abstrs):
+    dfa = export_dfa(abstrs=abstrs)
+    subset = ns.PythonDSLSubset.from_programs(dfa, *programs, root="M")
+    add_abstractions(subset, dfa, *abstrs)
+    fam = ns.BigramProgramDistributionFamily(
+        ns.create_python_dsl(dfa, subset, "M"),
+        additional_preorder_masks=[
+            lambda dist, dsl: def_use_mask(dist, dsl, dfa=dfa, abstrs=abstrs)
+        ],
+        node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(dist, abstrs),
+    )
+    return fam, fam.tree_distribution_skeleton.ordering
+
+
+start = time.time()
+from_scratch(abstrs)
+print(f"from scratch with {len(abstrs)} abstractions: {time.time() - start:.3f}s")
+
+dsl = IncrementalPythonDSL()
+dsl.add_programs(*programs)
+dsl.add_abstractions(*abstrs[:-1])
+start = time.time()
+dsl.add_abstractions(abstrs[-1])
+fam = dsl.family()
+fam.tree_distribution_skeleton.ordering  # pylint: disable=pointless-statement
+print(f"incrementally adding one abstraction: {time.time() - start:.3f}s")
@@ -0,0 +1,25 @@
+import time
+
+import neurosym as ns
+
+from imperative_stitch.utils.likelihood_scoring import score_programs
+from tests.dsl_tests.utils import fit_to
+
+codes = [
+    "\n".join(
+        [f"v0 = {seed}"]
+        + [f"v{i} = v{i - 1} + v{max(i - seed % 5 - 1, 0)}" for i in range(1, 10)]
+    )
+    for seed in range(300)
+]
+dfa, _, fam, dist = fit_to(codes)
+programs = [ns.python_to_python_ast(code) for code in codes]
+
+start = time.time()
+for program in programs:
+    fam.compute_likelihood(dist, ns.to_type_annotated_ns_s_exp(program, dfa, "M"))
+print(f"compute_likelihood one at a time: {time.time() - start:.2f}s")
+for parallel in [False, True]:
+    start = time.time()
+    score_programs(fam, dist, programs, dfa=dfa, parallel=parallel)
+    print(f"score_programs, parallel={parallel}: {time.time() - start:.2f}s")
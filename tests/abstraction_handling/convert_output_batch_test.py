@@ -0,0 +1,222 @@
+import ast
+import unittest
+from textwrap import dedent
+
+import neurosym as ns
+
+from imperative_stitch.analyze_program.extract.errors import MultipleExits
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.compress.manipulate_abstraction import (
+    abstraction_calls_to_bodies_recursively,
+)
+from imperative_stitch.compress.run_extraction import (
+    convert_output,
+    convert_output_batch,
+)
+from imperative_stitch.parser import converter
+
+READ_TWO = """
+(/subseq
+    (Assign (list (Name %1 Store)) (Call (Name g_int Load) (list (_starred_content (Call (Name g_input Load) nil nil))) nil) None)
+    (Assign (list (Name %2 Store)) (Call (Name g_input Load) nil nil) None))
+"""
+
+READ_TWO_AND_PRINT = """
+(/subseq
+    (Assign (list (Name %1 Store)) (Call (Name g_int Load) (list (_starred_content (Call (Name g_input Load) nil nil))) nil) None)
+    (Assign (list (Name %2 Store)) (Call (Name g_input Load) nil nil) None)
+    (Expr (Call (Name g_print Load) (list (_starred_content (Name %1 Load)) (_starred_content (Name %2 Load))) nil)))
+"""
+
+# fn_2 calls fn_1 in its body
+LIBRARY = [
+    dict(body=READ_TWO, dfa_root="seqS", dfa_symvars=["X", "X"]),
+    dict(
+        body="""
+        (/subseq
+            (/splice (fn_1 %1 %2))
+            (Expr (Call (Name g_print Load) (list (_starred_content (Name %1 Load)) (_starred_content (Name %2 Load))) nil)))
+        """,
+        dfa_root="seqS",
+        dfa_symvars=["X", "X"],
+    ),
+    # a conditional break, so it cannot be extracted
+    dict(
+        body="""
+        (/subseq
+            (If (Compare (Name %1 Load) (list Gt) (list (Constant i0 None))) (/seq Break) (/seq))
+            (AugAssign (Name %1 Store) Add (Constant i1 None)))
+        """,
+        dfa_root="seqS",
+        dfa_symvars=["X"],
+    ),
+    # never called
+    dict(
+        body="(/subseq (Assign (list (Name %1 Store)) (Constant i3 None) None))",
+        dfa_root="seqS",
+        dfa_symvars=["X"],
+    ),
+]
+
+PRINT_U = (
+    "(Expr (Call (Name g_print Load) (list (_starred_content (Name &u:0 Load))) nil))"
+)
+
+REWRITTEN = [
+    """
+    (Module (/seq
+        (/splice (fn_1 &n:0 &s:0))
+        (Assign (list (Name &k:0 Store)) (Call (Attribute (Name &s:0 Load) s_count Load) (list (_starred_content (Constant s_8 None))) nil) None))
+    nil)
+    """,
+    """
+    (Module (/seq
+        (/splice (fn_2 &a:0 &b:0))
+        (Expr (Call (Name g_print Load) (list (_starred_content (Name &a:0 Load))) nil)))
+    nil)
+    """,
+    """
+    (Module (/seq
+        (Assign (list (Name &x:0 Store)) (Constant i2 None) None)
+        (For (Name &_:0 Store) (Call (Name g_range Load) (list (_starred_content (Constant i10 None))) nil)
+            (/seq (/splice (fn_3 &x:0)))
+            (/seq) None)
+        (Expr (Call (Name g_print Load) (list (_starred_content (Name &x:0 Load))) nil)))
+    nil)
+    """,
+    f"""
+    (Module (/seq
+        (/splice (fn_1 &u:0 &v:0))
+        (/splice (fn_2 &w:0 &y:0))
+        {PRINT_U})
+    nil)
+    """,
+]
+
+# The programs above with every abstraction call replaced by its body.
+INLINED = [
+    dedent(code)
+    for code in [
+        """
+        n = int(input())
+        s = input()
+        k = s.count('8')
+        """,
+        """
+        a = int(input())
+        b = input()
+        print(a, b)
+        print(a)
+        """,
+        """
+        x = 2
+        for _ in range(10):
+            if x > 0:
+                break
+            x += 1
+        print(x)
+        """,
+        """
+        u = int(input())
+        v = input()
+        w = int(input())
+        y = input()
+        print(w, y)
+        print(u)
+        """,
+    ]
+]
+
+# For each extractable abstraction, the same programs written against a library
+# containing only that abstraction (named fn_1), with the bodies of every other
+# abstraction inlined.
+SINGLE = {
+    "fn_1": (
+        LIBRARY[0],
+        [
+            REWRITTEN[0],
+            ns.python_to_s_exp(INLINED[1]),
+            ns.python_to_s_exp(INLINED[2]),
+            f"""
+            (Module (/seq
+                (/splice (fn_1 &u:0 &v:0))
+                (Assign (list (Name &w:0 Store)) (Call (Name g_int Load) (list (_starred_content (Call (Name g_input Load) nil nil))) nil) None)
+                (Assign (list (Name &y:0 Store)) (Call (Name g_input Load) nil nil) None)
+                (Expr (Call (Name g_print Load) (list (_starred_content (Name &w:0 Load)) (_starred_content (Name &y:0 Load))) nil))
+                {PRINT_U})
+            nil)
+            """,
+        ],
+    ),
+    "fn_2": (
+        dict(body=READ_TWO_AND_PRINT, dfa_root="seqS", dfa_symvars=["X", "X"]),
+        [
+            ns.python_to_s_exp(INLINED[0]),
+            REWRITTEN[1].replace("fn_2", "fn_1"),
+            ns.python_to_s_exp(INLINED[2]),
+            f"""
+            (Module (/seq
+                (Assign (list (Name &u:0 Store)) (Call (Name g_int Load) (list (_starred_content (Call (Name g_input Load) nil nil))) nil) None)
+                (Assign (list (Name &v:0 Store)) (Call (Name g_input Load) nil nil) None)
+                (/splice (fn_1 &w:0 &y:0))
+                {PRINT_U})
+            nil)
+            """,
+        ],
+    ),
+}
+
+
+def normalize(code):
+    return ast.unparse(ast.parse(code.strip()))
+
+
+def inline_all(rewritten, abstractions):
+    abstr = {
+        f"fn_{i + 1}": Abstraction.of(name=f"fn_{i + 1}", **abstr_dict)
+        for i, abstr_dict in enumerate(abstractions)
+    }
+    return [
+        normalize(
+            abstraction_calls_to_bodies_recursively(
+                converter.s_exp_to_python_ast(code), abstr
+            ).to_python()
+        )
+        for code in rewritten
+    ]
+
+
+class ConvertOutputBatchTest(unittest.TestCase):
+    def test_fixtures_consistent(self):
+        expected = [normalize(code) for code in INLINED]
+        self.assertEqual(inline_all(REWRITTEN, LIBRARY), expected)
+        for abstr_dict, rewritten in SINGLE.values():
+            self.assertEqual(inline_all(rewritten, [abstr_dict]), expected)
+
+    def test_same_as_convert_output(self):
+        results = convert_output_batch(LIBRARY, REWRITTEN)
+        for name, (abstr_dict, rewritten) in SINGLE.items():
+            self.assertEqual(results[name], convert_output([abstr_dict], rewritten))
+
+    def test_programs_not_calling_are_inlined(self):
+        results = convert_output_batch(LIBRARY, REWRITTEN)
+        # fn_1 is only called from inside the body of fn_2 in program 1
+        _, rewritten = results["fn_1"]
+        for i in [1, 2]:
+            self.assertEqual(normalize(rewritten[i]), normalize(INLINED[i]))
+        _, rewritten = results["fn_2"]
+        for i in [0, 2]:
+            self.assertEqual(normalize(rewritten[i]), normalize(INLINED[i]))
+
+    def test_errors_do_not_affect_others(self):
+        results = convert_output_batch(LIBRARY, REWRITTEN)
+        self.assertIsInstance(results["fn_3"], MultipleExits)
+        self.assertIsInstance(results["fn_4"], ValueError)
+        self.assertEqual(results["fn_4"].args, ("No abstraction calls found",))
+        # the same library and programs, without fn_3 and fn_4
+        without_errors = convert_output_batch(
+            LIBRARY[:2],
+            [REWRITTEN[0], REWRITTEN[1], ns.python_to_s_exp(INLINED[2]), REWRITTEN[3]],
+        )
+        for name in ["fn_1", "fn_2"]:
+            self.assertEqual(results[name], without_errors[name])
@@ -0,0 +1,39 @@
+import ast
+import unittest
+
+from imperative_stitch.utils.ast_utils import (
+    render_subtree,
+    structural_differences,
+    structural_hash,
+    structurally_equal,
+)
+
+
+class StructuralEqualityTest(unittest.TestCase):
+    def test_ignores_locations(self):
+        a = ast.parse("def f(x):\n    y = x + 1\n    return y")
+        b = ast.parse("\n\ndef f(x):\n\n    y = x  +  1\n    return y  # comment")
+        self.assertTrue(structurally_equal(a, b))
+        self.assertEqual(structural_hash(a), structural_hash(b))
+        self.assertEqual(list(structural_differences(a, b)), [])
+
+    def test_constants_distinguished_like_unparse(self):
+        for x, y in [("1", "1.0"), ("0.0", "-0.0"), ("True", "1")]:
+            a, b = ast.parse(x), ast.parse(y)
+            self.assertNotEqual(ast.unparse(a), ast.unparse(b))
+            self.assertFalse(structurally_equal(a, b))
+
+    def test_differences(self):
+        a = ast.parse("def f(x):\n    y = x + 1\n    return y")
+        b = ast.parse("def f(x):\n    y = x + 2\n    return [y]")
+        self.assertFalse(structurally_equal(a, b))
+        self.assertEqual(
+            [
+                (path, render_subtree(x), render_subtree(y))
+                for path, x, y in structural_differences(a, b)
+            ],
+            [
+                (("body", 0, "body", 0, "value", "right", "value"), "1", "2"),
+                (("body", 0, "body", 1, "value"), "y", "[y]"),
+            ],
+        )
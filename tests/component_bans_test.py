@@ -0,0 +1,134 @@
+import ast
+import unittest
+from textwrap import dedent
+
+from parameterized import parameterized
+
+from imperative_stitch.analyze_program.ssa.banned_component import (
+    BannedComponentError,
+    check_banned_components,
+)
+from imperative_stitch.statistics.component_bans import (
+    ComponentBanStatistics,
+    all_errors,
+    all_errors_single_pass,
+    compute_statistics_each,
+)
+from imperative_stitch.utils.node_index import NodeIndex
+
+CODES = [
+    (
+        """
+        def f(x):
+            return x + 1
+        """,
+        [],
+    ),
+    (
+        """
+        def f():
+            global x
+            x = 2
+        """,
+        ["global"],
+    ),
+    (
+        """
+        class A:
+            def f(self):
+                x = yield 2
+                return x
+        """,
+        ["coroutine"],
+    ),
+    (
+        """
+        def f():
+            class A:
+                pass
+            def g():
+                nonlocal A
+            return A
+        """,
+        ["classes", "nonlocal"],
+    ),
+    (
+        """
+        if True:
+            def f(x):
+                yield x
+        else:
+            def g(x):
+                return (y := x)
+        """,
+        ["walrus operator"],
+    ),
+    (
+        """
+        try:
+            pass
+        except Exception:
+            def f(x):
+                return lambda: (yield x)
+        finally:
+            def g():
+                def h():
+                    global y
+        """,
+        ["global"],
+    ),
+    (
+        """
+        async def f():
+            pass
+        x = (y := 2)
+        """,
+        [],
+    ),
+    (
+        """
+        def f():
+            yield (y := 2)
+        def g():
+            yield (yield 2)
+        """,
+        [],
+    ),
+]
+
+
+class ComponentBansTest(unittest.TestCase):
+    @parameterized.expand(range(len(CODES)))
+    def test_single_pass(self, i):
+        code, expected = CODES[i]
+        self.assertEqual(all_errors_single_pass(dedent(code)), expected)
+
+    @parameterized.expand(range(len(CODES)))
+    def test_same_as_cfg(self, i):
+        code, _ = CODES[i]
+        self.assertEqual(all_errors_single_pass(dedent(code)), all_errors(dedent(code)))
+
+    def test_statistics(self):
+        errors_each = [expected for _, expected in CODES]
+        first, second = ComponentBanStatistics(), ComponentBanStatistics()
+        for errors in errors_each[:3]:
+            first.add(errors)
+        for errors in errors_each[3:]:
+            second.add(errors)
+        first.merge(second)
+        first.add_code("def f(:")
+        self.assertEqual(first.num_skipped, 1)
+        self.assertEqual(first.statistics(), compute_statistics_each(errors_each))
+
+
+class BannedComponentCacheTest(unittest.TestCase):
+    def test_invalidated_by_refresh(self):
+        tree = ast.parse("def f():\n    yield 2\n")
+        node_index = NodeIndex(tree)
+        [function_astn] = tree.body
+        check_banned_components(function_astn, node_index)
+        function_astn.body[0] = ast.parse("x = yield 2").body[0]
+        node_index.refresh(function_astn)
+        with self.assertRaises(BannedComponentError) as e:
+            check_banned_components(function_astn, node_index)
+        self.assertEqual(e.exception.component_type, "coroutine")
@@ -0,0 +1,134 @@
+import ast
+import unittest
+from textwrap import dedent
+
+from parameterized import parameterized
+
+from imperative_stitch.analyze_program.structures.dominators import DominatorTree
+from imperative_stitch.analyze_program.structures.per_function_cfg import (
+    per_function_cfg_for,
+)
+
+CODES = [
+    """
+    def f():
+        pass
+    """,
+    """
+    def f(x, *args, y=2, **kwargs):
+        x = x + y
+        return x
+    """,
+    """
+    def f(x):
+        if x > 0:
+            x = 1
+        elif x < 0:
+            x = 2
+        else:
+            return 3
+        return x
+    """,
+    """
+    def f(xs):
+        total = 0
+        for x in xs:
+            if x:
+                continue
+            if x is None:
+                break
+            total += x
+        else:
+            total = -1
+        while total > 10:
+            total -= 1
+        return total
+    """,
+    """
+    def f(x):
+        while True:
+            try:
+                x = int(x)
+            except ValueError as e:
+                print(e)
+                continue
+            except TypeError:
+                raise
+            else:
+                x += 1
+            finally:
+                print(x)
+            break
+        return x
+    """,
+    """
+    def f(x):
+        try:
+            try:
+                return x[0]
+            finally:
+                x = 2
+        except:
+            pass
+        def g(y=x):
+            return y
+        raise ValueError(g())
+        x = 3
+    """,
+]
+
+NOTHING = object()
+
+
+def reachable(root, successors_of, removed):
+    if root == removed:
+        return set()
+    seen = {root}
+    fringe = [root]
+    while fringe:
+        for succ in successors_of(fringe.pop()):
+            if succ not in seen and succ != removed:
+                seen.add(succ)
+                fringe.append(succ)
+    return seen
+
+
+def brute_force_dominates(root, successors_of):
+    nodes = reachable(root, successors_of, NOTHING)
+    return {
+        (a, b)
+        for a in nodes
+        for b in nodes
+        if a == b or b not in reachable(root, successors_of, a)
+    }
+
+
+class DominatorTreeTest(unittest.TestCase):
+    def check(self, root, successors_of, nodes):
+        tree = DominatorTree(root, successors_of)
+        expected = brute_force_dominates(root, successors_of)
+        actual = {(a, b) for a in nodes for b in nodes if tree.dominates(a, b)}
+        self.assertEqual(actual, expected)
+
+    def test_diamond_with_loop(self):
+        graph = {0: [1, 2], 1: [3], 2: [3], 3: [4, 1], 4: [], 5: [4]}
+        self.check(0, graph.__getitem__, graph)
+        tree = DominatorTree(0, graph.__getitem__)
+        self.assertEqual(tree.idom, {1: 0, 2: 0, 3: 0, 4: 3})
+        self.assertNotIn(5, tree)
+
+    @parameterized.expand(range(len(CODES)))
+    def test_per_function_cfg(self, i):
+        [function_astn] = ast.parse(dedent(CODES[i])).body
+        pfcfg = per_function_cfg_for(function_astn)
+        successors, predecessors = pfcfg.successors_and_predecessors()
+        nodes = set(successors) | set(predecessors) | {None, "<return>"}
+        expected = brute_force_dominates(None, successors.__getitem__)
+        self.assertEqual(
+            {(a, b) for a in nodes for b in nodes if pfcfg.dominates(a, b)}, expected
+        )
+        expected = brute_force_dominates("<return>", predecessors.__getitem__)
+        self.assertEqual(
+            {(a, b) for a in nodes for b in nodes if pfcfg.post_dominates(a, b)},
+            expected,
+        )
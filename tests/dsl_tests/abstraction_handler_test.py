@@ -0,0 +1,51 @@
+import unittest
+
+import neurosym as ns
+
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.utils.def_use_mask_extension.abstraction_handler import (
+    abstraction_handler_setups,
+)
+from tests.utils import cwq, parse_with_hijacking
+
+from .utils import fit_to
+
+fn_1 = Abstraction.of(
+    "fn_1",
+    "(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Name %1 Load)) None)",
+    "S",
+    dfa_symvars=["Name"] * 2,
+)
+
+
+class AbstractionHandlerSetupTest(unittest.TestCase):
+    def test_setup_shared(self):
+        program = parse_with_hijacking(
+            cwq(
+                """
+                a = 2
+                b = a
+                "~(fn_1 &a:0 &b:0)"
+                "~(fn_1 &b:0 &a:0)"
+                """
+            )
+        )
+        dfa, _, fam, _ = fit_to(
+            [program],
+            parser=lambda x: x,
+            abstrs=[fn_1],
+            include_type_preorder_mask=False,
+        )
+        tree_dist = fam.tree_distribution_skeleton
+        s_exp = ns.to_type_annotated_ns_s_exp(program, dfa, "M")
+        first = list(ns.collect_preorder_symbols(s_exp, tree_dist))
+        setups = abstraction_handler_setups(tree_dist)
+        self.assertEqual(list(setups), [("fn_1~S", id(dfa))])
+        [setup] = setups.values()
+        self.assertIs(setup.abstraction, fn_1)
+        self.assertEqual(setup.body, ns.to_type_annotated_ns_s_exp(fn_1.body, dfa, "S"))
+        second = list(ns.collect_preorder_symbols(s_exp, tree_dist))
+        self.assertEqual(
+            [(x, alts) for x, alts, _ in second], [(x, alts) for x, alts, _ in first]
+        )
+        self.assertIs(abstraction_handler_setups(tree_dist)[("fn_1~S", id(dfa))], setup)
@@ -0,0 +1,165 @@
+import unittest
+from collections import Counter
+
+import neurosym as ns
+import numpy as np
+from parameterized import parameterized
+
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.parser import converter
+from imperative_stitch.utils.batched_sampling import sample_programs
+from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.canonicalize_de_bruijn import (
+    uncanonicalize_de_bruijn_batched,
+)
+from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
+from imperative_stitch.utils.def_use_mask_extension.ordering import (
+    PythonWithAbstractionsNodeOrdering,
+)
+
+from .utils import fit_de_bruijn_dsl
+
+fn_1 = Abstraction.of(
+    name="fn_1",
+    body="(Expr (BinOp (Name %1 Load) Mod (Name %1 Load)))",
+    dfa_symvars=["Name"],
+    dfa_root="S",
+)
+
+corpus = [
+    """
+    (Module
+        (/seq
+            (Assign (list (Name &x:1 Store)) (Constant i2 None) None)
+            (Assign (list (Name &y:1 Store)) (BinOp (Name &x:1 Load) Add (Constant i1 None)) None)
+            (fn_1 &x:1)
+            (fn_1 &y:1)
+            (Expr (BinOp (Name &y:1 Load) Mult (Name &x:1 Load)))
+        )
+        nil)
+    """,
+    """
+    (Module
+        (/seq
+            (Assign (list (Name &z:1 Store)) (Constant i3 None) None)
+            (Assign
+                (list (Name &z:1 Store))
+                (BinOp (BinOp (Constant i1 None) Add (Name &z:1 Load)) Mult (Constant i2 None))
+                None)
+            (fn_1 &z:1)
+        )
+        nil)
+    """,
+    """
+    (Module
+        (/seq
+            (Assign (list (Name &a:1 Store)) (Constant i2 None) None)
+            (Assign (list (Name &a:1 Store)) (Constant i1 None) None)
+            (fn_1 &a:1)
+            (Expr (BinOp (Name &a:1 Load) Add (Constant i3 None)))
+            (fn_1 &a:1)
+        )
+        nil)
+    """,
+]
+
+
+def fit_de_bruijn_distribution():
+    """
+    Fit a de Bruijn distribution, with the fn_1 abstraction, to the corpus.
+
+    Returns:
+        (dfa, abstrs, fam, dist)
+    """
+    abstrs = [fn_1]
+    dfa = export_dfa(abstrs=abstrs)
+    programs, dsl = fit_de_bruijn_dsl(
+        *[converter.s_exp_to_python_ast(program) for program in corpus],
+        max_explicit_dbvar_index=2,
+        abstrs=abstrs,
+        dfa=dfa,
+    )
+    fam = ns.BigramProgramDistributionFamily(
+        dsl,
+        additional_preorder_masks=[
+            lambda dist, dsl: def_use_mask(dist, dsl, dfa=dfa, abstrs=abstrs)
+        ],
+        include_type_preorder_mask=True,
+        node_ordering=lambda dist: PythonWithAbstractionsNodeOrdering(dist, abstrs),
+    )
+    dist = fam.counts_to_distribution(fam.count_programs([programs]))[0]
+    return dfa, abstrs, fam, dist
+
+
+class SampleProgramsTest(unittest.TestCase):
+    def setUp(self):
+        self.dfa, self.abstrs, self.fam, self.dist = fit_de_bruijn_distribution()
+
+    def sample(self, num_programs, seed=0, **kwargs):
+        return sample_programs(
+            self.fam, self.dist, num_programs, np.random.RandomState(seed), **kwargs
+        )
+
+    def test_valid(self):
+        for program in self.sample(200):
+            self.assertGreater(
+                self.fam.compute_likelihood(self.dist, program),
+                -np.inf,
+                ns.render_s_expression(program),
+            )
+
+    def test_matches_likelihood(self):
+        # the number of statements is the first choice made, so the rate at which each
+        # is sampled should be close to the likelihood of that choice
+        programs = self.sample(1000)
+        counts = Counter(program.children[0].symbol for program in programs)
+        self.assertEqual(set(counts), {"/seq~seqS~3", "/seq~seqS~5"})
+        for symbol, count in counts.items():
+            program = next(p for p in programs if p.children[0].symbol == symbol)
+            [likelihood] = [
+                likelihood
+                for node, likelihood in self.fam.compute_likelihood_per_node(
+                    self.dist, program
+                )
+                if node is program.children[0]
+            ]
+            self.assertAlmostEqual(count / 1000, np.exp(likelihood), delta=0.05)
+
+    @parameterized.expand([(1,), (7,), (100,)])
+    def test_parallel_same_as_serial(self, batch_size):
+        serial, parallel = [
+            [
+                ns.render_s_expression(program)
+                for program in self.sample(
+                    20, batch_size=batch_size, parallel=parallel, max_workers=2
+                )
+            ]
+            for parallel in (False, True)
+        ]
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(serial), 20)
+
+    def test_depth_limit(self):
+        def depth(node):
+            return 1 + max((depth(child) for child in node.children), default=0)
+
+        self.assertGreater(max(depth(program) for program in self.sample(100)), 7)
+        for program in self.sample(100, depth_limit=7):
+            self.assertLessEqual(depth(program), 7)
+
+    def test_uncanonicalize(self):
+        de_bruijn = self.sample(20)
+        self.assertEqual(
+            [
+                ns.render_s_expression(program)
+                for program in self.sample(
+                    20, uncanonicalize=True, dfa=self.dfa, abstrs=self.abstrs
+                )
+            ],
+            [
+                ns.render_s_expression(program)
+                for program in uncanonicalize_de_bruijn_batched(
+                    self.dfa, de_bruijn, self.abstrs
+                )
+            ],
+        )
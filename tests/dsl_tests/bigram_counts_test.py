@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import neurosym as ns
+from parameterized import parameterized
+
+from imperative_stitch.utils.bigram_counts import count_programs_sharded
+
+from .utils import fit_to
+
+CODES = [
+    "x = 2",
+    "y = 3; x = y + 2",
+    "def f(x): return x + 1",
+    "for i in range(10): print(i)",
+    "a = [1, 2]; b = a[0] + a[1]",
+    "import os; print(os.path)",
+    "z = 1\nwhile z < 10:\n    z *= 2",
+]
+
+
+class CountProgramsShardedTest(unittest.TestCase):
+    def setUp(self):
+        self.dfa, _, self.fam, _ = fit_to(CODES)
+        self.data = [
+            [ns.to_type_annotated_ns_s_exp(ns.python_to_python_ast(p), self.dfa, "M")]
+            for p in CODES
+        ]
+        self.data = [sum(self.data, []), sum(self.data[:3], [])]
+
+    def assertSameCounts(self, actual, expected):
+        self.assertEqual(
+            [(x.numerators, x.denominators) for x in actual.counts],
+            [(x.numerators, x.denominators) for x in expected.counts],
+        )
+
+    @parameterized.expand([(1, False), (3, False), (100, False), (2, True)])
+    def test_same_as_count_programs(self, shard_size, parallel):
+        self.assertSameCounts(
+            count_programs_sharded(
+                self.fam,
+                self.data,
+                shard_size=shard_size,
+                parallel=parallel,
+                max_workers=2,
+            ),
+            self.fam.count_programs(self.data),
+        )
+
+    def test_resume(self):
+        bad = ns.SExpression("not-a-symbol", [])
+        [programs] = self.data[:1]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "counts.pkl")
+            with self.assertRaises(KeyError):
+                count_programs_sharded(
+                    self.fam,
+                    [programs[:4] + [bad] + programs[5:]],
+                    shard_size=2,
+                    checkpoint_path=path,
+                )
+            # the first two shards were saved, so they are not counted again
+            resumed = count_programs_sharded(
+                self.fam,
+                [[bad] * 4 + programs[4:]],
+                shard_size=2,
+                checkpoint_path=path,
+            )
+            with self.assertRaises(AssertionError):
+                count_programs_sharded(
+                    self.fam, [programs], shard_size=3, checkpoint_path=path
+                )
+        self.assertSameCounts(resumed, self.fam.count_programs([programs]))
@@ -7,6 +7,7 @@ from fractions import Fraction
 import neurosym as ns
 import numpy as np
 import pytest
+from parameterized import parameterized
 
 from imperative_stitch.analyze_program.ssa.banned_component import (
     BannedComponentError,
@@ -17,10 +18,12 @@ from imperative_stitch.compress.manipulate_abstraction import abstraction_calls_
 from imperative_stitch.parser import converter
 from imperative_stitch.utils.classify_nodes import export_dfa
 from imperative_stitch.utils.def_use_mask_extension.canonicalize_de_bruijn import (
-    add_dbvar_additional_productions,
+    DeBruijnCanonicalizer,
+    DeBruijnMaskState,
     canonicalize_de_bruijn,
-    dsl_subset_from_dbprograms,
+    de_bruijn_symbol_table,
     uncanonicalize_de_bruijn,
+    uncanonicalize_de_bruijn_batched,
 )
 from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
 from imperative_stitch.utils.def_use_mask_extension.ordering import (
@@ -33,6 +36,8 @@ from tests.utils import (
     small_set_runnable_code_examples,
 )
 
+from .utils import fit_de_bruijn_dsl
+
 
 class CanonicalizeDeBruijnTest(unittest.TestCase):
     def python_to_python_via_de_bruijn(self, program):
@@ -208,6 +213,132 @@ class CanonicalizeDeBruijnTest(unittest.TestCase):
         )
 
 
+class DeBruijnCanonicalizerTest(unittest.TestCase):
+    programs = [
+        "x = 2; y = x + 1; z = x + y; x = 3",
+        "def f(x, y, z, k=2): return x + y + z + k",
+        "y = 3; x = y + 2; z = y + x; y = 1",
+    ]
+
+    def test_same_as_canonicalize_de_bruijn(self):
+        dfa = export_dfa()
+        canonicalizer = DeBruijnCanonicalizer(dfa, (), max_explicit_dbvar_index=2)
+        for program in self.programs + self.programs[::-1]:
+            program = ns.python_to_python_ast(program)
+            self.assertEqual(
+                ns.render_s_expression(canonicalizer.canonicalize(program, "M")),
+                ns.render_s_expression(
+                    canonicalize_de_bruijn(
+                        program, "M", dfa, (), max_explicit_dbvar_index=2
+                    )
+                ),
+            )
+
+    def test_skeleton_reused(self):
+        canonicalizer = DeBruijnCanonicalizer(
+            export_dfa(), (), max_explicit_dbvar_index=2
+        )
+        first, second, third = [ns.python_to_python_ast(x) for x in self.programs]
+        canonicalizer.canonicalize(first, "M")
+        skeleton = canonicalizer.tree_distribution_skeleton("M")
+        # the third program only uses symbols that are in the first
+        canonicalizer.canonicalize(third, "M")
+        self.assertIs(canonicalizer.tree_distribution_skeleton("M"), skeleton)
+        canonicalizer.canonicalize(second, "M")
+        self.assertIsNot(canonicalizer.tree_distribution_skeleton("M"), skeleton)
+
+    def test_parallel(self):
+        dfa = export_dfa()
+        programs = [ns.python_to_python_ast(x) for x in self.programs] * 3
+        serial, parallel = [
+            DeBruijnCanonicalizer(dfa, (), 2).canonicalize_batched(
+                programs, ["M"] * len(programs), parallel=parallel, max_workers=2
+            )
+            for parallel in (False, True)
+        ]
+        self.assertEqual(
+            [ns.render_s_expression(x) for x in parallel],
+            [ns.render_s_expression(x) for x in serial],
+        )
+
+    @parameterized.expand([(False,), (True,)])
+    def test_uncanonicalize_batched(self, parallel):
+        dfa = export_dfa()
+        s_exps = DeBruijnCanonicalizer(dfa, (), 2).canonicalize_batched(
+            [ns.python_to_python_ast(x) for x in self.programs],
+            ["M"] * len(self.programs),
+        )
+        self.assertEqual(
+            [
+                ns.render_s_expression(x)
+                for x in uncanonicalize_de_bruijn_batched(
+                    dfa, s_exps, (), parallel=parallel, max_workers=2
+                )
+            ],
+            [
+                ns.render_s_expression(uncanonicalize_de_bruijn(dfa, x, ()))
+                for x in s_exps
+            ],
+        )
+
+
+class DeBruijnSymbolTableTest(unittest.TestCase):
+    def setUp(self):
+        dfa = export_dfa()
+        _, dsl = fit_de_bruijn_dsl(
+            ns.python_to_python_ast("def f(x, y, z, k=2): return x + y + z + k"),
+            max_explicit_dbvar_index=2,
+            abstrs=(),
+            dfa=dfa,
+        )
+        self.tree_dist = ns.BigramProgramDistributionFamily(
+            dsl
+        ).tree_distribution_skeleton
+        self.table = de_bruijn_symbol_table(self.tree_dist)
+
+    def masked_symbols(self, mask):
+        return {
+            symbol
+            for (symbol, _), allowed in zip(self.tree_dist.symbols, mask)
+            if allowed
+        }
+
+    @parameterized.expand(
+        [
+            (True, 0, {"dbvar-0~DBV"}),
+            (False, 0, set()),
+            (False, 1, {"dbvar-1~DBV"}),
+            (True, 2, {"dbvar-0~DBV", "dbvar-1~DBV", "dbvar-2~DBV"}),
+            (False, 3, {"dbvar-1~DBV", "dbvar-2~DBV", "dbvar-successor~DBV"}),
+            (False, 10, {"dbvar-1~DBV", "dbvar-2~DBV", "dbvar-successor~DBV"}),
+        ]
+    )
+    def test_wrapper_mask(self, is_defn, num_available_symbols, expected):
+        state = DeBruijnMaskState(2, is_defn, num_available_symbols)
+        self.assertEqual(self.masked_symbols(self.table.wrapper_mask(state)), expected)
+
+    @parameterized.expand(
+        [
+            (2, {"dbvar-2~DBV"}),
+            (3, {"dbvar-2~DBV", "dbvar-successor~DBV"}),
+        ]
+    )
+    def test_successor_mask(self, num_available_symbols, expected):
+        state = DeBruijnMaskState(2, False, num_available_symbols)
+        self.assertEqual(
+            self.masked_symbols(self.table.successor_mask(state)), expected
+        )
+
+    def test_cached(self):
+        self.assertIs(de_bruijn_symbol_table(self.tree_dist), self.table)
+        self.assertEqual(self.table.max_explicit_dbvar_index, 2)
+        state = DeBruijnMaskState(2, False, 4)
+        self.assertIs(
+            self.table.wrapper_mask(state),
+            self.table.wrapper_mask(DeBruijnMaskState(2, False, 7)),
+        )
+
+
 class LikelihoodDeBruijnTest(unittest.TestCase):
     def compute_likelihood(
         self,
@@ -258,21 +389,12 @@ class LikelihoodDeBruijnTest(unittest.TestCase):
         return results
 
     def fit_dsl(self, *programs, max_explicit_dbvar_index, abstrs, dfa):
-        programs, subset = dsl_subset_from_dbprograms(
+        return fit_de_bruijn_dsl(
             *programs,
-            roots=["M"] * len(programs),
-            dfa=dfa,
-            abstrs=abstrs,
             max_explicit_dbvar_index=max_explicit_dbvar_index,
+            abstrs=abstrs,
+            dfa=dfa,
         )
-        dsl = ns.create_python_dsl(
-            dfa,
-            subset,
-            "M",
-            add_additional_productions=add_dbvar_additional_productions,
-        )
-
-        return programs, dsl
 
     def test_likelihood_more_variables(self):
         fit_to = ["x = 2; y = x; y = x"]
@@ -138,3 +138,36 @@ class DefUseMaskAbstractionUndosTest(unittest.TestCase):
     @expand_with_slow_tests(len(load_stitch_output_set()), 10)
     def test_realistic_with_abstractions(self, i):
         self.check_use_mask(load_stitch_output_set()[i])
+
+    def test_hand_written_abstractions(self):
+        abstractions = [
+            Abstraction.of(
+                "fn_1",
+                """
+                (/seq
+                    (Assign (list (Name %2 Store)) (Name %1 Load) None)
+                    (Assign (list (Name %2 Store)) #0 None))
+                """,
+                "seqS",
+                dfa_symvars=["Name"] * 2,
+                dfa_metavars=["E"],
+            ),
+            Abstraction.of(
+                "fn_2",
+                "(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Name %1 Load)) None)",
+                "S",
+                dfa_symvars=["Name"] * 2,
+            ),
+        ]
+        program = """
+        (Module
+            (/seq
+                (Assign (list (Name &c:0 Store)) (Constant i1 None) None)
+                (Assign (list (Name &a:0 Store)) (Constant i2 None) None)
+                (/splice (fn_1 (Name &a:0 Load) &b:0 &a:0))
+                (fn_2 &c:0 &b:0)
+                (Assign (list (Name &c:0 Store)) (BinOp (Name &a:0 Load) Add (Name g_b Load)) None)
+                (fn_2 &a:0 &c:0))
+            nil)
+        """
+        self.assertUndoHasNoEffect(program, abstractions)
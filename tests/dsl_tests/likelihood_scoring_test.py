@@ -0,0 +1,82 @@
+import unittest
+
+import neurosym as ns
+import numpy as np
+from parameterized import parameterized
+
+from imperative_stitch.compress.abstraction import Abstraction
+from imperative_stitch.utils.likelihood_scoring import (
+    score_programs,
+    score_programs_per_node,
+)
+from tests.utils import cwq, parse_with_hijacking
+
+from .utils import fit_to
+
+fn_1 = Abstraction.of(
+    "fn_1",
+    "(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Name %1 Load)) None)",
+    "S",
+    dfa_symvars=["Name"] * 2,
+)
+
+corpus = [
+    'x = 2; y = x + 1\n"~(fn_1 &y:0 &x:0)"',
+    'a = 3\n"~(fn_1 &a:0 &a:0)"\nprint(a)',
+]
+test_programs = corpus + [
+    'a = 2\n"~(fn_1 &a:0 &a:0)"\nprint(a)',
+    # a constant is never printed in the corpus, so this is impossible
+    "print(3); x = 2; y = x + 1",
+]
+
+
+class ScoreProgramsTest(unittest.TestCase):
+    def setUp(self):
+        parse = lambda code: parse_with_hijacking(cwq(code))
+        self.dfa, _, self.fam, self.dist = fit_to(
+            [parse(code) for code in corpus],
+            parser=lambda x: x,
+            abstrs=[fn_1],
+            smoothing=False,
+        )
+        self.programs = [parse(code) for code in test_programs]
+        self.s_exps = [
+            ns.to_type_annotated_ns_s_exp(program, self.dfa, "M")
+            for program in self.programs
+        ]
+
+    @parameterized.expand([(1, False), (2, False), (100, False), (2, True)])
+    def test_same_as_compute_likelihood(self, chunk_size, parallel):
+        expected = [self.fam.compute_likelihood(self.dist, x) for x in self.s_exps]
+        self.assertEqual(np.isinf(expected).tolist(), [0, 0, 0, 1])
+        actual = score_programs(
+            self.fam,
+            self.dist,
+            self.programs,
+            dfa=self.dfa,
+            parallel=parallel,
+            max_workers=2,
+            chunk_size=chunk_size,
+        )
+        np.testing.assert_allclose(actual, expected)
+        np.testing.assert_allclose(
+            score_programs(self.fam, self.dist, self.s_exps), expected
+        )
+
+    def test_same_as_compute_likelihood_per_node(self):
+        expected = [
+            (i, ns.render_s_expression(node), likelihood)
+            for i, s_exp in enumerate(self.s_exps)
+            for node, likelihood in self.fam.compute_likelihood_per_node(
+                self.dist, s_exp
+            )
+        ]
+        actual = [
+            (i, ns.render_s_expression(node), likelihood)
+            for i, node, likelihood in score_programs_per_node(
+                self.fam, self.dist, iter(self.programs), dfa=self.dfa
+            )
+        ]
+        self.assertEqual([x[:2] for x in actual], [x[:2] for x in expected])
+        np.testing.assert_allclose([x[2] for x in actual], [x[2] for x in expected])
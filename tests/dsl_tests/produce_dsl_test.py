@@ -2,9 +2,19 @@ import unittest
 
 import neurosym as ns
 
+from imperative_stitch.compress.abstraction import Abstraction
 from imperative_stitch.parser import converter
+from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.ordering import (
+    python_node_ordering_with_abstractions,
+)
+from imperative_stitch.utils.dsl_with_abstraction import (
+    IncrementalPythonDSL,
+    add_abstractions,
+)
 
-from ..utils import assertDSL
+from ..utils import assertDSL, cwq, parse_with_hijacking
+from .utils import fit_to
 
 
 class ProduceDSLWithAbstractionsTest(unittest.TestCase):
@@ -28,3 +38,74 @@ class ProduceDSLWithAbstractionsTest(unittest.TestCase):
             fn_param_1~seqS :: E -> seqS
             """,
         )
+
+
+fn_1 = Abstraction.of(
+    "fn_1",
+    "(Assign (list (Name %1 Store)) (BinOp (Name %2 Load) Add (Name %1 Load)) None)",
+    "S",
+    dfa_symvars=["Name"] * 2,
+)
+fn_2 = Abstraction.of(
+    "fn_2",
+    """
+    (/seq
+        (fn_1 %2 %1)
+        (Expr (Call (Name g_print Load) (list (_starred_content (Name %1 Load))) nil)))
+    """,
+    "seqS",
+    dfa_symvars=["Name"] * 2,
+)
+
+
+class IncrementalPythonDSLTest(unittest.TestCase):
+    programs = [
+        parse_with_hijacking(cwq(code))
+        for code in [
+            "x = 2; y = x + 1",
+            'x = 3\n"~(fn_1 &x:0 &x:0)"',
+            'x = 3; y = 2\n"~(/splice (fn_2 &x:0 &y:0))"',
+        ]
+    ]
+
+    def test_same_as_from_scratch(self):
+        abstrs = [fn_1, fn_2]
+        dfa = export_dfa(abstrs=abstrs)
+        subset = ns.PythonDSLSubset.from_programs(dfa, *self.programs, root="M")
+        add_abstractions(subset, dfa, *abstrs)
+
+        incremental = IncrementalPythonDSL()
+        incremental.add_programs(self.programs[0])
+        incremental.add_abstractions(fn_1)
+        incremental.add_programs(self.programs[1])
+        incremental.add_abstractions(fn_2)
+        incremental.add_programs(self.programs[2])
+
+        self.assertEqual(incremental.dfa, dfa)
+        self.assertEqual(
+            incremental.ordering, python_node_ordering_with_abstractions(abstrs)
+        )
+        self.assertEqual(
+            incremental.dsl.render(), ns.create_python_dsl(dfa, subset, "M").render()
+        )
+        s_exps = [ns.to_type_annotated_ns_s_exp(p, dfa, "M") for p in self.programs]
+        [expected], [actual] = [
+            fam.count_programs([s_exps]).counts
+            for fam in [
+                fit_to(self.programs, parser=lambda x: x, abstrs=abstrs)[2],
+                incremental.family(),
+            ]
+        ]
+        self.assertEqual(actual.numerators, expected.numerators)
+        self.assertEqual(actual.denominators, expected.denominators)
+
+    def test_family_does_not_see_later_abstractions(self):
+        incremental = IncrementalPythonDSL()
+        incremental.add_programs(self.programs[0])
+        incremental.add_abstractions(fn_1)
+        dsl = incremental.dsl
+        fam = incremental.family()
+        incremental.add_abstractions(fn_2)
+        self.assertIsNot(incremental.dsl, dsl)
+        self.assertNotIn("fn_2~seqS", [x for x, _ in fam.sym_arities])
+        self.assertIn("fn_2~seqS", [x for x, _ in incremental.family().sym_arities])
@@ -1,6 +1,10 @@
 import neurosym as ns
 
 from imperative_stitch.utils.classify_nodes import export_dfa
+from imperative_stitch.utils.def_use_mask_extension.canonicalize_de_bruijn import (
+    add_dbvar_additional_productions,
+    dsl_subset_from_dbprograms,
+)
 from imperative_stitch.utils.def_use_mask_extension.mask import def_use_mask
 from imperative_stitch.utils.def_use_mask_extension.ordering import (
     PythonWithAbstractionsNodeOrdering,
@@ -53,3 +57,27 @@ def fit_to(
     if smoothing:
         dist = dist.bound_minimum_likelihood(1e-4, smooth_mask)
     return dfa, dsl, fam, dist
+
+
+def fit_de_bruijn_dsl(*programs, max_explicit_dbvar_index, abstrs, dfa):
+    """
+    Convert the programs to de Bruijn form, and create a DSL that covers them.
+
+    Returns:
+        (programs, dsl), where the programs are the de Bruijn s-expressions.
+    """
+    programs, subset = dsl_subset_from_dbprograms(
+        *programs,
+        roots=["M"] * len(programs),
+        dfa=dfa,
+        abstrs=abstrs,
+        max_explicit_dbvar_index=max_explicit_dbvar_index,
+    )
+    dsl = ns.create_python_dsl(
+        dfa,
+        subset,
+        "M",
+        add_additional_productions=add_dbvar_additional_productions,
+    )
+
+    return programs, dsl
@@ -0,0 +1,101 @@
+import ast
+import copy
+import unittest
+
+from permacache import no_cache_global
+
+from imperative_stitch.analyze_program.extract import (
+    NotApplicable,
+    do_extract,
+    do_extract_cached,
+)
+from imperative_stitch.analyze_program.extract.cached_extract import isolate_site
+from imperative_stitch.analyze_program.extract.errors import MultipleExits
+from imperative_stitch.analyze_program.extract.extract_configuration import (
+    ExtractConfiguration,
+)
+from imperative_stitch.data import parse_extract_pragma
+from tests.utils import canonicalize
+
+CODE = """
+def g(a):
+    return a
+
+def f(x, y):
+    __start_extract__
+    z = {__metavariable__, __m1, x + y}
+    if z > 0:
+        x += 1
+    __end_extract__
+    return x, z
+"""
+
+NOT_APPLICABLE_CODE = """
+def f(x, y):
+    __start_extract__
+    if x > 0:
+        return x
+    x += 1
+    __end_extract__
+    x += y
+    return x
+"""
+
+
+class CachedExtractTest(unittest.TestCase):
+    def test_isolate_site(self):
+        tree, [site] = parse_extract_pragma(canonicalize(CODE))
+        statements, location = isolate_site(tree, site)
+        self.assertEqual(statements, [tree.body[1]])
+        module = ast.Module(body=copy.deepcopy(statements), type_ignores=[])
+        relocated = location.locate(module)
+        self.assertEqual(
+            [ast.unparse(x) for x in relocated.statements()],
+            [ast.unparse(x) for x in site.statements()],
+        )
+        self.assertEqual(
+            [(name, ast.unparse(node)) for name, node in relocated.metavariables],
+            [("__m1", "x + y")],
+        )
+        # the location does not depend on formatting or the other statements
+        other_tree, [other_site] = parse_extract_pragma(
+            "def h():\n    pass\n" + canonicalize(CODE).replace("x + y", "(x+y)")
+        )
+        other_statements, other_location = isolate_site(other_tree, other_site)
+        self.assertEqual(location, other_location)
+        self.assertEqual(
+            [ast.dump(x) for x in statements], [ast.dump(x) for x in other_statements]
+        )
+
+    def run_both(self, code):
+        # exercise the isolation and copying of do_extract_cached, without reading or
+        # writing outcomes from the persistent cache
+        with no_cache_global():
+            return self.run_each(code)
+
+    def run_each(self, code):
+        results = []
+        for extract in do_extract, do_extract_cached, do_extract_cached:
+            tree, [site] = parse_extract_pragma(canonicalize(code))
+            original = ast.unparse(tree)
+            try:
+                extr = extract(
+                    site, tree, config=ExtractConfiguration(True), extract_name="__f0"
+                )
+            except NotApplicable as e:
+                self.assertEqual(original, ast.unparse(tree))
+                results.append(type(e))
+                continue
+            results.append((ast.unparse(tree), ast.unparse(extr.func_def)))
+            extr.undo()
+            self.assertEqual(original, ast.unparse(tree))
+        return results
+
+    def test_same_as_do_extract(self):
+        uncached, *cached = self.run_both(CODE)
+        self.assertEqual(cached, [uncached, uncached])
+
+    def test_not_applicable(self):
+        uncached, *cached = self.run_both(NOT_APPLICABLE_CODE)
+        self.assertEqual(uncached, MultipleExits)
+        self.assertEqual(cached, [MultipleExits, MultipleExits])
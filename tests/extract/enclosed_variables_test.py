@@ -0,0 +1,66 @@
+import ast
+import unittest
+from textwrap import dedent
+from types import SimpleNamespace
+
+import ast_scope
+
+from imperative_stitch.analyze_program.ssa.compute_node_to_containing import (
+    compute_enclosed_variables,
+    function_scope_for,
+    module_scope_summary,
+)
+from imperative_stitch.utils.node_index import NodeIndex
+
+CODE = dedent(
+    """
+    def f(x):
+        y = [x for _ in range(2)]
+        g = lambda: y
+        return x
+
+    def h(x):
+        return lambda: x
+    """
+)
+
+
+class EnclosedVariablesTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = ast.parse(CODE)
+        self.scope_info = ast_scope.annotate(self.tree)
+        self.index = NodeIndex(self.tree)
+        self.f, self.h = self.tree.body
+
+    def pcfg(self, function_astn):
+        return SimpleNamespace(function_astn=function_astn, node_index=self.index)
+
+    def test_classification(self):
+        immediately_executed, closed = compute_enclosed_variables(
+            self.scope_info, self.pcfg(self.f), set()
+        )
+        self.assertEqual([ast.unparse(x) for x in immediately_executed], ["x"])
+        self.assertEqual([ast.unparse(x) for x in closed], ["y"])
+        immediately_executed, closed = compute_enclosed_variables(
+            self.scope_info, self.pcfg(self.h), set()
+        )
+        self.assertEqual(immediately_executed, [])
+        self.assertEqual([ast.unparse(x) for x in closed], ["x"])
+
+    def test_already_annotated(self):
+        _, closed = compute_enclosed_variables(
+            self.scope_info, self.pcfg(self.h), set()
+        )
+        self.assertEqual(
+            compute_enclosed_variables(self.scope_info, self.pcfg(self.h), set(closed)),
+            ([], []),
+        )
+
+    def test_summary_is_shared(self):
+        summary = module_scope_summary(self.scope_info)
+        self.assertIs(module_scope_summary(self.scope_info), summary)
+        for function_astn in (self.f, self.h):
+            self.assertIs(
+                function_scope_for(self.scope_info, function_astn),
+                self.scope_info.function_scope_for(function_astn),
+            )
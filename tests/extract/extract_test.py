@@ -3,9 +3,11 @@ import unittest
 
 import neurosym as ns
 import numpy as np
+from parameterized import parameterized
 from python_graphs import control_flow
 
 from imperative_stitch.analyze_program.extract import NotApplicable, do_extract
+from imperative_stitch.analyze_program.extract import extract as extract_module
 from imperative_stitch.analyze_program.extract.errors import (
     BothYieldsAndReturns,
     ClosedVariablePassedDirectly,
@@ -17,12 +19,22 @@ from imperative_stitch.analyze_program.extract.errors import (
 from imperative_stitch.analyze_program.extract.extract_configuration import (
     ExtractConfiguration,
 )
+from imperative_stitch.analyze_program.ssa import annotator
 from imperative_stitch.analyze_program.ssa.banned_component import BannedComponentError
 from imperative_stitch.data import parse_extract_pragma
 from imperative_stitch.utils.ast_utils import ast_nodes_in_order
 from tests.utils import canonicalize, expand_with_slow_tests, small_set_examples
 
 
+def setUpModule():
+    # check the per-function control flow graphs against the whole-module ones
+    extract_module.VALIDATE_FUNCTION_CFG = True
+
+
+def tearDownModule():
+    extract_module.VALIDATE_FUNCTION_CFG = False
+
+
 class GenericExtractTest(unittest.TestCase):
     def run_extract(
         self, code, num_metavariables=None, config=ExtractConfiguration(True)
@@ -1168,3 +1180,64 @@ class ExtractRealisticTest(GenericExtractRealisticTest):
     @expand_with_slow_tests(len(small_set_examples()))
     def test_realistic(self, i):
         self.operate(i)
+
+
+PRUNED_SSA_CODES = [
+    """
+    def f(x, y):
+        __start_extract__
+        z = {__metavariable__, __m0, x + y}
+        w = z * {__metavariable__, __m1, y}
+        __end_extract__
+        return w
+    """,
+    """
+    def f(xs):
+        total = 0
+        for x in xs:
+            __start_extract__
+            if {__metavariable__, __m0, x is None}:
+                x = 0
+            total += {__metavariable__, __m1, x * 2}
+            __end_extract__
+        return total
+    """,
+    """
+    def f(x):
+        __start_extract__
+        try:
+            y = {__metavariable__, __m0, int(x)}
+        except ValueError:
+            y = 0
+        z = {__metavariable__, __m1, y + 1}
+        __end_extract__
+        return y, z
+    """,
+    """
+    def f(a, b):
+        c = 0
+        __start_extract__
+        while a:
+            c = {__metavariable__, __m0, c + b}
+            a -= 1
+        __end_extract__
+        return c
+    """,
+]
+
+
+class PrunedSSAExtractTest(GenericExtractTest):
+    def run_extract_pruned(self, code, prune):
+        annotator.USE_PRUNED_SSA = prune
+        try:
+            return self.run_extract(code, num_metavariables=2 if "__m1" in code else 1)
+        finally:
+            annotator.USE_PRUNED_SSA = False
+
+    @parameterized.expand(range(len(PRUNED_SSA_CODES)))
+    def test_same_as_unpruned(self, i):
+        unpruned = self.run_extract_pruned(PRUNED_SSA_CODES[i], prune=False)
+        self.assertIsInstance(unpruned, tuple)
+        self.assertEqual(
+            self.run_extract_pruned(PRUNED_SSA_CODES[i], prune=True), unpruned
+        )
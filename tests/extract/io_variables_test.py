@@ -1,15 +1,22 @@
+import ast
 import unittest
 
 import ast_scope
+from parameterized import parameterized
 
 from imperative_stitch.analyze_program.extract.errors import (
     ClosureOverVariableModifiedInExtractedCode,
     ModifiesVariableClosedOverInNonExtractedCode,
+    NotApplicable,
 )
 from imperative_stitch.analyze_program.extract.input_output_variables import (
     Variables,
     compute_variables,
 )
+from imperative_stitch.analyze_program.ssa import annotator
+from imperative_stitch.analyze_program.structures.per_function_cfg import (
+    per_function_cfg_for,
+)
 from imperative_stitch.data.parse_extract import parse_extract_pragma
 
 from ..utils import canonicalize
@@ -398,3 +405,101 @@ class IOVariablesTest(unittest.TestCase):
             self.run_io(code),
             Variables([], [("n", 3)], []),
         )
+
+
+PRUNING_CODES = [
+    """
+    def f(x, y):
+        __start_extract__
+        z = lambda: x + y
+        __end_extract__
+        x = 2
+        return z
+    """,
+    """
+    def f(a, b, c, d):
+        e = a + b
+        __start_extract__
+        g = c * d
+        if g > e:
+            g = -g
+        __end_extract__
+        h = g + c
+        return h
+    """,
+    """
+    def f(x):
+        table = None
+        try:
+            __start_extract__
+            y = x.read()
+            table = y.parse()
+            __end_extract__
+        except ValueError:
+            print("failed")
+        return table
+    """,
+    """
+    def f(xs):
+        total = 0
+        count = 0
+        for x in xs:
+            __start_extract__
+            if x is None:
+                x = 0
+            total += x
+            __end_extract__
+            count += 1
+        return total / count
+    """,
+]
+
+
+class PrunedIOVariablesTest(unittest.TestCase):
+    def run_io(self, code, prune):
+        code = canonicalize(code)
+        tree, [site] = parse_extract_pragma(code)
+        site.inject_sentinel()
+        scope_info = ast_scope.annotate(tree)
+        pfcfg = site.locate_entry_point(tree)
+        annotator.USE_PRUNED_SSA = prune
+        try:
+            variables = compute_variables(site, scope_info, pfcfg)
+        except NotApplicable as e:
+            return type(e)
+        finally:
+            annotator.USE_PRUNED_SSA = False
+        return (
+            variables.input_vars_without_ssa,
+            variables.closed_vars_without_ssa,
+            variables.output_vars_without_ssa,
+            variables.errors,
+        )
+
+    @parameterized.expand(range(len(PRUNING_CODES)))
+    def test_same_as_unpruned(self, i):
+        self.assertEqual(
+            self.run_io(PRUNING_CODES[i], prune=True),
+            self.run_io(PRUNING_CODES[i], prune=False),
+        )
+
+    def test_sparse(self):
+        code = canonicalize(PRUNING_CODES[1])
+        tree = ast.parse(code.replace("__start_extract__", "pass"))
+        scope_info = ast_scope.annotate(tree)
+        [function_astn] = tree.body
+        pfcfg = per_function_cfg_for(function_astn)
+        start, end, _, _ = annotator.run_ssa(scope_info, pfcfg, prune=False)
+        pruned_start, pruned_end, _, _ = annotator.run_ssa(
+            scope_info, pfcfg, prune=True
+        )
+        self.assertEqual(start.keys(), pruned_start.keys())
+        for full, pruned in [(start, pruned_start), (end, pruned_end)]:
+            for cfn in full:
+                self.assertLessEqual(pruned[cfn].keys(), full[cfn].keys())
+        # only h is live at the return
+        [return_cfn] = [
+            cfn for cfn in start if isinstance(cfn.instruction.node, ast.Return)
+        ]
+        self.assertEqual(set(pruned_start[return_cfn]), {"h"})
+        self.assertEqual(len(start[return_cfn]), 7)
@@ -7,7 +7,13 @@ import ast_scope
 import timeout_decorator
 from python_graphs import control_flow, program_utils
 
-from imperative_stitch.analyze_program.ssa import rename_to_ssa, run_ssa
+from imperative_stitch.analyze_program.ssa import (
+    FunctionSSAFailure,
+    FunctionSSAResult,
+    rename_to_ssa,
+    run_ssa,
+    run_ssa_on_module,
+)
 from imperative_stitch.analyze_program.ssa.banned_component import BannedComponentError
 from imperative_stitch.analyze_program.ssa.render import render_phi_map
 from imperative_stitch.analyze_program.structures.per_function_cfg import PerFunctionCFG
@@ -1033,6 +1039,55 @@ class SSATest(unittest.TestCase):
         self.assert_ssa(code, expected)
 
 
+class SSABatchTest(unittest.TestCase):
+    code = dedent(
+        """
+        def f(x):
+            if x:
+                x = 2
+            def g(y):
+                return lambda: y + 1
+            return x
+
+        def h(x):
+            class A:
+                pass
+        """
+    )
+
+    def test_matches_in_place(self):
+        tree, scope_info, g = get_ssa(self.code)
+        results = run_ssa_on_module(tree, parallel=False)
+        entry_points = list(g.get_enter_blocks())
+        self.assertEqual(len(results), len(entry_points))
+        for result, entry_point in zip(results, entry_points):
+            if isinstance(result, FunctionSSAFailure):
+                continue
+            self.assertIsInstance(result, FunctionSSAResult)
+            _, _, phi_map, annotations = run_ssa(
+                scope_info, PerFunctionCFG(entry_point)
+            )
+            self.assertEqual(
+                result.ssa_source,
+                ast.unparse(rename_to_ssa(annotations, entry_point.node)),
+            )
+            self.assertEqual(result.phi_map, render_phi_map(phi_map))
+
+    def test_banned_component(self):
+        results = run_ssa_on_module(ast.parse(self.code), parallel=False)
+        self.assertEqual(
+            [(x.component_type, x.at_fault) for x in results[-1:]],
+            [("classes", "us")],
+        )
+
+    def test_parallel(self):
+        tree = ast.parse(self.code)
+        self.assertEqual(
+            run_ssa_on_module(tree, max_workers=2),
+            run_ssa_on_module(tree, parallel=False),
+        )
+
+
 class SSARealisticTest(unittest.TestCase):
     @expand_with_slow_tests(len(small_set_examples()))
     def test_realistic(self, i):
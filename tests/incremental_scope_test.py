@@ -0,0 +1,64 @@
+import ast
+import unittest
+from textwrap import dedent
+
+import ast_scope
+from ast_scope.scope import FunctionScope
+
+from imperative_stitch.utils.incremental_scope import (
+    reannotate_statement,
+    top_level_statement,
+)
+from imperative_stitch.utils.node_index import NodeIndex
+
+CODE = dedent(
+    """
+    import os
+
+    def f(x):
+        y = [x + z for z in os.listdir(x)]
+        return lambda: y
+
+    def g(a):
+        return a + 1
+    """
+)
+
+
+def describe(scope_info):
+    result = []
+    for node in scope_info:
+        scope = scope_info[node]
+        if scope is scope_info.global_scope:
+            description = "global"
+        elif isinstance(scope, FunctionScope):
+            description = ast.unparse(scope.function_node)
+        else:
+            description = type(scope).__name__
+        result.append((ast.unparse(node), description))
+    return result
+
+
+class IncrementalScopeTest(unittest.TestCase):
+    def test_matches_full_annotation(self):
+        tree = ast.parse(CODE)
+        scope_info = ast_scope.annotate(tree)
+        index = NodeIndex(tree)
+        assign = tree.body[1].body[0]
+        statement = top_level_statement(index, assign.value)
+        self.assertIs(statement, tree.body[1])
+        stale_nodes = index.subtree(statement)
+        assign.value = ast.Call(
+            func=ast.Name(id="__m1", ctx=ast.Load()),
+            args=[ast.Name(id="x", ctx=ast.Load())],
+            keywords=[],
+        )
+        updated = reannotate_statement(scope_info, tree, statement, stale_nodes)
+        full = ast_scope.annotate(tree)
+        self.assertEqual(list(updated), list(full))
+        self.assertEqual(describe(updated), describe(full))
+        self.assertIs(updated.global_scope, scope_info.global_scope)
+        # the other statements are untouched
+        for node in ast.walk(tree.body[2]):
+            if node in scope_info:
+                self.assertIs(updated[node], scope_info[node])
@@ -0,0 +1,49 @@
+import ast
+import copy
+import pickle
+import unittest
+
+from imperative_stitch.analyze_program.ssa.ivm import (
+    Argument,
+    DefinedIn,
+    Gamma,
+    Phi,
+    SSAVariableIntermediateMapping,
+    Uninitialized,
+)
+
+
+class OriginTest(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(Uninitialized(), Uninitialized())
+        self.assertIs(Argument(), Argument())
+        self.assertNotEqual(Uninitialized(), Argument())
+        self.assertIs(pickle.loads(pickle.dumps(Uninitialized())), Uninitialized())
+        self.assertIs(copy.deepcopy(Argument()), Argument())
+
+    def test_phi_equality(self):
+        node = ast.Pass()
+        self.assertEqual(Phi(node, (1, 2)), Phi(node, (1, 2)))
+        self.assertEqual(hash(Phi(node, (1, 2))), hash(Phi(node, (1, 2))))
+        self.assertNotEqual(Phi(node, (1, 2)), Phi(node, (1, 3)))
+        self.assertNotEqual(Phi(node, (1, 2)), Phi(ast.Pass(), (1, 2)))
+        self.assertNotEqual(Phi(node, (1,)), DefinedIn(node))
+
+    def test_slots(self):
+        node = ast.Pass()
+        for origin in [DefinedIn(node), Phi(node, (1, 2)), Gamma(node, (1,))]:
+            self.assertFalse(hasattr(origin, "__dict__"))
+            self.assertEqual(type(pickle.loads(pickle.dumps(origin))), type(origin))
+
+    def test_remap(self):
+        phi = Phi(ast.Pass(), (1, 2))
+        self.assertIs(phi.remap({3: 4}), phi)
+        self.assertEqual(phi.remap({1: 3}).parents, (2, 3))
+        self.assertEqual(phi.remap({1: 2}).parents, (2,))
+
+    def test_fresh_variables_not_reused(self):
+        mapping = SSAVariableIntermediateMapping()
+        a = mapping.fresh_variable("x", Uninitialized())
+        b = mapping.fresh_variable("x", Phi(ast.Pass(), (a,)))
+        mapping.remap(b, a)
+        self.assertNotIn(mapping.fresh_variable("x", Argument()), {a, b})
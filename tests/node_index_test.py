@@ -0,0 +1,118 @@
+import ast
+import unittest
+from textwrap import dedent
+
+from imperative_stitch.analyze_program.ssa.banned_component import (
+    BannedComponentError,
+    check_banned_components,
+)
+from imperative_stitch.utils.ast_utils import ast_nodes_in_order
+from imperative_stitch.utils.node_index import NodeIndex
+
+CODE = dedent(
+    """
+    @decorator(a)
+    def f(x, y=g(b)):
+        z = lambda w, v=c: w + d
+        return [u + e for u in h(x) if u > k]
+    """
+)
+
+
+def visitor_order(tree):
+    result = []
+
+    class Visitor(ast.NodeVisitor):
+        def generic_visit(self, node):
+            result.append(node)
+            super().generic_visit(node)
+
+    Visitor().visit(tree)
+    return result
+
+
+def names(tree):
+    return {node.id: node for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+class NodeIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = ast.parse(CODE)
+        self.index = NodeIndex(self.tree)
+        self.func = self.tree.body[0]
+        self.lam = self.func.body[0].value
+        self.comp = self.func.body[1].value
+        self.names = names(self.tree)
+
+    def test_preorder(self):
+        self.assertEqual(self.index.nodes, visitor_order(self.tree))
+
+    def test_parents(self):
+        for node in ast.walk(self.tree):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.expr_context, ast.operator, ast.cmpop)):
+                    continue
+                self.assertIs(self.index.parent(child), node)
+        self.assertIsNone(self.index.parent(self.tree))
+
+    def test_subtree(self):
+        for node in ast.walk(self.func):
+            if isinstance(node, (ast.expr_context, ast.operator, ast.cmpop)):
+                continue
+            self.assertEqual(self.index.subtree(node), visitor_order(node))
+
+    def test_containing_stack(self):
+        stack = lambda name: self.index.containing_stack(self.names[name], self.func)
+        # decorators and defaults are evaluated outside the function
+        self.assertEqual(stack("a"), [])
+        self.assertEqual(stack("b"), [])
+        # lambda defaults are evaluated in the function, the body in the lambda
+        self.assertEqual(stack("c"), [self.func])
+        self.assertEqual(stack("d"), [self.func, self.lam])
+        # the first iterator is evaluated outside the comprehension
+        self.assertEqual(stack("h"), [self.func])
+        self.assertEqual(stack("e"), [self.func, self.comp])
+        self.assertEqual(stack("k"), [self.func, self.comp])
+        # argument names and comprehension targets are not visited
+        self.assertIsNone(self.index.containing_stack(self.func.args.args[0]))
+        self.assertIsNone(
+            self.index.containing_stack(self.comp.generators[0].target, self.func)
+        )
+        self.assertEqual(
+            self.index.containing_stack(self.names["d"]), [self.func, self.lam]
+        )
+
+    def test_refresh(self):
+        ret = self.func.body[1]
+        ret.value = ast.Tuple(
+            elts=[ast.Name(id="q", ctx=ast.Load()), ret.value], ctx=ast.Load()
+        )
+        self.index.refresh(self.func)
+        fresh = NodeIndex(self.tree)
+        self.assertEqual(self.index.nodes, fresh.nodes)
+        self.assertEqual(self.index.parents, fresh.parents)
+        self.assertEqual(self.index.depths, fresh.depths)
+        self.assertEqual(self.index.ends, fresh.ends)
+        self.assertEqual(self.index.containing, fresh.containing)
+        self.assertEqual(self.index.position, fresh.position)
+
+    def test_nodes_in_order(self):
+        self.assertEqual(ast_nodes_in_order(self.func), visitor_order(self.func))
+        self.assertEqual(
+            ast_nodes_in_order(self.func, self.index), visitor_order(self.func)
+        )
+        # nodes that are not in the index are traversed directly
+        other = ast.parse("x = y").body[0]
+        self.assertEqual(ast_nodes_in_order(other, self.index), visitor_order(other))
+
+    def test_refresh_after_mutation(self):
+        check_banned_components(self.func, self.index)
+        self.func.body[0].value = ast.NamedExpr(
+            target=ast.Name(id="q", ctx=ast.Store()), value=self.lam
+        )
+        self.index.refresh(self.func)
+        self.assertEqual(
+            ast_nodes_in_order(self.func, self.index), visitor_order(self.func)
+        )
+        with self.assertRaises(BannedComponentError):
+            check_banned_components(self.func, self.index)